@@ -0,0 +1,225 @@
+#----------------------------------------------------------
+# Alocação da potência disponível entre os carregadores ativos
+# (water-filling vetorizado com NumPy).
+#
+# Cada carregador recebe pelo menos `min_W` e no máximo um teto:
+#   - carregador "saturado" (consumindo >= `saturation` do limite atual,
+#     ou seja, o carro aceitaria mais): teto = potência máxima aprendida;
+#   - demais: teto = demanda observada + `margin_W` (sem passar do máximo).
+# Um nível comum L é encontrado tal que sum(clip(L, mínimo, teto)) seja
+# exatamente a potência disponível. Se sobrar potência com todos no teto,
+# uma segunda rodada distribui o restante até a potência máxima de cada um.
+#
+# A soma dos limites nunca passa de `available_W`: se não houver potência
+# para dar `min_W` a todos, os carregadores de menor consumo recebem 0
+# (carga pausada) e os demais recebem o mínimo.
+#
+# `split_budget` faz a mesma divisão entre grupos de carga (load_groups.py),
+# com o nível ponderado pelo número de carregadores de cada grupo.
+#
+# `phase_ceilings` dá a cada carregador um teto para que nenhuma fase do
+# site passe do seu limite (carregadores monofásicos pesam numa fase só).
+# Com `ceiling_W`, water_fill respeita esses tetos; teto abaixo do mínimo
+# pausa o carregador. `site_phase_ceilings` parte das leituras por fase do
+# medidor e estima o consumo "dos outros" em cada fase sem contar com
+# carregadores de fase desconhecida onde eles talvez não estejam.
+#----------------------------------------------------------
+import numpy as np
+#----------------------------------------------------------
+
+
+def _fill_level(lo, hi, budget, weight=None):
+    """
+    Nível L com sum(w * clip(L, lo, hi)) == budget, supondo
+    sum(w * lo) <= budget <= sum(w * hi). Sem `weight`, w = 1.
+    """
+    if weight is None:
+        weight = np.ones(lo.size)
+    lo_order = np.argsort(lo, kind="stable")
+    hi_order = np.argsort(hi, kind="stable")
+    lo_sorted = lo[lo_order]
+    hi_sorted = hi[hi_order]
+    lo_wcumsum = np.concatenate(([0.0], np.cumsum(weight[lo_order] * lo_sorted)))
+    hi_wcumsum = np.concatenate(([0.0], np.cumsum(weight[hi_order] * hi_sorted)))
+    lo_weights = np.concatenate(([0.0], np.cumsum(weight[lo_order])))
+    hi_weights = np.concatenate(([0.0], np.cumsum(weight[hi_order])))
+    breakpoints = np.unique(np.concatenate((lo, hi)))
+    # Em cada ponto de quebra: quem tem lo > L contribui w*lo, quem tem hi < L
+    # contribui w*hi e os demais contribuem w*L
+    n_lo_le = np.searchsorted(lo_sorted, breakpoints, side="right")
+    n_hi_lt = np.searchsorted(hi_sorted, breakpoints, side="left")
+    total = ((lo_wcumsum[-1] - lo_wcumsum[n_lo_le]) + hi_wcumsum[n_hi_lt]
+             + breakpoints * (lo_weights[n_lo_le] - hi_weights[n_hi_lt]))
+    k = np.searchsorted(total, budget, side="right") - 1
+    if k < 0:
+        return breakpoints[0]
+    if k >= len(breakpoints) - 1:
+        return breakpoints[-1]
+    slope = (total[k + 1] - total[k]) / (breakpoints[k + 1] - breakpoints[k])
+    return breakpoints[k] + (budget - total[k]) / slope
+
+
+def charger_bounds(demand_W, max_W, limit_W, min_W=1380.0, margin_W=1000.0, saturation=0.95, ceiling_W=None):
+    """(mínimo, teto pela demanda, teto pelo máximo aprendido) de cada carregador, como no water_fill."""
+    demand = np.asarray(demand_W, dtype=float)
+    max_power = np.asarray(max_W, dtype=float)
+    limit = np.asarray(limit_W, dtype=float)
+    floor = np.minimum(min_W, max_power)
+    saturated = demand >= limit * saturation
+    cap = np.where(saturated, max_power, np.minimum(max_power, demand + margin_W))
+    cap, top = np.maximum(cap, floor), np.maximum(max_power, floor)
+    if ceiling_W is not None:
+        ceiling = np.asarray(ceiling_W, dtype=float)
+        paused = ceiling < floor
+        floor = np.where(paused, 0.0, floor)
+        cap = np.where(paused, 0.0, np.minimum(cap, ceiling))
+        top = np.where(paused, 0.0, np.minimum(top, ceiling))
+    return floor, cap, top
+
+
+def water_fill(available_W, demand_W, max_W, limit_W, min_W=1380.0, margin_W=1000.0, saturation=0.95,
+               ceiling_W=None):
+    """
+    Limites (W) para cada carregador ativo. `demand_W`, `max_W` e `limit_W`
+    são sequências alinhadas (consumo atual, máximo aprendido, limite atual);
+    `ceiling_W`, opcional, o teto de cada um (phase_ceilings).
+    """
+    demand = np.asarray(demand_W, dtype=float)
+    n = demand.size
+    if n == 0:
+        return np.zeros(0)
+    budget = max(float(available_W), 0.0)
+    floor, cap, top = charger_bounds(demand, max_W, limit_W, min_W, margin_W, saturation, ceiling_W)
+
+    # Mínimo garantido; sem potência para todos, pausa os de menor consumo
+    active = np.ones(n, dtype=bool)
+    if floor.sum() > budget:
+        order = np.argsort(-demand, kind="stable")
+        fits = np.searchsorted(np.cumsum(floor[order]), budget, side="right")
+        active[order[fits:]] = False
+    lo = np.where(active, floor, 0.0)
+    cap = np.where(active, cap, 0.0)
+    top = np.where(active, top, 0.0)
+
+    if lo.sum() >= budget:
+        allocation = lo
+    elif cap.sum() >= budget:
+        allocation = np.clip(_fill_level(lo, cap, budget), lo, cap)
+    elif top.sum() > budget:
+        allocation = np.clip(_fill_level(cap, top, budget), cap, top)
+    else:
+        allocation = top
+    # Arredonda para baixo (0,01 W): a soma não passa de `available_W` por arredondamento
+    return np.floor(allocation * 100.0) / 100.0
+
+
+def split_budget(budget, lo, cap, top, weight):
+    """
+    Divide `budget` entre grupos com limites agregados (lo <= cap <= top) e
+    `weight` carregadores cada: mesmas fases do water_fill, com o nível
+    contado por carregador (grupo com mais carregadores recebe mais).
+    """
+    lo = np.asarray(lo, dtype=float)
+    cap = np.asarray(cap, dtype=float)
+    top = np.asarray(top, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    budget = max(float(budget), 0.0)
+    if lo.size == 0:
+        return np.zeros(0)
+    if lo.sum() >= budget:
+        # Nem o mínimo de todos cabe: proporcional ao mínimo (cada grupo pausa os seus)
+        return lo * (budget / lo.sum()) if lo.sum() > 0 else np.zeros(lo.size)
+    if cap.sum() >= budget:
+        lower, upper = lo, cap
+    elif top.sum() > budget:
+        lower, upper = cap, top
+    else:
+        return top
+    level = _fill_level(lower / weight, upper / weight, budget, weight)
+    return np.clip(level * weight, lower, upper)
+
+
+def _progressive_fill(available, share, touches, lo, hi):
+    # Nível comum = potência por fase (a mesma corrente para todos). A cada
+    # rodada a fase que satura primeiro congela os carregadores ligados a ela;
+    # os demais continuam subindo nas outras fases.
+    x = lo.copy()
+    free = np.ones(lo.size, dtype=bool)
+    for _ in range(available.size):
+        levels = np.full(available.size, np.inf)
+        for p in range(available.size):
+            on_phase = touches[:, p]
+            idx = on_phase & free
+            if not idx.any():
+                continue
+            budget = available[p] - (share[on_phase & ~free] * x[on_phase & ~free]).sum()
+            a, b = share[idx] * lo[idx], share[idx] * hi[idx]
+            if b.sum() > budget:
+                levels[p] = _fill_level(a, b, max(budget, a.sum()))
+        p = int(np.argmin(levels))
+        if not np.isfinite(levels[p]):
+            break
+        idx = touches[:, p] & free
+        x[idx] = np.clip(levels[p] / share[idx], lo[idx], hi[idx])
+        free &= ~touches[:, p]
+    x[free] = hi[free]
+    return x
+
+
+def phase_ceilings(available_W, phase_share, demand_W, max_W, limit_W, min_W=1380.0, margin_W=1000.0, saturation=0.95):
+    """
+    Teto (W) de cada carregador para que a soma em cada fase não passe de
+    `available_W[p]`. `phase_share` (n, fases): fração da potência de cada
+    carregador em cada fase (1 numa fase = monofásico, 1/3 = trifásico).
+    Sem potência para o mínimo numa fase, os de menor consumo ficam com 0.
+    """
+    available = np.maximum(np.asarray(available_W, dtype=float), 0.0)
+    phase_share = np.asarray(phase_share, dtype=float)
+    demand = np.asarray(demand_W, dtype=float)
+    if demand.size == 0:
+        return np.zeros(0)
+    floor, cap, top = charger_bounds(demand, max_W, limit_W, min_W, margin_W, saturation)
+    touches = phase_share > 0
+    share = phase_share.max(axis=1)
+    paused = ~touches.any(axis=1)
+    for p in range(available.size):
+        idx = np.flatnonzero(touches[:, p] & ~paused)
+        if (share[idx] * floor[idx]).sum() > available[p]:
+            order = idx[np.argsort(-demand[idx], kind="stable")]
+            fits = np.searchsorted(np.cumsum(share[order] * floor[order]), available[p], side="right")
+            paused[order[fits:]] = True
+    lo = np.where(paused, 0.0, floor)
+    # Primeiro até o teto pela demanda; sobrando potência na fase, até o máximo aprendido
+    x = _progressive_fill(available, share, touches, lo, np.where(paused, 0.0, cap))
+    x = _progressive_fill(available, share, touches, x, np.where(paused, 0.0, top))
+    return np.where(paused, 0.0, x)
+
+
+def site_phase_ceilings(phase_limit_W, site_phase_W, phase_share, known, demand_W, max_W, limit_W,
+                        min_W=1380.0, margin_W=1000.0, saturation=0.95, max_rounds=8):
+    """
+    Tetos (phase_ceilings) a partir da leitura de cada fase do site. O
+    consumo dos outros numa fase é a leitura menos o dos carregadores nela.
+    Carregadores `known` (fração por fase real) descontam share * demanda.
+    Os de fase desconhecida (fração conservadora em todas as fases) descontam
+    no máximo min(demanda, teto): uma redução dele não libera potência numa
+    fase em que ele pode não estar. Repete até os tetos confirmarem o
+    desconto; sem convergir, não desconta nada deles (sempre seguro).
+    Devolve (tetos, desconto dos carregadores por fase, disponível por fase).
+    """
+    share = np.asarray(phase_share, dtype=float)
+    known = np.asarray(known, dtype=bool)
+    demand = np.asarray(demand_W, dtype=float)
+    phase_limit = np.asarray(phase_limit_W, dtype=float)
+    site = np.asarray(site_phase_W, dtype=float)
+    credit = demand
+    for round_ in range(max_rounds + 1):
+        if round_ == max_rounds:
+            credit = np.where(known, demand, 0.0)
+        charger_W = share.T @ credit
+        available = phase_limit - np.maximum(site - charger_W, 0.0)
+        ceilings = phase_ceilings(available, share, demand, max_W, limit_W, min_W, margin_W, saturation)
+        confirmed = np.minimum(demand, ceilings)
+        if round_ == max_rounds or (known | (credit <= confirmed + 1e-6)).all():
+            return ceilings, charger_W, available
+        credit = np.where(known, demand, confirmed)
@@ -0,0 +1,159 @@
+#----------------------------------------------------------
+# Logging não bloqueante para o loop asyncio do gateway.
+#
+# Os handlers "reais" (arquivo com rotação, console) saem do logger raiz e
+# passam a ser atendidos por uma thread escritora. O logger raiz recebe só
+# um QueuedLogHandler, que monta a mensagem (msg % args e o traceback, como
+# o logging.handlers.QueueHandler.prepare) e coloca uma cópia do LogRecord
+# numa fila limitada. Os argumentos são lidos na hora do log, e não quando
+# a thread chega ao registro, quando já podem ter mudado. A thread escritora
+# retira os registros em lotes, aplica o nível e os filtros de cada destino,
+# formata (data, nível...), escreve e faz um único flush por lote em cada
+# destino.
+#
+# Política quando a fila está cheia:
+#   "drop"  -> o registro é descartado (contabilizado e avisado depois)
+#   "block" -> quem loga espera até haver espaço (nenhum registro se perde)
+#----------------------------------------------------------
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import threading
+#----------------------------------------------------------
+
+POLICY_DROP = "drop"
+POLICY_BLOCK = "block"
+
+_STOP = object()
+
+
+class QueuedLogHandler(logging.Handler):
+    """Handler do lado do loop: monta a mensagem e enfileira; o resto da formatação fica com a thread escritora."""
+
+    def __init__(self, log_queue, policy=POLICY_DROP):
+        super().__init__()
+        if policy not in (POLICY_DROP, POLICY_BLOCK):
+            raise ValueError(f"Política de fila de log inválida: {policy!r}")
+        self.queue = log_queue
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Cópia do registro com a mensagem pronta, sem args nem exc_info (como QueueHandler.prepare)."""
+        message = self.format(record)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            if not self.filter(record):
+                return
+            record = self.prepare(record)
+            if self.policy == POLICY_BLOCK:
+                self.queue.put(record)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class BatchLogWriter(threading.Thread):
+    """Thread que escreve os registros da fila em lotes nos handlers de destino."""
+
+    def __init__(self, log_queue, handlers, source_handler, batch_size=256):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = log_queue
+        self.handlers = handlers
+        self.source_handler = source_handler
+        self.batch_size = batch_size
+        self._reported_drops = 0
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(r is _STOP for r in batch):
+                stopping = True
+                batch = [r for r in batch if r is not _STOP]
+            self._report_drops(batch)
+            for handler in self.handlers:
+                self._write_batch(handler, batch)
+
+    def _report_drops(self, batch):
+        dropped = self.source_handler.dropped
+        if dropped > self._reported_drops:
+            record = logging.LogRecord(
+                "root", logging.WARNING, __file__, 0,
+                f"[LOGGING] Fila de log cheia: {dropped - self._reported_drops} registros descartados.",
+                None, None,
+            )
+            self._reported_drops = dropped
+            batch.append(record)
+
+    def _write_batch(self, handler, batch):
+        handler.acquire()
+        try:
+            for record in batch:
+                if record.levelno < handler.level or not handler.filter(record):
+                    continue
+                try:
+                    if isinstance(handler, logging.handlers.BaseRotatingHandler) and handler.shouldRollover(record):
+                        handler.doRollover()
+                    if isinstance(handler, logging.StreamHandler):
+                        if handler.stream is None:
+                            handler.stream = handler._open()
+                        handler.stream.write(handler.format(record) + handler.terminator)
+                    else:
+                        handler.emit(record)
+                except Exception:
+                    handler.handleError(record)
+            stream = getattr(handler, "stream", None)
+            if stream is not None:
+                try:
+                    stream.flush()
+                except Exception:
+                    pass
+        finally:
+            handler.release()
+
+    def stop(self, timeout=5.0):
+        """Esvazia a fila e encerra a thread (chamado no desligamento)."""
+        if not self.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+
+def install_queued_logging(logger, maxsize=10000, policy=POLICY_DROP, batch_size=256):
+    """
+    Move os handlers atuais de `logger` para uma BatchLogWriter e deixa no
+    logger apenas um QueuedLogHandler. Retorna a thread escritora.
+    """
+    handlers = list(logger.handlers)
+    log_queue = queue.Queue(maxsize=maxsize)
+    queued_handler = QueuedLogHandler(log_queue, policy=policy)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(queued_handler)
+    writer = BatchLogWriter(log_queue, handlers, queued_handler, batch_size=batch_size)
+    writer.start()
+    atexit.register(writer.stop)
+    return writer
@@ -0,0 +1,81 @@
+#----------------------------------------------------------
+# Benchmark: alocação proporcional (antes) x water-filling (depois).
+#
+# N carregadores com potência máxima aprendida de 3,6 / 7,4 / 11 / 22 kW e
+# carros que aceitam uma fração aleatória disso. O site oferece uma fração
+# da soma dos máximos. Cada passo de controle usa o consumo observado
+# (min(limite, aceitação do carro)) e recalcula os limites; após alguns
+# passos mede-se:
+#   - tempo de CPU de uma passada de alocação;
+#   - potência entregue (kW) e energia por hora (kWh) sob o mesmo limite;
+#   - soma dos limites em relação ao disponível (estouro do limite do site).
+#
+#   python benchmarks/bench_allocator.py [--chargers 10000] [--site-fraction 0.5]
+#----------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from allocation import water_fill
+#----------------------------------------------------------
+
+MIN_CHARGE_POWER_W = 1380.0
+
+
+def proportional(available_W, demand_W, max_W, limit_W):
+    """Regra anterior do demand_control_loop (parte proporcional ao máximo aprendido)."""
+    total_max = sum(max_W)
+    limits = []
+    for max_power in max_W:
+        new_limit = available_W * (max_power / total_max)
+        new_limit = max(new_limit, MIN_CHARGE_POWER_W)
+        new_limit = min(new_limit, max_power)
+        limits.append(new_limit)
+    return np.array(limits)
+
+
+def simulate(allocator, available_W, max_W, accept_W, steps):
+    limits = max_W.copy()
+    for _ in range(steps):
+        demand = np.minimum(limits, accept_W)
+        limits = np.asarray(allocator(available_W, demand, max_W, limits))
+    delivered = np.minimum(limits, accept_W).sum()
+    return limits, delivered
+
+
+def cpu_time(allocator, available_W, demand, max_W, limits, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        allocator(available_W, demand, max_W, limits)
+    return (time.process_time() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=10000)
+    parser.add_argument("--site-fraction", type=float, default=0.5)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    max_W = rng.choice([3600.0, 7400.0, 11000.0, 22000.0], size=args.chargers)
+    # Muitos carros aceitam bem menos do que o carregador oferece
+    accept_W = max_W * rng.choice([0.2, 0.4, 0.7, 1.0], size=args.chargers)
+    available_W = args.site_fraction * max_W.sum()
+    demand = np.minimum(max_W, accept_W)
+
+    water = lambda a, d, m, l: water_fill(a, d, m, l, min_W=MIN_CHARGE_POWER_W)
+    print(f"carregadores: {args.chargers} | disponível: {available_W / 1000:.0f} kW "
+          f"({args.site_fraction:.0%} da soma dos máximos) | aceitação total dos carros: {accept_W.sum() / 1000:.0f} kW")
+    for label, allocator, repeat in (("proporcional (antes)", proportional, 5), ("water-filling (depois)", water, 20)):
+        cpu = cpu_time(allocator, available_W, demand, max_W, max_W, repeat)
+        limits, delivered = simulate(allocator, available_W, max_W, accept_W, args.steps)
+        print(f"{label:24s}: {cpu * 1000:7.2f} ms/passada | entregue {delivered / 1000:8.0f} kW "
+              f"= {delivered / 1000:8.0f} kWh/h | soma dos limites {limits.sum() / available_W:6.1%} do disponível")
@@ -0,0 +1,146 @@
+#----------------------------------------------------------
+# Benchmark: passada do controle de demanda com o estado em dict de dicts
+# (antes) x charger_table.ChargerTable (depois).
+#
+# N carregadores, uma fração em carga. Entre duas passadas os handlers
+# atualizam a potência de `--updates` carregadores. Mede-se por passada:
+#   - tempo (ms) da coleta (snapshot, filtro, contagens, somas, colunas),
+#     da alocação (water_fill, igual nos dois) e do agendamento dos limites;
+#   - chamadas a set_limit por passada;
+#   - custo (µs) de uma atualização feita pelo handler.
+#
+#   python benchmarks/bench_charger_table.py [--chargers 5000] [--updates 50]
+#----------------------------------------------------------
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from allocation import water_fill
+from charger_table import ChargerTable
+#----------------------------------------------------------
+
+TOLERANCE = 0.01
+
+
+class FakeCommands:
+    """set_limit com o mesmo descarte por tolerância do ProfileCommands (limite já confirmado)."""
+
+    def __init__(self):
+        self.acked = {}
+        self.calls = 0
+        self.unconfirmed = set()
+
+    def set_limit(self, cp_id, limit_W):
+        self.calls += 1
+        acked = self.acked.get(cp_id)
+        if acked is not None and abs(limit_W - acked) <= acked * TOLERANCE:
+            return False
+        self.acked[cp_id] = limit_W
+        return True
+
+
+def initial_rows(chargers, charging_fraction, rng):
+    rows = {}
+    for i in range(chargers):
+        max_power = rng.choice((3680.0, 7400.0, 11000.0, 22000.0))
+        charging = rng.random() < charging_fraction
+        rows[f"CP{i:05d}"] = {
+            "status": "Charging" if charging else "Available",
+            "current_power_W": max_power * rng.uniform(0.3, 1.0) if charging else 0.0,
+            "learned_max_power": max_power, "current_limit_W": max_power,
+        }
+    return rows
+
+
+def tick_before(state, available_W, commands):
+    t0 = time.perf_counter()
+    snapshot = state.copy()
+    charging = {cp_id: s for cp_id, s in snapshot.items() if s.get("status") == "Charging"}
+    connected = sum(1 for s in snapshot.values() if s.get("status") != "Offline")
+    waiting = connected - len(charging)
+    demand = sum(s["current_power_W"] for s in charging.values())
+    cp_ids = list(charging)
+    columns = ([charging[c]["current_power_W"] for c in cp_ids],
+               [charging[c].get("learned_max_power", 6000.0) for c in cp_ids],
+               [charging[c].get("current_limit_W", 0) for c in cp_ids])
+    t1 = time.perf_counter()
+    limits = water_fill(available_W, *columns)
+    t2 = time.perf_counter()
+    for cp_id, limit in zip(cp_ids, limits.tolist()):
+        commands.set_limit(cp_id, limit)
+    t3 = time.perf_counter()
+    return t1 - t0, t2 - t1, t3 - t2, demand, waiting
+
+
+def tick_after(table, available_W, commands):
+    t0 = time.perf_counter()
+    cp_ids, rows = table.charging()
+    waiting = table.connected_count - len(cp_ids)
+    demand = table.charging_power_W
+    columns = (table.column("current_power_W", rows), table.column("learned_max_power", rows),
+               table.column("current_limit_W", rows))
+    t1 = time.perf_counter()
+    limits = water_fill(available_W, *columns)
+    t2 = time.perf_counter()
+    allocated = table.column("allocated_W", rows)
+    changed = np.flatnonzero(~(np.abs(limits - allocated) <= allocated * TOLERANCE))
+    table.set_column("allocated_W", rows[changed], limits[changed])
+    for i in changed.tolist():
+        commands.set_limit(cp_ids[i], float(limits[i]))
+    t3 = time.perf_counter()
+    return t1 - t0, t2 - t1, t3 - t2, demand, waiting
+
+
+def run(args):
+    rng = random.Random(1)
+    rows = initial_rows(args.chargers, args.charging_fraction, rng)
+    dict_state = {cp_id: dict(fields) for cp_id, fields in rows.items()}
+    table = ChargerTable()
+    for cp_id, fields in rows.items():
+        table[cp_id] = fields
+    charging_ids = [cp_id for cp_id, fields in rows.items() if fields["status"] == "Charging"]
+    available_W = 0.6 * sum(rows[c]["learned_max_power"] for c in charging_ids)
+    print(f"carregadores: {args.chargers} ({len(charging_ids)} em carga) | {args.updates} atualizações por passada | "
+          f"{args.ticks} passadas")
+
+    for label, state, tick in (("antes (dict de dicts)", dict_state, tick_before), ("depois (ChargerTable)", table, tick_after)):
+        commands = FakeCommands()
+        totals = np.zeros(3)
+        update_s = 0.0
+        calls = 0
+        demand_error = 0.0
+        for n in range(args.ticks):
+            for cp_id in rng.sample(charging_ids, args.updates):
+                power = rows[cp_id]["learned_max_power"] * rng.uniform(0.3, 1.0)
+                t0 = time.perf_counter()
+                state[cp_id]["current_power_W"] = power
+                update_s += time.perf_counter() - t0
+            calls_before = commands.calls
+            gather_s, alloc_s, schedule_s, demand, _ = tick(state, available_W, commands)
+            if n:
+                # A primeira passada agenda todos nos dois modos; mede-se o regime
+                totals += (gather_s, alloc_s, schedule_s)
+                calls += commands.calls - calls_before
+            exact = sum(state[c]["current_power_W"] for c in charging_ids)
+            demand_error = max(demand_error, abs(demand - exact))
+        per_tick = totals / (args.ticks - 1) * 1000.0
+        print(f"{label:22s}: coleta {per_tick[0]:6.2f} ms | alocação {per_tick[1]:6.2f} ms | agendamento {per_tick[2]:6.2f} ms | "
+              f"set_limit/passada {calls / (args.ticks - 1):7.1f} | atualização {update_s / (args.ticks * args.updates) * 1e6:5.2f} µs | "
+              f"erro da soma {demand_error:.2e} W")
+    print(f"memória das colunas da tabela: {table.memory_bytes() / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=5000)
+    parser.add_argument("--charging-fraction", type=float, default=0.6)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=50)
+    run(parser.parse_args())
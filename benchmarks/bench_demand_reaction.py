@@ -0,0 +1,142 @@
+#----------------------------------------------------------
+# Benchmark: tempo entre a detecção de sobrecarga (POST do medidor) e o
+# envio do SetChargingProfile, com o controle só periódico (antes) e
+# disparado por eventos (depois).
+#
+# Sobe o servidor HTTP do medidor e o demand_control_loop do gateway com N
+# carregadores falsos em "Charging" (5 kW cada). Em cada rodada a potência
+# do site sobe de 55 kW para 70 kW (sobrecarga) e mede-se quanto tempo leva
+# até o primeiro SetChargingProfile reduzindo o limite; depois a potência
+# volta ao normal e espera-se o controle se acomodar.
+#
+#   python benchmarks/bench_demand_reaction.py [--chargers 10] [--trials 5]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.chdir(tempfile.mkdtemp(prefix="bench_demand_"))
+
+import aiohttp
+from aiohttp import web
+import local_server
+from control_trigger import ControlTrigger
+from profile_commands import ProfileCommands
+#----------------------------------------------------------
+
+BASE_SITE_W = 55000.0
+OVERLOAD_SITE_W = 70000.0
+CHARGER_POWER_W = 5000.0
+
+
+class FakeChargerSocket:
+    """Registra os SetChargingProfile enviados (instante, limite) e os confirma."""
+
+    closed = False
+
+    def __init__(self, cp_id, sent):
+        self.cp_id = cp_id
+        self.sent = sent
+
+    async def send(self, text):
+        message = json.loads(text)
+        if message[2] == "SetChargingProfile":
+            limit = message[3]["csChargingProfiles"]["chargingSchedule"]["chargingSchedulePeriod"][0]["limit"]
+            self.sent.append((time.monotonic(), limit))
+        asyncio.get_running_loop().call_soon(
+            local_server.GATEWAY_PENDING_REQUESTS.resolve, self.cp_id, message[1], {"status": "Accepted"})
+
+
+async def wait_for_send(sent, since, predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for t, limit in sent:
+            if t >= since and predicate(limit):
+                return t - since
+        await asyncio.sleep(0.005)
+    return None
+
+
+async def run_mode(event_driven, chargers, trials, url, session):
+    local_server.CHARGE_POINT_STATE.clear()
+    local_server.DOWNSTREAM_CLIENTS.clear()
+    sent = []
+    for i in range(chargers):
+        cp_id = f"CP{i:03d}"
+        local_server.CHARGE_POINT_STATE[cp_id] = {
+            "status": "Charging", "current_power_W": CHARGER_POWER_W,
+            "learned_max_power": 7400.0, "current_limit_W": 7400.0,
+        }
+        local_server.DOWNSTREAM_CLIENTS[cp_id] = FakeChargerSocket(cp_id, sent)
+    local_server.SITE_POWER_STATE["current_total_W"] = BASE_SITE_W
+    local_server.DEMAND_TRIGGER = ControlTrigger(
+        min_interval_s=local_server.DEMAND_CONTROL_MIN_INTERVAL_S, debounce_s=local_server.DEMAND_CONTROL_DEBOUNCE_S,
+        fallback_s=local_server.DEMAND_CONTROL_FALLBACK_S, event_driven=event_driven,
+    )
+    local_server.PROFILE_COMMANDS = ProfileCommands(
+        local_server.send_charging_profile, deadline_s=local_server.PROFILE_COMMAND_DEADLINE_S)
+    control = asyncio.create_task(local_server.demand_control_loop())
+    await asyncio.sleep(0.5)
+
+    async def post(pt):
+        async with session.post(url, data=json.dumps({"pt": str(pt), "pa": "0", "pb": "0", "pc": "0"})) as resp:
+            await resp.read()
+
+    latencies = []
+    fallback = local_server.DEMAND_CONTROL_FALLBACK_S
+    for _ in range(trials):
+        # Fase aleatória em relação ao tick periódico
+        await asyncio.sleep(random.uniform(0.0, fallback))
+        t0 = time.monotonic()
+        await post(OVERLOAD_SITE_W)
+        latency = await wait_for_send(sent, t0, lambda limit: limit < CHARGER_POWER_W, fallback * 2)
+        latencies.append(latency)
+        t1 = time.monotonic()
+        await post(BASE_SITE_W)
+        await wait_for_send(sent, t1, lambda limit: limit >= CHARGER_POWER_W, fallback * 2)
+    control.cancel()
+    return latencies
+
+
+async def run(chargers, trials, port):
+    local_server.stream_handler.setLevel(logging.ERROR)
+    local_server.DEMAND_CONTROL_STARTUP_S = 0
+    app = web.Application()
+    app.router.add_post("/api/insert.php", local_server.handle_meter_post)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    url = f"http://127.0.0.1:{port}/api/insert.php"
+
+    async with aiohttp.ClientSession() as session:
+        results = {}
+        for label, event_driven in (("antes (tick de 10s)", False), ("depois (eventos)", True)):
+            results[label] = await run_mode(event_driven, chargers, trials, url, session)
+    await runner.cleanup()
+
+    print(f"carregadores: {chargers} | rodadas: {trials}")
+    for label, latencies in results.items():
+        ok = [l for l in latencies if l is not None]
+        if not ok:
+            print(f"{label:22s}: nenhum SetChargingProfile observado")
+            continue
+        print(f"{label:22s}: média {statistics.mean(ok) * 1000:7.0f} ms | "
+              f"mín {min(ok) * 1000:6.0f} ms | máx {max(ok) * 1000:6.0f} ms | sem resposta: {len(latencies) - len(ok)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=10)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--port", type=int, default=18001)
+    args = parser.parse_args()
+    asyncio.run(run(args.chargers, args.trials, args.port))
@@ -0,0 +1,104 @@
+#----------------------------------------------------------
+# Benchmark: potência aprendida pela regra do máximo (antes) x percentil
+# em janela deslizante, power_sketch.LearnedPowerEstimator (depois).
+#
+# `--chargers` carregadores (máximo real de 7,4 / 11 / 22 kW) dividem um
+# site com `--site-fraction` da soma dos máximos. Uma leitura por minuto
+# por carregador durante `--hours` horas; de vez em quando uma leitura
+# sai com um pico (`--spike-rate`, 2 a 3x o real, como um erro de medição
+# ou um transitório). A cada minuto a alocação (water_fill) usa a potência
+# aprendida como máximo. Mede-se:
+#   - carregadores com a potência aprendida >10% acima do real;
+#   - potência reservada e não consumida (kW, média) e energia entregue;
+#   - custo por leitura (us) e memória (bins e bytes do estado no JSON).
+#
+#   python benchmarks/bench_learned_power.py [--chargers 40] [--hours 48] [--spike-rate 0.001]
+#----------------------------------------------------------
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from allocation import water_fill
+from power_sketch import LearnedPowerEstimator
+#----------------------------------------------------------
+
+SEED_W = 3600.0
+
+
+def learn_peak(learned_W, cp_id, power_W):
+    # Regra antiga: sobe quando uma leitura passa 1% do máximo, nunca desce
+    return power_W if power_W > learned_W * 1.01 else None
+
+
+def run_case(args, true_max_W, site_W, sketch):
+    rng = np.random.default_rng(7)
+    n = len(true_max_W)
+    cp_ids = [f"CP{i:03d}" for i in range(n)]
+    estimator = LearnedPowerEstimator()
+    learned = np.full(n, SEED_W)
+    limits = np.full(n, np.inf)   # até o primeiro perfil o carregador não tem limite
+    stranded_W = delivered_Wmin = 0.0
+    observe_s = 0.0
+    samples = 0
+    t0 = 1.7e9
+    minutes = int(args.hours * 60)
+    for minute in range(minutes):
+        now = t0 + minute * 60.0
+        draw = np.minimum(limits, true_max_W * rng.normal(1.0, 0.01, n))
+        reading = draw * np.where(rng.random(n) < args.spike_rate, rng.uniform(2.0, 3.0, n), 1.0)
+        start = time.perf_counter()
+        for i in range(n):
+            if sketch:
+                estimate = estimator.observe(cp_ids[i], reading[i], learned[i], limits[i], now)
+            else:
+                estimate = learn_peak(learned[i], cp_ids[i], reading[i])
+            if estimate is not None:
+                if estimate > learned[i]:
+                    limits[i] = estimate
+                learned[i] = estimate
+        observe_s += time.perf_counter() - start
+        samples += n
+        limits = water_fill(site_W, draw, learned, limits)
+        if minute >= minutes // 2:   # média da segunda metade (já aprendido)
+            stranded_W += (limits - draw).sum()
+            delivered_Wmin += draw.sum()
+    half = minutes - minutes // 2
+    state_bytes = len(json.dumps(estimator.take_dirty())) if sketch else len(json.dumps(dict(zip(cp_ids, learned.tolist()))))
+    return {
+        "inflated": int((learned > true_max_W * 1.10).sum()),
+        "error": float(np.median(np.abs(learned / true_max_W - 1.0))) * 100.0,
+        "stranded_kW": stranded_W / half / 1000.0,
+        "delivered_kW": delivered_Wmin / half / 1000.0,
+        "us_per_sample": observe_s / samples * 1e6,
+        "bins": estimator.stats()["bins"] / n if sketch else 1,
+        "state_bytes": state_bytes,
+    }
+
+
+def run(args):
+    rng = np.random.default_rng(1)
+    true_max_W = rng.choice((7400.0, 11000.0, 22000.0), args.chargers)
+    site_W = args.site_fraction * true_max_W.sum()
+    print(f"{args.chargers} carregadores, site {site_W / 1000:.0f} kW ({args.site_fraction:.0%} da soma dos máximos) | "
+          f"{args.hours:.0f} h a 1 leitura/min | picos em {args.spike_rate:.2%} das leituras")
+    for label, sketch in (("antes (máximo)", False), ("depois (p99)", True)):
+        r = run_case(args, true_max_W, site_W, sketch)
+        print(f"{label:15s}: inflados {r['inflated']:3d}/{args.chargers} | erro mediano {r['error']:5.1f}% | "
+              f"reservado sem uso {r['stranded_kW']:6.1f} kW | entregue {r['delivered_kW']:6.1f} kW | "
+              f"{r['us_per_sample']:5.1f} us/leitura | {r['bins']:4.1f} bins/carregador, estado {r['state_bytes']} B")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=40)
+    parser.add_argument("--hours", type=float, default=48.0)
+    parser.add_argument("--spike-rate", type=float, default=0.001)
+    parser.add_argument("--site-fraction", type=float, default=0.7)
+    run(parser.parse_args())
@@ -0,0 +1,95 @@
+#----------------------------------------------------------
+# Benchmark: alocação só com o limite do site (antes) x árvore de grupos de
+# carga, load_groups.LoadGroupTree (depois).
+#
+# Depósito com `--feeders` alimentadores, `--panels` quadros por
+# alimentador e `--chargers` carregadores por quadro (máximo aprendido de
+# 7,4 / 11 / 22 kW). Cada alimentador tem um submedidor com consumo de
+# outras cargas. Mede-se por passada de controle:
+#   - tempo (ms) da alocação;
+#   - pior estouro (kW) de um quadro, de um alimentador e do site;
+#   - potência total alocada (kW).
+#
+#   python benchmarks/bench_load_groups.py [--feeders 4] [--panels 5] [--chargers 25]
+#----------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from allocation import water_fill
+from load_groups import parse_load_group, LoadGroupTree
+#----------------------------------------------------------
+
+
+def depot(args, rng):
+    cp_ids, panel_of, feeder_of = [], [], []
+    feeders = []
+    for f in range(args.feeders):
+        panels = []
+        for p in range(args.panels):
+            ids = [f"CP-{f}-{p}-{c:02d}" for c in range(args.chargers)]
+            cp_ids += ids
+            panel_of += [f * args.panels + p] * len(ids)
+            feeder_of += [f] * len(ids)
+            panels.append({"name": f"quadro-{f}-{p}", "limit_W": args.panel_kw * 1000.0, "chargers": ids})
+        feeders.append({"name": f"alimentador-{f}", "limit_W": args.feeder_kw * 1000.0, "meter": f"ALIM-{f}", "children": panels})
+    config = {"name": "site", "limit_W": args.site_kw * 1000.0, "children": feeders}
+    max_W = rng.choice((7400.0, 11000.0, 22000.0), len(cp_ids))
+    return config, cp_ids, np.array(panel_of), np.array(feeder_of), max_W
+
+
+def overloads(limits, panel_of, feeder_of, other_feeder_W, args):
+    panel = np.bincount(panel_of, weights=limits).max() - args.panel_kw * 1000.0
+    feeder = (np.bincount(feeder_of, weights=limits) + other_feeder_W - args.feeder_kw * 1000.0).max()
+    site = limits.sum() + other_feeder_W.sum() - args.site_kw * 1000.0
+    return max(panel, 0.0) / 1000.0, max(feeder, 0.0) / 1000.0, max(site, 0.0) / 1000.0
+
+
+def run(args):
+    rng = np.random.default_rng(1)
+    config, cp_ids, panel_of, feeder_of, max_W = depot(args, rng)
+    tree = LoadGroupTree(parse_load_group(config))
+    other_feeder_W = rng.uniform(0.0, 0.2, args.feeders) * args.feeder_kw * 1000.0
+    for f, other_W in enumerate(other_feeder_W):
+        tree.observe_meter(f"ALIM-{f}", other_W)   # atualizado com a demanda a cada passada
+    print(f"depósito: {len(cp_ids)} carregadores, {args.feeders} alimentadores x {args.panels} quadros | "
+          f"quadro {args.panel_kw:.0f} kW, alimentador {args.feeder_kw:.0f} kW, site {args.site_kw:.0f} kW | {len(tree)} nós")
+
+    for label, grouped in (("antes (só o site)", False), ("depois (grupos)", True)):
+        demand = max_W * rng.uniform(0.3, 1.0, len(cp_ids))
+        limits = max_W.copy()
+        elapsed = 0.0
+        worst = np.zeros(3)
+        for _ in range(args.ticks):
+            for f in range(args.feeders):
+                tree.observe_meter(f"ALIM-{f}", other_feeder_W[f] + demand[feeder_of == f].sum())
+            site_W = other_feeder_W.sum() + demand.sum()
+            t0 = time.perf_counter()
+            if grouped:
+                limits = tree.allocate(cp_ids, demand, max_W, limits, site_W)
+            else:
+                limits = water_fill(args.site_kw * 1000.0 - other_feeder_W.sum(), demand, max_W, limits)
+            elapsed += time.perf_counter() - t0
+            worst = np.maximum(worst, overloads(limits, panel_of, feeder_of, other_feeder_W, args))
+            # O carro consome até o limite, com a aceitação variando um pouco
+            demand = np.minimum(limits, max_W * np.clip(demand / max_W + rng.normal(0.0, 0.05, len(cp_ids)), 0.1, 1.0))
+        print(f"{label:18s}: {elapsed / args.ticks * 1000.0:6.2f} ms/passada | estouro máx.: quadro {worst[0]:6.1f} kW, "
+              f"alimentador {worst[1]:6.1f} kW, site {worst[2]:5.1f} kW | alocado {limits.sum() / 1000.0:7.0f} kW")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--feeders", type=int, default=4)
+    parser.add_argument("--panels", type=int, default=5)
+    parser.add_argument("--chargers", type=int, default=25)
+    parser.add_argument("--panel-kw", type=float, default=80.0)
+    parser.add_argument("--feeder-kw", type=float, default=350.0)
+    parser.add_argument("--site-kw", type=float, default=1500.0)
+    parser.add_argument("--ticks", type=int, default=100)
+    run(parser.parse_args())
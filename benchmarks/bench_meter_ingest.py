@@ -0,0 +1,73 @@
+#----------------------------------------------------------
+# Benchmark: requisições/s sustentadas por handle_meter_post.
+#
+# Sobe apenas o servidor HTTP do medidor (aiohttp) numa porta local e
+# dispara POSTs de vários "medidores" concorrentes durante alguns segundos.
+# Roda num diretório temporário para não misturar logs.
+#
+#   python benchmarks/bench_meter_ingest.py [--meters 4] [--seconds 5]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.chdir(tempfile.mkdtemp(prefix="bench_meter_"))
+
+import aiohttp
+from aiohttp import web
+import local_server
+#----------------------------------------------------------
+
+
+async def meter_client(session, url, meter_id, deadline, counts):
+    body = {"id": meter_id, "pt": "31346.44", "pa": "10448.1", "pb": "10449.2", "pc": "10449.1",
+            "ua": "220.1", "ub": "219.8", "uc": "220.4"}
+    while time.perf_counter() < deadline:
+        async with session.post(url, data=json.dumps(body)) as resp:
+            await resp.read()
+            counts[resp.status] = counts.get(resp.status, 0) + 1
+
+
+async def run(meters, seconds, port):
+    # Console silencioso; o arquivo gateway.log continua recebendo tudo
+    local_server.stream_handler.setLevel(logging.WARNING)
+    local_server.METER_JSONL_WRITER.start()
+    app = web.Application()
+    app.router.add_post("/api/insert.php", local_server.handle_meter_post)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    url = f"http://127.0.0.1:{port}/api/insert.php"
+    counts = {}
+    connector = aiohttp.TCPConnector(limit=meters)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        deadline = start + seconds
+        await asyncio.gather(*(meter_client(session, url, f"M{i}", deadline, counts) for i in range(meters)))
+        elapsed = time.perf_counter() - start
+    await runner.cleanup()
+    local_server.METER_JSONL_WRITER.stop()
+
+    total = sum(counts.values())
+    print(f"medidores concorrentes : {meters}")
+    print(f"requisições            : {total} em {elapsed:.2f}s -> {total / elapsed:.0f} req/s")
+    print(f"respostas por status   : {counts}")
+    print(f"linhas gravadas (JSONL): {local_server.METER_JSONL_WRITER.written} "
+          f"(descartadas: {local_server.METER_JSONL_WRITER.dropped})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meters", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=18000)
+    args = parser.parse_args()
+    asyncio.run(run(args.meters, args.seconds, args.port))
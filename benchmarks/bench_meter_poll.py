@@ -0,0 +1,99 @@
+#----------------------------------------------------------
+# Benchmark: pedidos de MeterValues a cada 60 s para todos (antes) x
+# agendador adaptativo com jitter (depois), em tempo simulado.
+#
+# N carregadores em carga: uma fração tem potência variando (saltos
+# aleatórios a cada ~20 s), os demais estão estáveis. O carregador responde
+# ao TriggerMessage na hora. O site passa um trecho perto do limite. Mede-se:
+#   - pedidos (idas e voltas OCPP) por hora;
+#   - maior rajada de pedidos no mesmo segundo;
+#   - erro médio entre a potência real e a última lida pelo gateway (W por
+#     carregador), que é o que o controle de demanda enxerga.
+#
+#   python benchmarks/bench_meter_poll.py [--chargers 500] [--volatile 0.2] [--minutes 60]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import meter_poll
+from meter_poll import MeterPollScheduler
+#----------------------------------------------------------
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Site:
+
+    def __init__(self, chargers, volatile_fraction, seed):
+        self.rng = random.Random(seed)
+        self.cp_ids = [f"CP{i:04d}" for i in range(chargers)]
+        self.volatile = {cp_id for i, cp_id in enumerate(self.cp_ids) if i < chargers * volatile_fraction}
+        self.power = {cp_id: self.rng.uniform(3000.0, 11000.0) for cp_id in self.cp_ids}
+        self.known = dict(self.power)
+
+    def step(self):
+        for cp_id in self.volatile:
+            if self.rng.random() < 1.0 / 20.0:
+                self.power[cp_id] = self.rng.uniform(1500.0, 11000.0)
+
+    def error_W(self):
+        return sum(abs(self.power[c] - self.known[c]) for c in self.cp_ids) / len(self.cp_ids)
+
+
+async def simulate(site, minutes, adaptive):
+    clock = FakeClock()
+    meter_poll.time = clock
+    triggers = []
+
+    async def trigger(cp_id):
+        triggers.append(int(clock.now))
+        site.known[cp_id] = site.power[cp_id]
+        if adaptive:
+            scheduler.observe(cp_id, site.power[cp_id])
+
+    scheduler = MeterPollScheduler(trigger, jitter=0.1)
+    errors = []
+    seconds = int(minutes * 60)
+    for t in range(seconds):
+        clock.now = float(t)
+        site.step()
+        # Trecho com o site perto do limite no meio da simulação
+        pressure = seconds // 3 <= t < seconds // 2
+        if adaptive:
+            scheduler.poll_due(site.cp_ids, pressure)
+        elif t % 60 == 0:
+            for cp_id in site.cp_ids:
+                await trigger(cp_id)
+        await asyncio.sleep(0)
+        errors.append(site.error_W())
+    burst = max(triggers.count(t) for t in set(triggers)) if triggers else 0
+    return len(triggers) * 60.0 / minutes, burst, sum(errors) / len(errors)
+
+
+async def run(args):
+    print(f"carregadores: {args.chargers} | com potência variando: {args.volatile:.0%} | {args.minutes} min simulados")
+    for label, adaptive in (("antes (60 s, todos juntos)", False), ("depois (adaptativo)", True)):
+        per_hour, burst, error = await simulate(Site(args.chargers, args.volatile, args.seed), args.minutes, adaptive)
+        print(f"{label:28s}: {per_hour:7.0f} pedidos/h | maior rajada {burst:5d}/s | erro médio {error:6.0f} W/carregador")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=500)
+    parser.add_argument("--volatile", type=float, default=0.2)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
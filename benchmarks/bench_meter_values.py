@@ -0,0 +1,117 @@
+#----------------------------------------------------------
+# Benchmark: potência só por TriggerMessage (antes) x MeterValues periódicos
+# configurados na conexão (depois), em tempo simulado.
+#
+# N carregadores em carga durante `--minutes`. Antes: o gateway pede
+# MeterValues e lê só a primeira amostra de cada frame. Depois: o carregador
+# envia MeterValues a cada `--sample-interval` s (frames com
+# `--samples-per-frame` meterValue, 3 fases) e o agendador de pedidos só
+# dispara quando as amostras param de chegar. Mede-se:
+#   - chamadas originadas pelo gateway (TriggerMessage + ChangeConfiguration);
+#   - amostras de potência aproveitadas por carregador por hora;
+#   - custo (µs) para ler um frame com o parser novo.
+#
+#   python benchmarks/bench_meter_values.py [--chargers 200] [--minutes 60]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import meter_poll
+from meter_poll import MeterPollScheduler
+from meter_values import power_samples
+#----------------------------------------------------------
+
+CONFIG_CALLS_PER_CONNECT = 2   # MeterValuesSampledData + MeterValueSampleInterval
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_frame(start, samples, step_s):
+    meter_value = []
+    for i in range(samples):
+        ts = (start + timedelta(seconds=i * step_s)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        meter_value.append({"timestamp": ts, "sampledValue": [
+            {"measurand": "Power.Active.Import", "phase": phase, "value": "2.3", "unit": "kW"} for phase in ("L1-N", "L2-N", "L3-N")
+        ] + [{"measurand": "Current.Import", "phase": phase, "value": "10", "unit": "A"} for phase in ("L1", "L2", "L3")]})
+    return {"connectorId": 1, "meterValue": meter_value}
+
+
+def first_sample_only(payload):
+    # Parser anterior: meterValue[0], primeiro Power.Active.Import
+    for v in payload.get("meterValue", [{}])[0].get("sampledValue", []):
+        if v.get("measurand") == "Power.Active.Import":
+            power = float(v.get("value", 0))
+            return power * 1000.0 if v.get("unit") == "kW" else power
+    return None
+
+
+async def simulate(chargers, minutes, periodic, sample_interval_s, samples_per_frame):
+    clock = FakeClock()
+    meter_poll.time = clock
+    cp_ids = [f"CP{i:04d}" for i in range(chargers)]
+    frame = make_frame(datetime(2025, 1, 1), samples_per_frame, sample_interval_s)
+    counts = {"triggers": 0, "samples": 0}
+
+    def deliver(cp_id, payload, scheduler):
+        if periodic:
+            counts["samples"] += len(power_samples(payload))
+        elif first_sample_only(payload) is not None:
+            counts["samples"] += 1
+        scheduler.observe(cp_id, 6900.0)
+
+    async def trigger(cp_id):
+        counts["triggers"] += 1
+        deliver(cp_id, make_frame(datetime(2025, 1, 1), 1, 0), scheduler)
+
+    scheduler = MeterPollScheduler(trigger)
+    frame_every_s = sample_interval_s * samples_per_frame
+    for t in range(int(minutes * 60)):
+        clock.now = float(t)
+        if periodic and t > 0:
+            for i, cp_id in enumerate(cp_ids):
+                if (t + i) % frame_every_s == 0:
+                    deliver(cp_id, frame, scheduler)
+        scheduler.poll_due(cp_ids)
+        await asyncio.sleep(0)
+    calls = counts["triggers"] + (CONFIG_CALLS_PER_CONNECT * chargers if periodic else 0)
+    return calls, counts["samples"] * 60.0 / minutes / chargers
+
+
+def parse_cost_us(samples_per_frame, repeat=20000):
+    frame = make_frame(datetime(2025, 1, 1), samples_per_frame, 10)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        power_samples(frame)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+async def run(args):
+    print(f"carregadores: {args.chargers} | {args.minutes} min simulados | amostragem {args.sample_interval} s, "
+          f"{args.samples_per_frame} amostra(s)/frame")
+    for label, periodic in (("antes (TriggerMessage)", False), ("depois (periódico)", True)):
+        calls, per_hour = await simulate(args.chargers, args.minutes, periodic, args.sample_interval, args.samples_per_frame)
+        print(f"{label:24s}: {calls:7d} chamadas do gateway | {per_hour:6.0f} amostras/carregador/h")
+    print(f"parser novo: {parse_cost_us(args.samples_per_frame):.1f} µs/frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=200)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--sample-interval", type=int, default=10)
+    parser.add_argument("--samples-per-frame", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
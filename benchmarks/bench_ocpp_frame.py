@@ -0,0 +1,116 @@
+#----------------------------------------------------------
+# Benchmark: CPU por frame de carregador, antes e depois do OcppFrame.
+#
+# Monta uma rodada de frames de N carregadores (MeterValues, Heartbeat,
+# StatusNotification, DataTransfer, CallResult para o CSMS e CallResult de
+# TriggerMessage do próprio gateway) e mede só o trabalho de CPU que o
+# gateway faz em cada frame:
+#   antes  -> json.loads para o uplink + json.loads para o estado +
+#             json.dumps do pacote bruto no lote do uplink
+#   depois -> OcppFrame (um json.loads, que também valida o frame) e
+#             encode_packet reaproveitando o texto original
+#
+#   python benchmarks/bench_ocpp_frame.py [--chargers 1000] [--rounds 20]
+#----------------------------------------------------------
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ocpp_frame import OcppFrame, CALL_RESULT, encode_packet
+#----------------------------------------------------------
+
+DECODED_ACTIONS = ("StatusNotification", "MeterValues")
+MEASURANDS = [
+    ("Power.Active.Import", "kW"), ("Energy.Active.Import.Register", "Wh"), ("Current.Import", "A"),
+    ("Current.Offered", "A"), ("Voltage", "V"), ("Power.Offered", "kW"), ("SoC", "Percent"),
+    ("Temperature", "Celsius"),
+]
+
+
+def build_round(chargers):
+    """Frames de uma rodada e o conjunto de ids pendentes do gateway."""
+    frames, pending = [], set()
+    for i in range(chargers):
+        cp = f"CP{i:05d}"
+        sampled = [{"value": f"{1.5 * (k + 1):.2f}", "measurand": m, "unit": u, "context": "Sample.Periodic"}
+                   for k, (m, u) in enumerate(MEASURANDS)]
+        frames.append((cp, json.dumps([2, str(uuid.uuid4()), "MeterValues", {
+            "connectorId": 1, "transactionId": i,
+            "meterValue": [{"timestamp": "2025-11-03T14:00:00Z", "sampledValue": sampled}]}])))
+        frames.append((cp, json.dumps([2, str(uuid.uuid4()), "Heartbeat", {}])))
+        frames.append((cp, json.dumps([2, str(uuid.uuid4()), "DataTransfer", {
+            "vendorId": "TCharge", "messageId": "diag", "data": json.dumps({"fw": "1.2.3", "temps": list(range(16))})}])))
+        frames.append((cp, json.dumps([3, str(uuid.uuid4()), {"configurationKey": [
+            {"key": f"Key{k}", "readonly": False, "value": str(k)} for k in range(10)]}])))
+        own_id = str(uuid.uuid4())
+        pending.add(own_id)
+        frames.append((cp, json.dumps([3, own_id, {"status": "Accepted"}])))
+        if i % 10 == 0:
+            frames.append((cp, json.dumps([2, str(uuid.uuid4()), "StatusNotification",
+                                           {"connectorId": 1, "status": "Charging", "errorCode": "NoError"}])))
+    return frames, pending
+
+
+def packet(cp, data, now):
+    return {"source": "carregador", "type": "carregador_raw", "charge_point_id": cp,
+            "data": data, "timestamp": now}
+
+
+def before(frames, pending):
+    now = datetime.now().isoformat()
+    for cp, message in frames:
+        try:
+            data = json.loads(message)
+        except Exception:
+            data = message
+        json.dumps(packet(cp, data, now))
+        msg_json = json.loads(message)
+        if msg_json[0] == 3 and msg_json[1] in pending:
+            continue
+        action = msg_json[2]
+        if action in DECODED_ACTIONS:
+            msg_json[3].get("status")
+
+
+def after(frames, pending):
+    now = datetime.now().isoformat()
+    for cp, message in frames:
+        frame = OcppFrame(message)
+        own = frame.msg_type_id == CALL_RESULT and frame.msg_id in pending
+        encode_packet(packet(cp, frame.uplink_data(), now))
+        if own:
+            continue
+        if frame.action in DECODED_ACTIONS:
+            frame.payload.get("status")
+
+
+def measure(fn, frames, pending, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(frames, pending)
+    return (time.process_time() - start) / (rounds * len(frames))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    frames, pending = build_round(args.chargers)
+    measure(before, frames, pending, 1)   # aquecimento
+    t_before = measure(before, frames, pending, args.rounds)
+    t_after = measure(after, frames, pending, args.rounds)
+
+    print(f"carregadores           : {args.chargers}")
+    print(f"frames por rodada      : {len(frames)}")
+    print(f"antes (json x2 + dumps): {t_before * 1e6:.1f} us/frame -> {len(frames) * t_before * 1e3:.1f} ms de CPU por rodada")
+    print(f"depois (OcppFrame)     : {t_after * 1e6:.1f} us/frame -> {len(frames) * t_after * 1e3:.1f} ms de CPU por rodada")
+    print(f"economia               : {(t_before - t_after) * 1e6:.1f} us/frame ({(1 - t_after / t_before) * 100:.0f}%)")
@@ -0,0 +1,80 @@
+#----------------------------------------------------------
+# Benchmark: alocação sem fases (antes) x com limite por fase,
+# allocation.phase_ceilings (depois).
+#
+# Site com disjuntor de `--phase-kw` por fase e outras cargas desiguais nas
+# fases. Carregadores monofásicos de 7,4 kW distribuídos de forma desigual
+# (metade em L1, 1/3 em L2, o resto em L3) e alguns trifásicos de 11 kW;
+# todos os carros aceitam o máximo. Compara-se:
+#   - sem fases, limite total = 3 x limite por fase (o que a instalação
+#     aguentaria equilibrada);
+#   - sem fases, limite total reduzido até nenhuma fase estourar (como é
+#     configurado hoje para compensar);
+#   - com fases, limite total = 3 x limite por fase.
+# Mede-se: pior estouro de fase (kW), potência entregue (kW) e tempo (ms).
+#
+#   python benchmarks/bench_phase_allocation.py [--single 60] [--three 10] [--phase-kw 150]
+#----------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from allocation import phase_ceilings, water_fill
+#----------------------------------------------------------
+
+
+def site(args):
+    phase_of = np.concatenate((np.zeros(args.single // 2), np.ones(args.single // 3),
+                               np.full(args.single - args.single // 2 - args.single // 3, 2))).astype(int)
+    share = np.zeros((args.single + args.three, 3))
+    share[np.arange(args.single), phase_of] = 1.0
+    share[args.single:] = 1.0 / 3
+    max_W = np.concatenate((np.full(args.single, 7400.0), np.full(args.three, 11000.0)))
+    other_W = np.array([0.15, 0.05, 0.10]) * args.phase_kw * 1000.0
+    return share, max_W, other_W
+
+
+def allocate(args, share, max_W, other_W, total_W, phases):
+    demand = max_W.copy()
+    limits = max_W.copy()
+    t0 = time.perf_counter()
+    ceilings = None
+    if phases:
+        ceilings = phase_ceilings(args.phase_kw * 1000.0 - other_W, share, demand, max_W, limits)
+    limits = water_fill(total_W - other_W.sum(), demand, max_W, limits, ceiling_W=ceilings)
+    elapsed = time.perf_counter() - t0
+    overload = max(0.0, (share.T @ limits + other_W - args.phase_kw * 1000.0).max())
+    return limits, overload, elapsed
+
+
+def run(args):
+    share, max_W, other_W = site(args)
+    full_W = 3 * args.phase_kw * 1000.0
+    # Maior limite total (passo de 1 kW) que, sem fases, não estoura nenhuma fase
+    safe_W = full_W
+    while safe_W > 0 and allocate(args, share, max_W, other_W, safe_W, False)[1] > 0:
+        safe_W -= 1000.0
+    print(f"site: {args.phase_kw:.0f} kW por fase | {args.single} monofásicos (7,4 kW: {args.single // 2} em L1, "
+          f"{args.single // 3} em L2, {args.single - args.single // 2 - args.single // 3} em L3) + {args.three} trifásicos (11 kW) | "
+          f"outras cargas {', '.join(f'{w / 1000:.0f}' for w in other_W)} kW")
+    for label, total_W, phases in ((f"sem fases, total {full_W / 1000:.0f} kW", full_W, False),
+                                   (f"sem fases, total {safe_W / 1000:.0f} kW", safe_W, False),
+                                   (f"com fases, total {full_W / 1000:.0f} kW", full_W, True)):
+        limits, overload, elapsed = allocate(args, share, max_W, other_W, total_W, phases)
+        per_phase = share.T @ limits + other_W
+        print(f"{label:26s}: estouro de fase {overload / 1000.0:6.1f} kW | entregue {limits.sum() / 1000.0:6.1f} kW | "
+              f"fases {' / '.join(f'{w / 1000:.0f}' for w in per_phase)} kW | {elapsed * 1000.0:5.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--single", type=int, default=60)
+    parser.add_argument("--three", type=int, default=10)
+    parser.add_argument("--phase-kw", type=float, default=150.0)
+    run(parser.parse_args())
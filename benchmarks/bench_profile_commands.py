@@ -0,0 +1,100 @@
+#----------------------------------------------------------
+# Benchmark: envio de SetChargingProfile pelo controle de demanda,
+# gather de todos os envios (antes) x canal por carregador (depois).
+#
+# N carregadores falsos respondem Accepted após `--rtt-ms`; uma fração deles
+# está travada (o send nunca retorna). O controle roda `--passes` passadas
+# em sobrecarga (antes: reenvia para todos a cada passada) com limites que
+# oscilam entre dois valores. Mede-se:
+#   - duração de cada passada de controle (o gather espera os travados);
+#   - comandos enviados, agrupados, já confirmados e expirados.
+#
+#   python benchmarks/bench_profile_commands.py [--chargers 200] [--stuck 0.05]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from profile_commands import ProfileCommands
+#----------------------------------------------------------
+
+
+class FakeCharger:
+
+    def __init__(self, rtt_s, stuck):
+        self.rtt_s = rtt_s
+        self.stuck = stuck
+        self.sent = 0
+
+    async def send_charging_profile(self, limit_W):
+        if self.stuck:
+            await asyncio.Event().wait()   # socket travado
+        self.sent += 1
+        future = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().call_later(self.rtt_s, future.set_result, {"status": "Accepted"})
+        return future
+
+
+def make_chargers(n, stuck_fraction, rtt_s):
+    n_stuck = int(n * stuck_fraction)
+    return {f"CP{i:04d}": FakeCharger(rtt_s, i < n_stuck) for i in range(n)}
+
+
+def limit_for(pass_no, i):
+    return 3000.0 + 1000.0 * ((pass_no + i) % 2)
+
+
+async def before(chargers, passes, interval_s, deadline_s):
+    # Passada antiga: reenvia para todos (sobrecarga) e espera todos os envios
+    durations = []
+    for p in range(passes):
+        start = time.monotonic()
+        tasks = [c.send_charging_profile(limit_for(p, i)) for i, c in enumerate(chargers.values())]
+        # Sem o prazo a passada nunca terminaria; o prazo aqui só limita o benchmark
+        _, stuck = await asyncio.wait([asyncio.ensure_future(t) for t in tasks], timeout=deadline_s)
+        for task in stuck:
+            task.cancel()
+        durations.append(time.monotonic() - start)
+        await asyncio.sleep(interval_s)
+    return durations, sum(c.sent for c in chargers.values())
+
+
+async def after(chargers, passes, interval_s, deadline_s):
+    commands = ProfileCommands(lambda cp_id, limit: chargers[cp_id].send_charging_profile(limit), deadline_s=deadline_s)
+    durations = []
+    for p in range(passes):
+        start = time.monotonic()
+        for i, cp_id in enumerate(chargers):
+            commands.set_limit(cp_id, limit_for(p, i))
+        durations.append(time.monotonic() - start)
+        await asyncio.sleep(interval_s)
+    await asyncio.sleep(deadline_s)
+    return durations, commands.stats()
+
+
+async def run(args):
+    logging.getLogger().setLevel(logging.ERROR)
+    rtt_s = args.rtt_ms / 1000.0
+    durations, sent = await before(make_chargers(args.chargers, args.stuck, rtt_s), args.passes, args.interval, args.deadline)
+    print(f"carregadores: {args.chargers} | travados: {args.stuck:.0%} | RTT: {args.rtt_ms:.0f} ms | passadas: {args.passes}")
+    print(f"antes (gather)  : passada média {statistics.mean(durations) * 1000:8.1f} ms | máx {max(durations) * 1000:8.1f} ms | enviados {sent}")
+    durations, stats = await after(make_chargers(args.chargers, args.stuck, rtt_s), args.passes, args.interval, args.deadline)
+    print(f"depois (canal)  : passada média {statistics.mean(durations) * 1000:8.1f} ms | máx {max(durations) * 1000:8.1f} ms | {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=200)
+    parser.add_argument("--stuck", type=float, default=0.05)
+    parser.add_argument("--rtt-ms", type=float, default=800.0)
+    parser.add_argument("--passes", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--deadline", type=float, default=3.0)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,133 @@
+#----------------------------------------------------------
+# Benchmark: encaminhamento carregador -> CSMS com `await send` no laço de
+# leitura (antes) x fila de envio por conexão, send_queue.LinkWriter (depois).
+#
+# N carregadores enviam um frame a cada `--frame-ms`. O CSMS falso leva
+# `--send-ms` por frame e, no meio da rodada, trava por `--stall` s (rede
+# lenta / CSMS sobrecarregado). Mede-se, por frame:
+#   - atraso de leitura: do envio pelo carregador até o handler processá-lo
+#     (é quando o controle de demanda vê a potência);
+#   - frames entregues ao CSMS, em ordem, e frames que passaram pelo buffer.
+#
+#   python benchmarks/bench_send_queue.py [--chargers 50] [--stall 2]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from message_buffer import MessageBuffer, DIRECTION_TO_CSMS
+from send_queue import LinkWriter
+#----------------------------------------------------------
+
+
+class SlowUpstream:
+    """Websocket do CSMS: cada send custa `send_s`; durante o travamento, espera ele acabar."""
+
+    def __init__(self, send_s, stall):
+        self.send_s = send_s
+        self.stall = stall
+        self.received = []
+
+    async def send(self, message):
+        await asyncio.sleep(self.send_s)
+        if not self.stall.is_set():
+            await self.stall.wait()
+        self.received.append(message)
+
+
+async def charger(cp_id, inbox, frames, frame_s):
+    for seq in range(frames):
+        await inbox.put((seq, time.monotonic()))
+        await asyncio.sleep(frame_s)
+    await inbox.put(None)
+
+
+async def reader(inbox, forward, lags):
+    # Laço de leitura do local_server_handler: processa o frame e encaminha
+    while True:
+        item = await inbox.get()
+        if item is None:
+            return
+        seq, sent_at = item
+        lags.append(time.monotonic() - sent_at)
+        await forward(seq)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000.0
+
+
+async def run_mode(args, after, spill_dir):
+    stall = asyncio.Event()
+    stall.set()
+    lags = []
+    links = []
+    tasks = []
+    for i in range(args.chargers):
+        cp_id = f"CP{i:04d}"
+        upstream = SlowUpstream(args.send_ms / 1000.0, stall)
+        buffer = MessageBuffer(cp_id, DIRECTION_TO_CSMS, spill_dir, memory_cap=args.memory_cap)
+        if after:
+            writer = LinkWriter(cp_id, upstream, buffer, maxsize=args.queue).start()
+
+            async def forward(seq, writer=writer):
+                writer.offer(seq)
+        else:
+            writer = None
+
+            async def forward(seq, upstream=upstream):
+                await upstream.send(seq)
+        links.append((upstream, buffer, writer))
+        inbox = asyncio.Queue()
+        tasks.append(asyncio.create_task(reader(inbox, forward, lags)))
+        tasks.append(asyncio.create_task(charger(cp_id, inbox, args.frames, args.frame_ms / 1000.0)))
+
+    async def stall_csms():
+        await asyncio.sleep(args.frames * args.frame_ms / 2000.0)
+        stall.clear()
+        await asyncio.sleep(args.stall)
+        stall.set()
+
+    start = time.monotonic()
+    await asyncio.gather(stall_csms(), *tasks)
+    read_done = time.monotonic() - start
+    total = args.chargers * args.frames
+    while sum(len(upstream.received) for upstream, _, _ in links) < total:
+        await asyncio.sleep(0.01)
+    delivered_done = time.monotonic() - start
+    in_order = all(upstream.received == list(range(args.frames)) for upstream, _, _ in links)
+    spilled = sum(writer.spilled for _, _, writer in links if writer is not None)
+    for _, _, writer in links:
+        if writer is not None:
+            writer.close()
+    return lags, read_done, delivered_done, in_order, spilled
+
+
+async def run(args):
+    print(f"carregadores: {args.chargers} | {args.frames} frames a cada {args.frame_ms:.0f} ms | "
+          f"send {args.send_ms:.0f} ms, CSMS travado {args.stall} s | fila {args.queue}")
+    for label, after in (("antes (send no laço)", False), ("depois (LinkWriter)", True)):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            lags, read_done, delivered_done, in_order, spilled = await run_mode(args, after, spill_dir)
+        print(f"{label:22s}: atraso de leitura p50 {percentile(lags, 0.5):7.1f} ms | p99 {percentile(lags, 0.99):7.1f} ms | "
+              f"máx {max(lags) * 1000.0:7.1f} ms | leitura em {read_done:5.1f} s, entrega em {delivered_done:5.1f} s | "
+              f"em ordem: {'sim' if in_order else 'NÃO'} | pelo buffer {spilled}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--frame-ms", type=float, default=50.0)
+    parser.add_argument("--send-ms", type=float, default=5.0)
+    parser.add_argument("--stall", type=float, default=2.0)
+    parser.add_argument("--queue", type=int, default=20)
+    parser.add_argument("--memory-cap", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
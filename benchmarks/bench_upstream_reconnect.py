@@ -0,0 +1,145 @@
+#----------------------------------------------------------
+# Benchmark: recuperação das conexões upstream após uma queda do CSMS,
+# espera fixa de 10 s (antes) x ReconnectManager (depois).
+#
+# N clientes websocket (um por carregador) ficam conectados a um CSMS falso
+# local. O CSMS cai por `--outage` s e volta. O handshake custa
+# `--handshake-ms` e o CSMS recusa (HTTP 503) o que passar de
+# `--server-capacity` handshakes simultâneos, como um servidor TLS
+# sobrecarregado. Mede-se, a partir da volta do CSMS:
+#   - tempo até todos reconectarem;
+#   - pico de handshakes simultâneos e handshakes recusados.
+#
+#   python benchmarks/bench_upstream_reconnect.py [--chargers 300] [--outage 5]
+#----------------------------------------------------------
+import argparse
+import asyncio
+import http
+import logging
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import websockets
+from reconnect import ReconnectManager
+#----------------------------------------------------------
+
+
+class FakeCsms:
+
+    def __init__(self, port, handshake_s, capacity):
+        self.port = port
+        self.handshake_s = handshake_s
+        self.capacity = capacity
+        self.server = None
+        self.handshaking = 0
+        self.peak = 0
+        self.rejected = 0
+
+    async def process_request(self, path, headers):
+        if self.handshaking >= self.capacity:
+            self.rejected += 1
+            return http.HTTPStatus.SERVICE_UNAVAILABLE, [], b""
+        self.handshaking += 1
+        self.peak = max(self.peak, self.handshaking)
+        try:
+            await asyncio.sleep(self.handshake_s)
+        finally:
+            self.handshaking -= 1
+        return None
+
+    async def handler(self, websocket, path=None):
+        await websocket.wait_closed()
+
+    async def start(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", self.port, process_request=self.process_request)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def client_before(url, cp_id, connected):
+    # Laço anterior do external_client_handler: tenta, e espera 10 s após qualquer queda
+    while True:
+        try:
+            async with websockets.connect(url, open_timeout=10) as ws:
+                connected.add(cp_id)
+                await ws.wait_closed()
+        except Exception:
+            pass
+        finally:
+            connected.discard(cp_id)
+        await asyncio.sleep(10)
+
+
+async def client_after(url, cp_id, connected, manager):
+    while True:
+        ws = None
+        try:
+            ws = await manager.connect(cp_id, lambda: websockets.connect(url, open_timeout=10))
+            connected.add(cp_id)
+            await ws.wait_closed()
+        except Exception:
+            pass
+        finally:
+            connected.discard(cp_id)
+        await manager.wait_before_retry(cp_id)
+
+
+async def wait_all(connected, n, timeout):
+    deadline = time.monotonic() + timeout
+    while len(connected) < n and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    return len(connected) == n
+
+
+async def run_mode(args, port, after):
+    csms = FakeCsms(port, args.handshake_ms / 1000.0, args.server_capacity)
+    await csms.start()
+    url = f"ws://127.0.0.1:{port}/ocpp"
+    connected = set()
+    manager = ReconnectManager(max_concurrent_handshakes=args.max_handshakes)
+    if after:
+        tasks = [asyncio.create_task(client_after(url, f"CP{i:04d}", connected, manager)) for i in range(args.chargers)]
+    else:
+        tasks = [asyncio.create_task(client_before(url, f"CP{i:04d}", connected)) for i in range(args.chargers)]
+    await wait_all(connected, args.chargers, 120)
+    await csms.stop()
+    await asyncio.sleep(args.outage)
+    csms.peak = csms.rejected = 0
+    await csms.start()
+    t0 = time.monotonic()
+    ok = await wait_all(connected, args.chargers, 120)
+    recovery = time.monotonic() - t0
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await csms.stop()
+    return recovery if ok else None, csms.peak, csms.rejected, manager.stats() if after else None
+
+
+async def run(args):
+    logging.getLogger("websockets").setLevel(logging.CRITICAL)
+    print(f"carregadores: {args.chargers} | queda do CSMS: {args.outage} s | handshake {args.handshake_ms:.0f} ms, "
+          f"capacidade do CSMS {args.server_capacity} simultâneos")
+    for label, after, port in (("antes (10 s fixos)", False, args.port), ("depois (backoff + teto)", True, args.port + 1)):
+        recovery, peak, rejected, stats = await run_mode(args, port, after)
+        recovery_str = f"{recovery:6.1f} s" if recovery is not None else "  >120 s"
+        print(f"{label:24s}: todos reconectados em {recovery_str} | pico de handshakes {peak:4d} | recusados {rejected:5d}")
+        if stats:
+            print(f"{'':24s}  {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", type=int, default=300)
+    parser.add_argument("--outage", type=float, default=5.0)
+    parser.add_argument("--handshake-ms", type=float, default=50.0)
+    parser.add_argument("--server-capacity", type=int, default=50)
+    parser.add_argument("--max-handshakes", type=int, default=20)
+    parser.add_argument("--port", type=int, default=18101)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,111 @@
+#----------------------------------------------------------
+# Fases do site em que cada carregador está ligado.
+#
+# Origem, em ordem de prioridade:
+#   1. arquivo de configuração (charger_phases.json), com as fases DO SITE,
+#      o que cobre a rotação de fases na instalação:
+#        {"CP001": ["L2"], "CP002": ["L1", "L2", "L3"]}
+#   2. inferido das leituras por fase do próprio carregador (MeterValues):
+#      só QUANTAS fases ele usa. Os rótulos L1/L2/L3 do carregador são os
+#      dele, não os do site (um monofásico sempre reporta "L1"), então um
+#      carregador de k < 3 fases sem configuração pesa 1/k da potência em
+#      TODAS as fases do site (pode estar em qualquer uma). Para estimar o
+#      consumo dos outros por fase, esses carregadores não são descontados
+#      como se estivessem em todas (allocation.site_phase_ceilings);
+#   3. padrão: trifásico equilibrado (1/3 da potência em cada fase).
+# `shares(cp_ids)` devolve a matriz (n, 3) com a fração da potência de cada
+# carregador em cada fase (linhas somam 1, exceto as conservadoras),
+# refeita só quando algo muda.
+#----------------------------------------------------------
+import json
+import logging
+import os
+
+import numpy as np
+#----------------------------------------------------------
+
+PHASES = ("L1", "L2", "L3")
+THREE_PHASE = (1.0 / 3, 1.0 / 3, 1.0 / 3)
+
+
+def _row(phases):
+    share = 1.0 / len(phases)
+    return tuple(share if phase in phases else 0.0 for phase in PHASES)
+
+
+def _unknown_row(count):
+    # k fases do site desconhecidas: 1/k da potência contada em cada uma
+    return (1.0 / count,) * len(PHASES)
+
+
+def load_charger_phases(filename):
+    """{cp_id: fases} do arquivo; sem arquivo ou inválido, {}."""
+    if not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logging.error(f"Erro ao carregar fases dos carregadores de '{filename}': {e}. Ignorando.")
+        return {}
+    phases = {}
+    for cp_id, value in (data.items() if isinstance(data, dict) else []):
+        value = [value] if isinstance(value, str) else value
+        if isinstance(value, list) and value and all(phase in PHASES for phase in value):
+            phases[str(cp_id)] = tuple(value)
+        else:
+            logging.error(f"Fases inválidas para '{cp_id}' em '{filename}': {value!r}. Usando trifásico.")
+    logging.info(f"Fases de {len(phases)} carregadores carregadas de '{filename}'.")
+    return phases
+
+
+class ChargerPhases:
+    """Use só no loop asyncio."""
+
+    def __init__(self, configured=None, min_current_A=2.0, min_power_W=300.0, min_fraction=0.2):
+        self.configured = {cp_id: _row(phases) for cp_id, phases in (configured or {}).items()}
+        self.min_current_A = min_current_A
+        self.min_power_W = min_power_W
+        self.min_fraction = min_fraction
+        self._inferred = {}
+        self._version = 0
+        self._cache = (None, None, None)
+
+    def observe(self, cp_id, currents_A, phases_W):
+        """Leitura por fase de um carregador em carga; infere quantas fases ele usa se não estiverem configuradas."""
+        if cp_id in self.configured:
+            return
+        readings, minimum = (currents_A, self.min_current_A) if currents_A else (phases_W, self.min_power_W)
+        if not readings:
+            return
+        peak = max(readings.values())
+        if peak < minimum:
+            return
+        count = sum(1 for value in readings.values() if value >= max(minimum, peak * self.min_fraction))
+        row = _unknown_row(count) if count < len(PHASES) else THREE_PHASE
+        if self._inferred.get(cp_id) != row:
+            if row != THREE_PHASE:
+                logging.info(f"[PHASES {cp_id}] {count} fase(s) em uso, sem fase do site configurada "
+                             f"({count}/{len(PHASES)} da potência contada em cada fase do site).")
+            elif cp_id in self._inferred:
+                logging.info(f"[PHASES {cp_id}] Fases inferidas das leituras: trifásico.")
+            self._inferred[cp_id] = row
+            self._version += 1
+
+    def phases_of(self, cp_id):
+        row = self.configured.get(cp_id) or self._inferred.get(cp_id, THREE_PHASE)
+        return tuple(phase for phase, share in zip(PHASES, row) if share)
+
+    def known(self, cp_ids):
+        """Máscara: True onde a fração por fase é a real (configurada ou trifásica)."""
+        return self.shares(cp_ids).sum(axis=1) <= 1.0 + 1e-9
+
+    def shares(self, cp_ids):
+        """Matriz (len(cp_ids), 3); a mesma lista e nenhuma mudança devolvem a matriz anterior."""
+        ids, version, matrix = self._cache
+        if ids is cp_ids and version == self._version:
+            return matrix
+        matrix = np.array([self.configured.get(cp_id) or self._inferred.get(cp_id, THREE_PHASE) for cp_id in cp_ids],
+                          dtype=float).reshape(len(cp_ids), len(PHASES))
+        self._cache = (cp_ids, self._version, matrix)
+        return matrix
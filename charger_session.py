@@ -0,0 +1,52 @@
+#----------------------------------------------------------
+# Regras de sessão de carga aplicadas pelos handlers do carregador:
+# status vindo do StatusNotification, status inferido pela potência dos
+# MeterValues e quando liberar o carregador (limite = máximo aprendido)
+# fora do controle de demanda.
+#
+# Carregador pausado pelo controle (state["paused"], limite 0 W) não é
+# liberado quando a potência cai ou quando ele reporta SuspendedEVSE /
+# SuspendedEV: isso é a própria pausa. Ele continua com o controle, que o
+# retoma quando houver potência. Só o fim da sessão (Available, Finishing,
+# Faulted...) tira a pausa e libera o carregador.
+#----------------------------------------------------------
+from charger_table import CHARGING
+#----------------------------------------------------------
+
+INFERENCE_POWER_W = 500.0
+# Status em que a sessão continua (com ou sem consumo)
+SESSION_STATUSES = (CHARGING, "SuspendedEV", "SuspendedEVSE")
+
+RELEASE = "release"            # libera o carregador (máximo aprendido)
+KEEP_PAUSED = "keep_paused"    # pausado pelo controle: limite de 0 W mantido
+
+
+def status_notified(state, new_status):
+    """Aplica o status reportado. Devolve (status anterior, RELEASE / KEEP_PAUSED / None)."""
+    old_status = state["status"]
+    state["status"] = new_status
+    if state["paused"]:
+        if new_status in SESSION_STATUSES:
+            # Voltar a 'Charging' é a retomada; o controle tira a pausa na próxima passada
+            keep = new_status not in (old_status, CHARGING)
+            return old_status, KEEP_PAUSED if keep else None
+        state["paused"] = False
+        return old_status, RELEASE
+    if old_status == CHARGING and new_status not in (CHARGING, "SuspendedEV"):
+        return old_status, RELEASE
+    return old_status, None
+
+
+def power_observed(state, power_W):
+    """
+    Inferência de status pela potência medida. Devolve (status inferido ou
+    None, RELEASE / None); carregador pausado não tem o status inferido.
+    """
+    status = state["status"]
+    if power_W > INFERENCE_POWER_W and status not in SESSION_STATUSES:
+        state["status"] = CHARGING
+        return CHARGING, None
+    if power_W <= INFERENCE_POWER_W and status == CHARGING and not state["paused"]:
+        state["status"] = "Available"
+        return "Available", RELEASE
+    return None, None
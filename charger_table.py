@@ -0,0 +1,245 @@
+#----------------------------------------------------------
+# Tabela de estado dos carregadores em arrays NumPy (struct-of-arrays).
+#
+# Cada carregador ganha um índice inteiro fixo (a linha) na primeira vez
+# que conecta; carregadores nunca são removidos, só ficam "Offline".
+# Status (código int8), potência atual, máximo aprendido, limite atual e o
+# último limite alocado pelo controle ficam em arrays tipados; o resto
+# (buffers, potência por fase...) num dict por linha.
+#
+# Os handlers continuam usando `CHARGE_POINT_STATE[cp]["status"] = ...`:
+# a linha (`ChargerState`) encaminha os campos numéricos para os arrays e
+# atualiza, na hora, os agregados (conectados, em carga, potência em carga).
+# A lista de linhas em carga só é refeita quando algum status muda; o
+# controle de demanda lê as colunas dessas linhas de uma vez (vetorizado).
+#
+# "paused" marca o carregador que o controle pausou (limite 0 W). Ele
+# continua na lista "em carga" (o controle decide quando retomá-lo) mesmo
+# que reporte SuspendedEVSE, até receber potência de novo e voltar a
+# 'Charging', terminar a sessão ou ficar Offline.
+#----------------------------------------------------------
+import numpy as np
+#----------------------------------------------------------
+
+CHARGING = "Charging"
+OFFLINE = "Offline"
+# Status OCPP 1.6 + "Offline" do gateway; status desconhecidos ganham código novo
+STATUSES = [OFFLINE, "Available", "Preparing", CHARGING, "SuspendedEVSE", "SuspendedEV",
+            "Finishing", "Reserved", "Unavailable", "Faulted"]
+FLOAT_COLUMNS = ("current_power_W", "learned_max_power", "current_limit_W", "allocated_W")
+
+
+class ChargerState:
+    """Linha da tabela com a interface de dict que os handlers já usam."""
+
+    __slots__ = ("_table", "_row", "_extra")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+        self._extra = {}
+
+    def __getitem__(self, key):
+        table = self._table
+        if key == "status":
+            return table._statuses[table._status[self._row]]
+        if key == "paused":
+            return bool(table._paused[self._row])
+        if key in table._floats:
+            return float(table._floats[key][self._row])
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        table = self._table
+        if key == "status":
+            table._set_status(self._row, value)
+        elif key == "paused":
+            table._set_paused(self._row, bool(value))
+        elif key == "current_power_W":
+            table._set_power(self._row, float(value))
+        elif key in table._floats:
+            table._floats[key][self._row] = value
+        else:
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        return key in ("status", "paused") or key in self._table._floats or key in self._extra
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+class ChargerTable:
+    """Use só no loop asyncio (os handlers e o controle compartilham a tabela sem lock)."""
+
+    def __init__(self, capacity=64):
+        self._index = {}          # cp_id -> linha
+        self._ids = []            # linha -> cp_id
+        self._rows = []           # linha -> ChargerState
+        self._statuses = list(STATUSES)
+        self._status_codes = {status: code for code, status in enumerate(self._statuses)}
+        self._status = np.zeros(capacity, dtype=np.int8)
+        self._paused = np.zeros(capacity, dtype=bool)
+        self._floats = {name: np.zeros(capacity) for name in FLOAT_COLUMNS}
+        self._charging_cache = None
+        # Agregados mantidos a cada atualização
+        self.connected_count = 0
+        self.charging_count = 0
+        self.charging_power_W = 0.0
+
+    def _code(self, status):
+        code = self._status_codes.get(status)
+        if code is None:
+            code = self._status_codes[status] = len(self._statuses)
+            self._statuses.append(status)
+        return code
+
+    def _grow(self):
+        capacity = 2 * len(self._status)
+        status = np.zeros(capacity, dtype=np.int8)
+        status[:len(self._status)] = self._status
+        self._status = status
+        paused = np.zeros(capacity, dtype=bool)
+        paused[:len(self._paused)] = self._paused
+        self._paused = paused
+        for name, column in self._floats.items():
+            grown = np.zeros(capacity)
+            grown[:len(column)] = column
+            self._floats[name] = grown
+
+    def add(self, cp_id, status="Available", current_power_W=0.0, learned_max_power=0.0,
+            current_limit_W=0.0, **extra):
+        """Cria (ou sobrescreve) a linha do carregador e a devolve."""
+        row = self._index.get(cp_id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._status):
+                self._grow()
+            self._index[cp_id] = row
+            self._ids.append(cp_id)
+            self._rows.append(ChargerState(self, row))
+            self._status[row] = self._status_codes[OFFLINE]
+            self._paused[row] = False
+            for column in self._floats.values():
+                column[row] = 0.0
+        state = self._rows[row]
+        state._extra = dict(extra)
+        self._floats["learned_max_power"][row] = learned_max_power
+        self._floats["current_limit_W"][row] = current_limit_W
+        self._set_power(row, float(current_power_W))
+        self._set_status(row, status)
+        self._set_paused(row, False)
+        return state
+
+    def _in_control(self, row):
+        # Em carga ou pausado pelo controle (e conectado)
+        status = self._status[row]
+        return status == self._status_codes[CHARGING] or (
+            self._paused[row] and status != self._status_codes[OFFLINE])
+
+    def _update_control(self, row, was_in_control):
+        now = self._in_control(row)
+        if now == was_in_control:
+            return
+        self._charging_cache = None
+        power = self._floats["current_power_W"][row]
+        self.charging_count += 1 if now else -1
+        self.charging_power_W += power if now else -power
+
+    def _set_status(self, row, status):
+        old = self._statuses[self._status[row]]
+        if status == old:
+            return
+        was_in_control = self._in_control(row)
+        self._status[row] = self._code(status)
+        if status == OFFLINE:
+            self._paused[row] = False
+        # Mudou o status: o limite alocado antes não vale mais (os handlers
+        # liberam o carregador com o máximo aprendido fora do controle)
+        self._floats["allocated_W"][row] = np.nan
+        self._charging_cache = None
+        if old == OFFLINE:
+            self.connected_count += 1
+        elif status == OFFLINE:
+            self.connected_count -= 1
+        self._update_control(row, was_in_control)
+
+    def _set_paused(self, row, paused):
+        if paused == self._paused[row]:
+            return
+        was_in_control = self._in_control(row)
+        self._paused[row] = paused and self._status[row] != self._status_codes[OFFLINE]
+        self._update_control(row, was_in_control)
+
+    def set_paused(self, rows, paused):
+        """
+        Atualiza a pausa do controle nas linhas `rows` (`paused` alinhado).
+        Um carregador retomado só deixa de estar pausado quando volta a
+        'Charging'. Devolve [(cp_id, pausado)] das linhas que mudaram.
+        """
+        changed = []
+        charging_code = self._status_codes[CHARGING]
+        for row, pause in zip(np.asarray(rows).tolist(), np.asarray(paused, dtype=bool).tolist()):
+            if not pause and self._status[row] != charging_code:
+                continue
+            if pause != self._paused[row]:
+                self._set_paused(row, pause)
+                changed.append((self._ids[row], pause))
+        return changed
+
+    def _set_power(self, row, power_W):
+        column = self._floats["current_power_W"]
+        if self._in_control(row):
+            self.charging_power_W += power_W - column[row]
+        column[row] = power_W
+
+    def charging(self):
+        """
+        (cp_ids, linhas) dos carregadores em carga ou pausados pelo controle;
+        refeito só quando algum status (ou pausa) muda.
+        """
+        if self._charging_cache is None:
+            n = len(self._ids)
+            status = self._status[:n]
+            rows = np.flatnonzero((status == self._status_codes[CHARGING])
+                                  | (self._paused[:n] & (status != self._status_codes[OFFLINE])))
+            self._charging_cache = ([self._ids[row] for row in rows.tolist()], rows)
+            # Ressincroniza a soma incremental (evita acumular erro de arredondamento)
+            self.charging_power_W = float(self._floats["current_power_W"][rows].sum())
+        return self._charging_cache
+
+    def column(self, name, rows):
+        """Valores da coluna `name` nas linhas `rows` (cópia)."""
+        return self._floats[name][rows]
+
+    def set_column(self, name, rows, values):
+        self._floats[name][rows] = values
+
+    # --- Interface de dict (cp_id -> ChargerState) ---
+    def __contains__(self, cp_id):
+        return cp_id in self._index
+
+    def __getitem__(self, cp_id):
+        return self._rows[self._index[cp_id]]
+
+    def __setitem__(self, cp_id, fields):
+        self.add(cp_id, **fields)
+
+    def get(self, cp_id, default=None):
+        row = self._index.get(cp_id)
+        return default if row is None else self._rows[row]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(list(self._ids))
+
+    def items(self):
+        return list(zip(self._ids, self._rows))
+
+    def clear(self):
+        self.__init__(len(self._status))
+
+    def memory_bytes(self):
+        return self._status.nbytes + self._paused.nbytes + sum(column.nbytes for column in self._floats.values())
@@ -0,0 +1,77 @@
+#----------------------------------------------------------
+# Gatilho do loop de controle de demanda.
+#
+# Os handlers (medidor, StatusNotification, MeterValues) chamam
+# `notify(motivo)` quando algo relevante muda. O loop de controle espera em
+# `wait()`, que retorna:
+#   - após um evento, depois de `debounce_s` (para juntar uma rajada de
+#     eventos numa única reavaliação) e respeitando `min_interval_s` desde a
+#     última passada;
+#   - ou após `fallback_s` sem eventos (o tick periódico de antes).
+# Com `event_driven=False` só o tick periódico é usado.
+#----------------------------------------------------------
+import asyncio
+import time
+#----------------------------------------------------------
+
+REASON_PERIODIC = "periodico"
+
+
+class ControlTrigger:
+
+    def __init__(self, min_interval_s=1.0, debounce_s=0.2, fallback_s=10.0, event_driven=True):
+        self.min_interval_s = min_interval_s
+        self.debounce_s = debounce_s
+        self.fallback_s = fallback_s
+        self.event_driven = event_driven
+        self._event = None          # asyncio.Event criado em wait(), já dentro do loop
+        self._reasons = set()
+        self._first_event_at = None
+        self._last_run = time.monotonic()
+        # Métricas
+        self.runs = 0
+        self.runs_by_reason = {}
+        self.last_latency_s = None  # do primeiro evento até o início da reavaliação
+
+    def notify(self, reason):
+        """Marca que o estado mudou. Não bloqueia; chame do loop asyncio."""
+        if not self.event_driven:
+            return
+        if self._first_event_at is None:
+            self._first_event_at = time.monotonic()
+        self._reasons.add(reason)
+        if self._event is not None:
+            self._event.set()
+
+    async def wait(self):
+        """Espera o próximo motivo para reavaliar. Retorna o conjunto de motivos."""
+        if self._event is None:
+            self._event = asyncio.Event()
+            if self._reasons:
+                self._event.set()
+        timeout = self._last_run + self.fallback_s - time.monotonic()
+        if timeout > 0 and not self._event.is_set():
+            # asyncio.wait (e não wait_for): no Python 3.9-3.11 o wait_for pode
+            # engolir o cancelamento se o evento chegar no mesmo instante
+            waiter = asyncio.ensure_future(self._event.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=timeout)
+            finally:
+                waiter.cancel()
+        if self._event.is_set():
+            await asyncio.sleep(self.debounce_s)
+            remaining = self._last_run + self.min_interval_s - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+        self._event.clear()
+        reasons = self._reasons or {REASON_PERIODIC}
+        self._reasons = set()
+        now = time.monotonic()
+        if self._first_event_at is not None:
+            self.last_latency_s = now - self._first_event_at
+            self._first_event_at = None
+        self._last_run = now
+        self.runs += 1
+        for reason in reasons:
+            self.runs_by_reason[reason] = self.runs_by_reason.get(reason, 0) + 1
+        return reasons
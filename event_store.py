@@ -0,0 +1,467 @@
+#----------------------------------------------------------
+# Armazenamento colunar em disco, particionado por dia e por tipo de evento.
+#
+#   data/store/<tipo>/<AAAA-MM-DD>.npz             (np.savez_compressed)
+#   data/store/<tipo>/<AAAA-MM-DD>.<n>.part.npz    (acréscimos do dia)
+#
+# Cada sincronização incremental grava só os eventos novos num pedaço
+# `.part.npz` (custo proporcional ao trecho novo, não ao dia). Os pedaços
+# de um dia são compactados no `.npz` do dia quando ele fecha (chegam
+# eventos de um dia posterior) ou quando passam de MAX_CHUNKS_PER_DAY. O
+# `.npz` guarda o último pedaço que já incorporou ("through"), então uma
+# queda entre a compactação e a remoção dos pedaços não duplica eventos.
+#
+# Tipos: power (potência por carregador), status (StatusNotification),
+# control (sobrecargas/balanceamento), site (potência total do site) e
+# disconnect (desconexões de carregadores). Quem lê abre apenas as
+# partições dos dias que cruzam o intervalo pedido, então a memória usada
+# não depende de quantos meses de histórico existem.
+#
+# Os seriais de cada tipo ficam num índice pequeno (<tipo>/serials.json),
+# atualizado a cada escrita, para listar "todos os carregadores que já
+# apareceram" sem abrir as partições. Leitura, escrita e compactação usam o
+# mesmo lock; um pedaço removido por outro processo (o backfill) entre a
+# listagem e a leitura faz a leitura do dia recomeçar.
+#
+# O backfill grava, junto com as partições, o checkpoint de cada log do
+# gateway lido, então o sync_log seguinte continua do ponto em que o
+# backfill parou em vez de acrescentar de novo as mesmas linhas.
+#
+# Uso (backfill a partir dos logs já existentes):
+#   python event_store.py backfill logs/gateway logs/medidor
+#   python event_store.py backfill --store data/store gateway_2025-11-03.log medidor_2025-11-03.jsonl
+#----------------------------------------------------------
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from log_ingest import LogIngestor, feed_appended, has_appended
+#----------------------------------------------------------
+
+DEFAULT_STORE_DIR = os.path.join("data", "store")
+STORE_KINDS = ("power", "status", "control", "site", "disconnect")
+CHECKPOINTS_FILE = "checkpoints.json"
+SERIALS_FILE = "serials.json"
+MAX_CHUNKS_PER_DAY = 64
+
+_EPOCH = datetime(1970, 1, 1)
+_MS_PER_DAY = 86400000
+
+
+def _to_ms(dt):
+    # Timestamps do gateway são horário local "ingênuo", guardados como ms desde a época
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+
+def _day_of(ts_ms):
+    return date(1970, 1, 1) + timedelta(days=int(ts_ms // _MS_PER_DAY))
+
+
+def _parsed_to_columns(parsed):
+    # Converte um ParsedLog em {tipo: colunas}, com os seriais/status como texto
+    serials = np.array(parsed.serials if parsed.serials else [""], dtype=str)
+    statuses = np.array(parsed.statuses if parsed.statuses else [""], dtype=str)
+    return {
+        "power": {"ts": parsed.power_ts, "serial": serials[parsed.power_serial], "power_W": parsed.power_W},
+        "status": {"ts": parsed.status_ts, "serial": serials[parsed.status_serial], "status": statuses[parsed.status_code]},
+        "control": {"ts": parsed.control_ts},
+        "site": {"ts": parsed.site_ts, "power_W": parsed.site_W},
+        "disconnect": {"ts": parsed.disconnect_ts, "serial": serials[parsed.disconnect_serial]},
+    }
+
+
+class EventStore:
+    """Leitura e escrita das partições diárias. Seguro para várias threads (sessões do Streamlit)."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        # Reentrante: sync_log e backfill escrevem e compactam com o lock já tomado
+        self._lock = threading.RLock()
+
+    # --- Caminhos / listagem ---
+    def _path(self, kind, day):
+        return os.path.join(self.root, kind, f"{day.isoformat()}.npz")
+
+    def _chunk_path(self, kind, day, seq):
+        return os.path.join(self.root, kind, f"{day.isoformat()}.{seq:06d}.part.npz")
+
+    def _chunks(self, kind, day=None):
+        """[(dia, n, caminho)] dos pedaços ainda não compactados, em ordem."""
+        pattern = os.path.join(self.root, kind, f"{day.isoformat() if day else '*'}.*.part.npz")
+        found = []
+        for path in glob.glob(pattern):
+            name = os.path.basename(path).split(".")
+            try:
+                found.append((date.fromisoformat(name[0]), int(name[1]), path))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def days(self, kind="power"):
+        found = set()
+        with self._lock:
+            paths = glob.glob(os.path.join(self.root, kind, "*.npz"))
+        for path in paths:
+            if path.endswith(".tmp.npz"):
+                continue
+            try:
+                found.add(date.fromisoformat(os.path.basename(path).split(".")[0]))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def serials(self, kind):
+        """Todos os seriais que já apareceram em `kind`, lidos do índice (sem abrir partições)."""
+        with self._lock:
+            found = self._load_serials(kind)
+            if found is None:
+                # Store anterior ao índice: monta uma vez a partir dos dicionários das partições
+                found = self._scan_serials(kind)
+                self._save_serials(kind, found)
+        return sorted(found)
+
+    def _serials_path(self, kind):
+        return os.path.join(self.root, kind, SERIALS_FILE)
+
+    def _load_serials(self, kind):
+        try:
+            with open(self._serials_path(kind), "r", encoding="utf-8") as f:
+                return set(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, IOError, TypeError):
+            return self._scan_serials(kind)
+
+    def _save_serials(self, kind, serials):
+        path = self._serials_path(kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(sorted(serials), f)
+        os.replace(path + ".tmp", path)
+
+    def _scan_serials(self, kind):
+        found = set()
+        for path in glob.glob(os.path.join(self.root, kind, "*.npz")):
+            if path.endswith(".tmp.npz"):
+                continue
+            try:
+                with np.load(path, allow_pickle=False) as npz:
+                    if "serials" in npz:
+                        found.update(npz["serials"].tolist())
+            except FileNotFoundError:
+                continue
+        return found
+
+    def _index_serials(self, kind, serials):
+        known = self._load_serials(kind)
+        new = set(np.unique(np.asarray(serials, dtype=str)).tolist())
+        if known is None:
+            # Primeiro índice do tipo: inclui o que já estava nas partições
+            self._save_serials(kind, self._scan_serials(kind) | new)
+        elif not new <= known:
+            self._save_serials(kind, known | new)
+
+    # --- Escrita ---
+    @staticmethod
+    def _read_npz(path):
+        with np.load(path, allow_pickle=False) as npz:
+            columns = {"ts": npz["ts"]}
+            if "power_W" in npz:
+                columns["power_W"] = npz["power_W"]
+            if "serial_code" in npz:
+                columns["serial"] = npz["serials"][npz["serial_code"]]
+            if "status_code" in npz:
+                columns["status"] = npz["statuses"][npz["status_code"]]
+            through = int(npz["through"]) if "through" in npz else 0
+            return columns, through
+
+    def _through(self, kind, day):
+        path = self._path(kind, day)
+        if not os.path.exists(path):
+            return 0
+        with np.load(path, allow_pickle=False) as npz:
+            return int(npz["through"]) if "through" in npz else 0
+
+    def _load_day(self, kind, day, attempts=3):
+        """(colunas do dia, compactado + pedaços, ou None; through; pedaços ainda não incorporados)."""
+        for attempt in range(attempts):
+            try:
+                return self._read_day(kind, day)
+            except FileNotFoundError:
+                # Outro processo compactou o dia entre a listagem e a leitura: lista de novo
+                if attempt == attempts - 1:
+                    raise
+
+    def _read_day(self, kind, day):
+        path = self._path(kind, day)
+        base, through = self._read_npz(path) if os.path.exists(path) else (None, 0)
+        parts = [base] if base is not None else []
+        pending = [chunk for chunk in self._chunks(kind, day) if chunk[1] > through]
+        parts += [self._read_npz(chunk_path)[0] for _, _, chunk_path in pending]
+        columns = None
+        if len(parts) == 1:
+            columns = parts[0]
+        elif parts:
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+            order = np.argsort(columns["ts"], kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+        return columns, through, pending
+
+    def _load_raw(self, kind, day):
+        return self._load_day(kind, day)[0]
+
+    def _write_npz(self, path, columns, through=None):
+        order = np.argsort(columns["ts"], kind="stable")
+        arrays = {"ts": np.asarray(columns["ts"], dtype=np.int64)[order]}
+        if "power_W" in columns:
+            arrays["power_W"] = np.asarray(columns["power_W"], dtype=np.float32)[order]
+        if "serial" in columns:
+            serials, codes = np.unique(np.asarray(columns["serial"], dtype=str)[order], return_inverse=True)
+            arrays["serials"] = serials
+            arrays["serial_code"] = codes.astype(np.int32)
+        if "status" in columns:
+            statuses, codes = np.unique(np.asarray(columns["status"], dtype=str)[order], return_inverse=True)
+            arrays["statuses"] = statuses
+            arrays["status_code"] = codes.astype(np.int32)
+        if through is not None:
+            arrays["through"] = np.int64(through)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escreve em arquivo temporário e renomeia, para o leitor nunca ver uma partição pela metade
+        tmp_path = path[:-4] + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def _write_day(self, kind, day, columns):
+        # Substitui o dia inteiro; pedaços antigos ficam cobertos pelo "through"
+        chunks = self._chunks(kind, day)
+        self._write_npz(self._path(kind, day), columns, through=chunks[-1][1] if chunks else 0)
+        for _, _, path in chunks:
+            os.remove(path)
+
+    def _append_chunk(self, kind, day, columns):
+        chunks = self._chunks(kind, day)
+        seq = max([self._through(kind, day)] + [chunk[1] for chunk in chunks]) + 1
+        self._write_npz(self._chunk_path(kind, day, seq), columns)
+        return len(chunks) + 1
+
+    def compact(self, kind, day):
+        """Junta os pedaços do dia ao `.npz` do dia (O(dia), feito uma vez quando o dia fecha)."""
+        with self._lock:
+            columns, _, pending = self._load_day(kind, day)
+            stale = self._chunks(kind, day)
+            if not stale:
+                return
+            if pending:
+                self._write_npz(self._path(kind, day), columns, through=pending[-1][1])
+            for _, _, path in stale:
+                os.remove(path)
+
+    def write(self, kind, columns, append=True):
+        """
+        Grava `columns` (dict com 'ts' em ms e as demais colunas do tipo)
+        separando por dia. Com `append`, acrescenta um pedaço a cada partição
+        (compactando os dias já fechados); sem `append`, substitui as
+        partições dos dias presentes.
+        """
+        ts = np.asarray(columns["ts"], dtype=np.int64)
+        if not len(ts):
+            return
+        day_index = ts // _MS_PER_DAY
+        days = np.unique(day_index)
+        with self._lock:
+            for day_number in days:
+                mask = day_index == day_number
+                day = _day_of(int(day_number) * _MS_PER_DAY)
+                part = {name: np.asarray(values)[mask] for name, values in columns.items()}
+                if not append:
+                    self._write_day(kind, day, part)
+                elif self._append_chunk(kind, day, part) >= MAX_CHUNKS_PER_DAY:
+                    self.compact(kind, day)
+            if append:
+                # Dias anteriores ao mais recente gravado estão fechados
+                newest = _day_of(int(days[-1]) * _MS_PER_DAY)
+                for day in sorted({chunk_day for chunk_day, _, _ in self._chunks(kind) if chunk_day < newest}):
+                    self.compact(kind, day)
+            if "serial" in columns:
+                self._index_serials(kind, columns["serial"])
+
+    def write_parsed(self, parsed, append=True, kinds=STORE_KINDS):
+        for kind, columns in _parsed_to_columns(parsed).items():
+            if kind in kinds:
+                self.write(kind, columns, append=append)
+
+    # --- Leitura ---
+    def read(self, kind, start, end, serials=None):
+        """
+        Eventos de `kind` com start <= timestamp < end (datetime), lendo apenas
+        as partições dos dias que cruzam o intervalo. Retorna um DataFrame com
+        as mesmas colunas dos frames de log_ingest.ParsedLog.
+        """
+        start_ms, end_ms = _to_ms(start), _to_ms(end)
+        parts = []
+        day = start.date()
+        while _to_ms(datetime.combine(day, datetime.min.time())) < end_ms:
+            # Sob o lock: a compactação não remove um pedaço no meio da leitura
+            with self._lock:
+                raw = self._load_raw(kind, day)
+            if raw is not None:
+                mask = (raw["ts"] >= start_ms) & (raw["ts"] < end_ms)
+                if serials is not None and "serial" in raw:
+                    mask &= np.isin(raw["serial"], list(serials))
+                parts.append({name: values[mask] for name, values in raw.items()})
+            day += timedelta(days=1)
+        return _frame(kind, parts)
+
+    # --- Sincronização incremental a partir de um log que cresce ---
+    def _load_checkpoints(self):
+        path = os.path.join(self.root, CHECKPOINTS_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return {}
+
+    def _save_checkpoints(self, checkpoints):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, CHECKPOINTS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(checkpoints, f)
+        os.replace(path + ".tmp", path)
+
+    def set_checkpoints(self, updates):
+        """Grava os checkpoints {caminho absoluto: {offset, inode, size}} dados."""
+        with self._lock:
+            checkpoints = self._load_checkpoints()
+            checkpoints.update(updates)
+            self._save_checkpoints(checkpoints)
+
+    def sync_log(self, log_file):
+        """
+        Acrescenta às partições apenas as linhas novas de `log_file` desde a
+        última sincronização (checkpoint de offset/inode em checkpoints.json).
+        """
+        key = os.path.abspath(log_file)
+        with self._lock:
+            checkpoints = self._load_checkpoints()
+            cp = checkpoints.get(key, {})
+            offset, inode = cp.get("offset", 0), cp.get("inode")
+            if inode is not None and not has_appended(key, offset, inode):
+                return
+            ingestor = LogIngestor()
+            offset, inode, size = feed_appended(ingestor, key, offset, inode)
+            self.write_parsed(ingestor.result(), append=True)
+            checkpoints[key] = {"offset": offset, "inode": inode, "size": size}
+            self._save_checkpoints(checkpoints)
+
+
+def _frame(kind, parts):
+    def cat(name, dtype):
+        if not parts:
+            return np.array([], dtype=dtype)
+        return np.concatenate([p[name] for p in parts]).astype(dtype)
+
+    timestamps = pd.Series(cat("ts", np.int64).astype("datetime64[ms]").astype("datetime64[ns]"))
+    if kind == "power":
+        return pd.DataFrame({"timestamp": timestamps,
+                             "serial_number": pd.Categorical(cat("serial", str)),
+                             "potencia_W": cat("power_W", np.float32)})
+    if kind == "status":
+        return pd.DataFrame({"timestamp": timestamps,
+                             "serial_number": pd.Categorical(cat("serial", str)),
+                             "status": pd.Categorical(cat("status", str))})
+    if kind == "site":
+        return pd.DataFrame({"timestamp": timestamps, "power": cat("power_W", np.float32)})
+    if kind == "disconnect":
+        return pd.DataFrame({"timestamp": timestamps,
+                             "serial_number": pd.Categorical(cat("serial", str))})
+    return pd.DataFrame({"timestamp": timestamps})
+
+
+# --- Backfill a partir dos arquivos gateway_*.log e medidor_*.jsonl ---
+def read_meter_jsonl(path):
+    """Colunas do tipo 'site' (ts, power_W) a partir de um medidor_AAAA-MM-DD.jsonl."""
+    ts, power = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+                ts.append(_to_ms(datetime.fromisoformat(obj["timestamp"])))
+                power.append(float(obj["pt"]))
+            except Exception:
+                continue
+    return {"ts": np.array(ts, dtype=np.int64), "power_W": np.array(power, dtype=np.float32)}
+
+
+def _expand_inputs(paths):
+    gateway_files, meter_files = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            gateway_files += sorted(glob.glob(os.path.join(path, "gateway*.log*")))
+            meter_files += sorted(glob.glob(os.path.join(path, "medidor_*.jsonl")))
+        elif path.endswith(".jsonl"):
+            meter_files.append(path)
+        else:
+            gateway_files.append(path)
+    return gateway_files, meter_files
+
+
+def backfill(store, paths):
+    """
+    Reconstrói as partições dos dias cobertos pelos arquivos dados. Todos os
+    arquivos são lidos antes da escrita, e cada dia encontrado é substituído
+    (rodar o backfill duas vezes não duplica eventos). A potência do site vem
+    dos JSONL do medidor quando existirem para o dia; senão, das linhas
+    '[METER_SERVER]' do log do gateway.
+
+    O checkpoint de cada log do gateway passa a ser o ponto em que o backfill
+    parou, para o sync_log não acrescentar de novo as linhas já importadas.
+    Uma última linha sem '\\n' (ainda sendo escrita) fica para o sync_log.
+    """
+    gateway_files, meter_files = _expand_inputs(paths)
+    ingestor = LogIngestor()
+    checkpoints = {}
+    for path in gateway_files:
+        logging.info(f"[STORE] Lendo log do gateway '{path}'...")
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            offset = ingestor.feed(f)
+        checkpoints[os.path.abspath(path)] = {"offset": offset, "inode": st.st_ino, "size": st.st_size}
+    columns = _parsed_to_columns(ingestor.result())
+
+    if meter_files:
+        meter = [read_meter_jsonl(path) for path in meter_files]
+        meter = {name: np.concatenate([m[name] for m in meter]) for name in ("ts", "power_W")}
+        meter_days = set(np.unique(meter["ts"] // _MS_PER_DAY).tolist())
+        site = columns["site"]
+        keep = ~np.isin(site["ts"] // _MS_PER_DAY, list(meter_days))
+        columns["site"] = {name: np.concatenate([site[name][keep], meter[name]]) for name in site}
+        logging.info(f"[STORE] {len(meter['ts'])} leituras do medidor em {len(meter_files)} arquivo(s).")
+
+    with store._lock:
+        for kind, kind_columns in columns.items():
+            store.write(kind, kind_columns, append=False)
+            logging.info(f"[STORE] '{kind}': {len(kind_columns['ts'])} eventos gravados.")
+        store.set_checkpoints(checkpoints)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Armazenamento particionado por dia dos eventos do gateway.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bf = sub.add_parser("backfill", help="Importa logs gateway_*.log e medidor_*.jsonl existentes.")
+    bf.add_argument("paths", nargs="+", help="Arquivos ou diretórios (ex.: logs/gateway logs/medidor)")
+    bf.add_argument("--store", default=DEFAULT_STORE_DIR, help=f"Diretório do store (padrão: {DEFAULT_STORE_DIR})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "backfill":
+        backfill(EventStore(args.store), args.paths)
+
+
+if __name__ == "__main__":
+    main()
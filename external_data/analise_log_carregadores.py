@@ -6,62 +6,17 @@ import plotly.graph_objs as go
 import pandas as pd
 import json
 import os
+import sys
 
+# log_ingest.py fica na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_ingest import ingest_log_file
+from power_resample import event_means_no_ramps
 
-power_re = re.compile(r"\[STATE UPDATE ([^]]+)\]: Potência atual: ([\\d.]+)W")
-status_re = re.compile(r"\[STATE UPDATE ([^]]+)\]: Status alterado de '([^']+)' para '([^']+)'")
-control_re = "[CONTROL] SOBRECARGA!"
 
 def parse_log(log_file):
-    chargers = {}
-    status_events = {}
-    control_events = []
-    all_times = set()
-    # Regex para StatusNotification no padrão '[FROM CHARGER ...]'
-    statusnotif_re = re.compile(r'\[FROM CHARGER ([^]]+)\]:.*StatusNotification.*"status"\s*:\s*"([A-Za-z]+)"')
-    # Regex para potência '[STATE UPDATE <id>]: Potência atual: <valor>W'
-    power_stateupdate_re = re.compile(r'\[STATE UPDATE ([^]]+)\]: Potência atual: ([\d.]+)W')
-    # Regex para identificar controle de demanda aplicado
-    control_applied_re = re.compile(r"\[CONTROL\] SOBRECARGA!.*Aplicando balanceamento\.")
-    with open(log_file, encoding="utf-8") as f:
-        for line in f:
-            try:
-                ts_str = line.split(" - ")[0]
-                timestamp = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S,%f")
-            except Exception:
-                continue
-            all_times.add(timestamp)
-            # Extrai status do padrão '[FROM CHARGER ...]: ...StatusNotification..."status":"Charging"...'
-            m_statusnotif = statusnotif_re.search(line)
-            if m_statusnotif:
-                cp_id = m_statusnotif.group(1).strip()
-                status = m_statusnotif.group(2)
-                if cp_id not in status_events:
-                    status_events[cp_id] = []
-                status_events[cp_id].append({
-                    "timestamp": timestamp,
-                    "status": status
-                })
-            # Extrai potência do padrão '[STATE UPDATE <id>]: Potência atual: <valor>W'
-            m_power = power_stateupdate_re.search(line)
-            if m_power:
-                cp_id = m_power.group(1).strip()
-                power = float(m_power.group(2))
-                if cp_id not in chargers:
-                    chargers[cp_id] = []
-                chargers[cp_id].append({
-                    "timestamp": timestamp,
-                    "power": power
-                })
-            # Identifica momento de controle de demanda aplicado
-            if control_applied_re.search(line):
-                control_events.append(timestamp)
-    # Filtra apenas IDs que parecem número de série (apenas dígitos ou letras, sem espaços, sem 'EXTERNAL SERVER')
-    def is_serial(cp_id):
-        return cp_id and not cp_id.startswith("EXTERNAL SERVER") and cp_id.replace(' ', '').isalnum()
-    serial_chargers = {cp_id: events for cp_id, events in chargers.items() if is_serial(cp_id)}
-    serial_status = {cp_id: events for cp_id, events in status_events.items() if is_serial(cp_id)}
-    return serial_chargers, serial_status, control_events, sorted(all_times)
+    # Ingestão colunar em passada única, compartilhada com o dashboard (ver log_ingest.py)
+    return ingest_log_file(log_file)
 
 def read_ie_meter_files(ie_files):
     if not ie_files:
@@ -86,9 +41,12 @@ def read_ie_meter_files(ie_files):
     df_ie_min = df_ie.groupby('minute').agg({'pt': 'mean'}).reset_index().rename(columns={'minute': 'timestamp', 'pt': 'pt_ie'})
     return df_ie_min
 
-def plot_chargers_and_total_per_day(chargers, status_events, control_events, all_times, df_ie_min, max_total_power=55000):
+def plot_chargers_and_total_per_day(log, df_ie_min, max_total_power=55000):
+    df_power = log.power_frame()
+    df_status = log.status_frame()
+    control_events = list(log.control_times())
     # Garante que todos os carregadores detectados (status ou potência) estejam presentes
-    cp_ids = sorted(set(list(chargers.keys()) + list(status_events.keys())))
+    cp_ids = sorted(set(df_power['serial_number'].unique()) | set(df_status['serial_number'].unique()))
     # Mapeamento dos nomes personalizados
     custom_names = {
         "0000324070000979": "0000324070000979 - 30kW (A)",
@@ -98,61 +56,18 @@ def plot_chargers_and_total_per_day(chargers, status_events, control_events, all
         "125020001148": "125020001148 - 7.5kW (C)",
         "125020001128": "125020001128 - 7.5kW (D)"
     }
-    if not all_times:
+    if df_power.empty and df_status.empty:
         print("Nenhum dado encontrado.")
         return
-    days = sorted({t.date() for t in all_times})
-    # Tolerância em minutos para considerar que o carregador ainda está carregando após último evento de potência
-    TOLERANCIA_MINUTOS = 2
-    from datetime import timedelta
-    for day in days:
-        times_day = [t for t in all_times if t.date() == day]
-        last_power = {cp_id: 0 for cp_id in cp_ids}
-        last_status = {cp_id: "Available" for cp_id in cp_ids}
-        status_idx = {cp_id: 0 for cp_id in cp_ids}
-        status_times = {cp_id: status_events.get(cp_id, []) for cp_id in cp_ids}
-        power_times = {cp_id: chargers.get(cp_id, []) for cp_id in cp_ids}
-        # Para cada carregador, mantém o timestamp do último evento de potência
-        last_power_time = {cp_id: None for cp_id in cp_ids}
-        data = []
-        for t in times_day:
-            row = {"timestamp": t}
-            total = 0
-            for cp_id in cp_ids:
-                # Atualiza status
-                statuses = status_times.get(cp_id, [])
-                while status_idx[cp_id] < len(statuses) and statuses[status_idx[cp_id]]["timestamp"] <= t:
-                    last_status[cp_id] = statuses[status_idx[cp_id]]['status']
-                    status_idx[cp_id] += 1
-                # Atualiza potência se mudou
-                pot_event = next((e for e in power_times.get(cp_id, []) if e['timestamp'] == t), None)
-                if pot_event is not None:
-                    last_power[cp_id] = pot_event['power']
-                    last_power_time[cp_id] = t
-                # NOVA LÓGICA: Se status não for 'Charging', mas houve evento de potência nos últimos X minutos, considera que está carregando
-                carregando = False
-                if last_status[cp_id] == 'Charging':
-                    carregando = True
-                elif last_power_time[cp_id] is not None and (t - last_power_time[cp_id]) <= timedelta(minutes=TOLERANCIA_MINUTOS):
-                    carregando = True
-                # Só zera se não está carregando
-                if not carregando:
-                    last_power[cp_id] = 0
-                row[cp_id] = last_power[cp_id]
-                total += last_power[cp_id]
-            row['total_power'] = total
-            data.append(row)
-        df = pd.DataFrame(data)
-        # Agrupa por minuto
-        df['minute'] = df['timestamp'].dt.floor('min')
-        agg_dict = {cp_id: 'mean' for cp_id in cp_ids}
-        agg_dict['total_power'] = 'mean'
-        df_min = df.groupby('minute').agg(agg_dict).reset_index().rename(columns={'minute': 'timestamp'})
-
-        # Se não houver dados de potência, adiciona colunas de carregadores com zero
-        for cp_id in cp_ids:
-            if cp_id not in df_min.columns:
-                df_min[cp_id] = 0
+    line_times = log.line_times()
+    for day in log.days():
+        times_day = line_times[line_times.dt.date == day]
+        if times_day.empty:
+            continue
+        # Regra "sem rampas" avaliada no instante de cada linha do log do dia e
+        # média por minuto (ver power_resample.event_means_no_ramps): o status vem
+        # do histórico completo, a potência só das amostras do próprio dia
+        df_min = event_means_no_ramps(df_power[df_power['timestamp'].dt.date == day], df_status, cp_ids, times_day)
 
         # Gráfico dos carregadores individuais
         fig = go.Figure()
@@ -259,25 +174,10 @@ if __name__ == "__main__":
     if not log_file:
         print("Nenhum arquivo selecionado.")
     else:
-        chargers, status_events, control_events, all_times = parse_log(log_file)
+        log = parse_log(log_file)
         df_ie_min = read_ie_meter_files(ie_files) if ie_files else None
-        # Contar desconexões por dia para todos os carregadores encontrados no log
-        disconnect_re = re.compile(r"\[Local Server\] Cliente '([^']+)' desconectado e removido\.")
-        disconnects = {}  # {cp_id: {day: count}}
-        with open(log_file, encoding="utf-8") as f:
-            for line in f:
-                m = disconnect_re.search(line)
-                if m:
-                    cp_id = m.group(1)
-                    try:
-                        ts_str = line.split(" - ")[0]
-                        timestamp = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S,%f")
-                        day = timestamp.date()
-                        if cp_id not in disconnects:
-                            disconnects[cp_id] = {}
-                        disconnects[cp_id][day] = disconnects[cp_id].get(day, 0) + 1
-                    except Exception:
-                        continue
+        # Desconexões por dia já extraídas na mesma passada da ingestão
+        disconnects = log.disconnect_counts()  # {cp_id: {day: count}}
         if disconnects:
             print("Resumo de desconexões por carregador:")
             # Remove duplicidades e garante ordenação única
@@ -292,4 +192,4 @@ if __name__ == "__main__":
                     print(f"  - {day.strftime('%d/%m/%Y')}: {count} vezes")
         else:
             print("Nenhuma desconexão encontrada para os carregadores.")
-        plot_chargers_and_total_per_day(chargers, status_events, control_events, all_times, df_ie_min, max_total_power=55000)
+        plot_chargers_and_total_per_day(log, df_ie_min, max_total_power=55000)
@@ -0,0 +1,110 @@
+#----------------------------------------------------------
+# Persistência write-behind do learned_powers.json.
+#
+# O loop asyncio só chama `update(cp_id, potência)`, que altera o mapa em
+# memória e marca o estado como sujo. Uma thread grava o arquivo inteiro no
+# máximo uma vez por `save_delay_s` (as alterações dentro da janela são
+# agrupadas numa única escrita), sempre via arquivo temporário + rename, de
+# modo que o JSON em disco nunca fica pela metade. `flush()` grava na hora
+# (usado no desligamento).
+#
+# O estado dos sketches de potência (power_sketch.py) vai no mesmo arquivo,
+# na chave SKETCHES_KEY; as demais chaves continuam sendo carregador -> W.
+#----------------------------------------------------------
+import json
+import logging
+import os
+import threading
+import time
+#----------------------------------------------------------
+
+SKETCHES_KEY = "_sketches"
+
+
+class LearnedPowersStore(threading.Thread):
+
+    def __init__(self, filename, save_delay_s=2.0):
+        super().__init__(name="learned-powers-writer", daemon=True)
+        self.filename = filename
+        self.save_delay_s = save_delay_s
+        self._powers = {}
+        self._sketches = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()   # a thread e flush() não gravam ao mesmo tempo
+        self._dirty_since = None   # monotonic da primeira alteração ainda não gravada
+        self._stopping = False
+        self.writes = 0
+
+    def load(self, powers, sketches=None):
+        """Define o conteúdo inicial (o que já está no arquivo), sem marcar como sujo."""
+        with self._cond:
+            self._powers = dict(powers)
+            self._sketches = dict(sketches or {})
+
+    def _mark_dirty(self):
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+            self._cond.notify()
+
+    def update(self, cp_id, power):
+        with self._cond:
+            if self._powers.get(cp_id) == power:
+                return
+            self._powers[cp_id] = power
+            self._mark_dirty()
+
+    def update_sketches(self, states):
+        """Estado (já serializável) dos sketches alterados, {cp_id: estado}."""
+        if not states:
+            return
+        with self._cond:
+            self._sketches.update(states)
+            self._mark_dirty()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._dirty_since is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._dirty_since + self.save_delay_s - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+            self._write_pending()
+
+    def _write_pending(self):
+        # A cópia do mapa é feita já com o lock de escrita, então a última
+        # gravação é sempre a do estado mais recente
+        with self._write_lock:
+            with self._cond:
+                if self._dirty_since is None:
+                    return
+                snapshot = dict(self._powers)
+                if self._sketches:
+                    snapshot[SKETCHES_KEY] = dict(self._sketches)
+                self._dirty_since = None
+            tmp = self.filename + ".tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, indent=4)
+                os.replace(tmp, self.filename)
+                self.writes += 1
+                logging.info(f"Potências máximas ({len(self._powers)} carregadores) salvas em '{self.filename}'.")
+            except (IOError, OSError) as e:
+                logging.error(f"Erro ao salvar potências em '{self.filename}': {e}.")
+
+    def flush(self):
+        """Grava imediatamente, se houver alterações pendentes."""
+        self._write_pending()
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self.is_alive():
+            self.join(timeout)
+        self.flush()
@@ -0,0 +1,210 @@
+#----------------------------------------------------------
+# Grupos de carga hierárquicos (site -> alimentador -> quadro -> carregador).
+#
+# Cada grupo tem um limite (W) e, opcionalmente, um medidor próprio; a
+# raiz é o site (MAX_TOTAL_POWER_W e o medidor do site). Configuração em
+# JSON (load_groups.json), por exemplo:
+#
+#   {"name": "site", "limit_W": 200000, "children": [
+#       {"name": "alimentador-A", "limit_W": 120000, "meter": "ALIM-A", "children": [
+#           {"name": "quadro-1", "limit_W": 44000, "chargers": ["CP001", "CP002"]},
+#           {"name": "quadro-2", "limit_W": 44000, "chargers": ["CP003"]}]},
+#       {"name": "alimentador-B", "limit_W": 80000, "chargers": ["CP004"]}]}
+#
+# Carregadores fora da configuração ficam direto na raiz. Com medidor, o
+# consumo "dos outros" no grupo (leitura - carregadores do grupo) sai do
+# limite, como no site; sem medidor, o limite vale só para os carregadores.
+#
+# Uma passada de alocação, O(grupos) em Python e vetorizada por carregador:
+#   1. de baixo para cima: soma dos limites de cada carregador (mínimo,
+#      teto pela demanda, máximo - allocation.charger_bounds) por grupo,
+#      cortada pela potência disponível do grupo;
+#   2. de cima para baixo: cada grupo divide o que recebeu entre os filhos
+#      (allocation.split_budget) e os carregadores de cada grupo dividem a
+#      sua parte com water_fill, como antes com o site inteiro.
+# Nenhum grupo recebe mais do que a sua potência disponível.
+#----------------------------------------------------------
+import json
+import logging
+import os
+
+import numpy as np
+
+from allocation import charger_bounds, split_budget, water_fill
+#----------------------------------------------------------
+
+
+class LoadGroup:
+
+    def __init__(self, name, limit_W, meter=None, chargers=(), children=()):
+        self.name = name
+        self.limit_W = float(limit_W)
+        self.meter = meter
+        self.chargers = list(chargers)
+        self.children = list(children)
+
+
+def parse_load_group(config):
+    """LoadGroup a partir do dict da configuração (ValueError se inválido)."""
+    if not isinstance(config, dict) or not isinstance(config.get("limit_W"), (int, float)):
+        raise ValueError(f"grupo sem 'limit_W' numérico: {config!r}")
+    chargers = config.get("chargers", [])
+    children = config.get("children", [])
+    if not isinstance(chargers, list) or not isinstance(children, list):
+        raise ValueError(f"'chargers' e 'children' devem ser listas: {config.get('name')!r}")
+    return LoadGroup(str(config.get("name", "grupo")), config["limit_W"], config.get("meter"),
+                     [str(cp_id) for cp_id in chargers], [parse_load_group(child) for child in children])
+
+
+def load_load_groups(filename, site_limit_W, site_name="site"):
+    """
+    Árvore de grupos do arquivo; sem arquivo (ou com erro), só o site. O
+    limite da raiz é sempre o menor entre o do arquivo e `site_limit_W`.
+    """
+    root = None
+    if os.path.exists(filename):
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                root = parse_load_group(json.load(f))
+            logging.info(f"Grupos de carga carregados de '{filename}'.")
+        except (json.JSONDecodeError, IOError, ValueError) as e:
+            logging.error(f"Erro ao carregar grupos de carga de '{filename}': {e}. Usando só o limite do site.")
+    if root is None:
+        return LoadGroupTree(LoadGroup(site_name, site_limit_W))
+    root.limit_W = min(root.limit_W, float(site_limit_W))
+    return LoadGroupTree(root)
+
+
+class LoadGroupTree:
+    """Use só no loop asyncio. Nós em pré-ordem; cada grupo com carregadores diretos ganha uma folha própria."""
+
+    def __init__(self, root):
+        self.names = []
+        self.parent = []
+        self.limit_W = []
+        self.meters = {}        # id do medidor -> nó
+        self.children = []      # nó -> filhos
+        self.leaf_of = {}       # cp_id -> folha
+        self._leaf_nodes = set()
+        self._add(root, -1)
+        self.parent = np.array(self.parent)
+        self.limit_W = np.array(self.limit_W)
+        self.meter_W = np.full(len(self.names), np.nan)   # última leitura de cada medidor
+        self._root_leaf = self.children[0][-1] if len(self.children) > 1 else 0
+        self._bound_ids = None
+        self.last_report = {}
+
+    def _node(self, name, parent, limit_W):
+        node = len(self.names)
+        self.names.append(name)
+        self.parent.append(parent)
+        self.limit_W.append(limit_W)
+        self.children.append([])
+        if parent >= 0:
+            self.children[parent].append(node)
+        return node
+
+    def _add(self, group, parent):
+        node = self._node(group.name, parent, group.limit_W)
+        if group.meter is not None:
+            self.meters[str(group.meter)] = node
+        for child in group.children:
+            self._add(child, node)
+        if not group.children:
+            leaf = node
+        elif group.chargers or parent < 0:
+            # Carregadores direto no grupo (e, na raiz, os que não estão na configuração)
+            leaf = self._node(f"{group.name}/*", node, np.inf)
+        else:
+            return
+        self._leaf_nodes.add(leaf)
+        for cp_id in group.chargers:
+            if cp_id in self.leaf_of:
+                logging.warning(f"[LOAD GROUPS] Carregador '{cp_id}' em mais de um grupo. Mantido em '{self.names[self.leaf_of[cp_id]]}'.")
+                continue
+            self.leaf_of[cp_id] = leaf
+
+    def __len__(self):
+        return len(self.names)
+
+    def is_flat(self):
+        return len(self.names) == 1
+
+    def meter_reading(self, meter_id):
+        """Última leitura (W) do submedidor, ou None (medidor desconhecido ou ainda sem leitura)."""
+        node = self.meters.get(str(meter_id))
+        if node is None or np.isnan(self.meter_W[node]):
+            return None
+        return float(self.meter_W[node])
+
+    def observe_meter(self, meter_id, power_W):
+        """Leitura de um submedidor. Retorna False se nenhum grupo usa esse medidor."""
+        node = self.meters.get(str(meter_id))
+        if node is None:
+            return False
+        self.meter_W[node] = power_W
+        return True
+
+    def _bind(self, cp_ids):
+        # Folha de cada carregador em carga; refeito só quando a lista muda
+        # (ChargerTable.charging() devolve a mesma lista até algum status mudar)
+        if cp_ids is self._bound_ids:
+            return
+        leaf = np.fromiter((self.leaf_of.get(cp_id, self._root_leaf) for cp_id in cp_ids), dtype=np.intp, count=len(cp_ids))
+        order = np.argsort(leaf, kind="stable")
+        bounds = np.searchsorted(leaf[order], np.arange(len(self.names) + 1))
+        self._bound_ids, self._leaf, self._order, self._bounds = cp_ids, leaf, order, bounds
+
+    def _accumulate(self, sums, ceiling=None):
+        for node in range(len(self.names) - 1, -1, -1):
+            if ceiling is not None:
+                np.minimum(sums[:, node], ceiling[node], out=sums[:, node])
+            if node:
+                sums[:, self.parent[node]] += sums[:, node]
+        return sums
+
+    def allocate(self, cp_ids, demand_W, max_W, limit_W, site_power_W,
+                 min_W=1380.0, margin_W=1000.0, saturation=0.95, ceiling_W=None):
+        """
+        Limites (W) alinhados com `cp_ids`. `site_power_W` é a leitura do medidor
+        do site (raiz); `ceiling_W`, opcional, o teto de cada carregador (fases).
+        """
+        demand = np.asarray(demand_W, dtype=float)
+        if self.is_flat():
+            available = self.limit_W[0] - max(0.0, site_power_W - demand.sum())
+            self.last_report = {self.names[0]: (float(demand.sum()), float(max(available, 0.0)), len(cp_ids))}
+            return water_fill(available, demand, max_W, limit_W, min_W, margin_W, saturation, ceiling_W)
+        self._bind(cp_ids)
+        n = len(self.names)
+        max_W = np.asarray(max_W, dtype=float)
+        limit_W = np.asarray(limit_W, dtype=float)
+        ceiling_W = None if ceiling_W is None else np.asarray(ceiling_W, dtype=float)
+        floor, cap, top = charger_bounds(demand, max_W, limit_W, min_W, margin_W, saturation, ceiling_W)
+        # 1. De baixo para cima (filhos vêm depois do pai na pré-ordem): demanda e
+        # número de carregadores de cada grupo, potência disponível e limites
+        # agregados, cada grupo cortado pela sua disponível antes de somar no pai
+        group_demand, count = self._accumulate(np.stack([np.bincount(self._leaf, weights=column, minlength=n)
+                                                         for column in (demand, np.ones(len(cp_ids)))]))
+        meter = self.meter_W.copy()
+        meter[0] = site_power_W
+        other_load = np.where(np.isnan(meter), 0.0, np.maximum(meter - group_demand, 0.0))
+        available = np.maximum(self.limit_W - other_load, 0.0)
+        lo, hi_cap, hi_top = self._accumulate(np.stack([np.bincount(self._leaf, weights=column, minlength=n)
+                                                        for column in (floor, cap, top)]), available)
+        # 2. De cima para baixo
+        budget = np.zeros(n)
+        budget[0] = available[0]
+        limits = np.zeros(len(cp_ids))
+        for node in range(n):
+            children = [child for child in self.children[node] if count[child] > 0]
+            if len(children) == 1:
+                budget[children[0]] = min(budget[node], hi_top[children[0]])
+            elif children:
+                budget[children] = split_budget(budget[node], lo[children], hi_cap[children], hi_top[children], count[children])
+            if node in self._leaf_nodes and count[node] > 0:
+                rows = self._order[self._bounds[node]:self._bounds[node + 1]]
+                limits[rows] = water_fill(min(budget[node], available[node]), demand[rows], max_W[rows], limit_W[rows],
+                                          min_W, margin_W, saturation, None if ceiling_W is None else ceiling_W[rows])
+        self.last_report = {self.names[node]: (float(group_demand[node]), float(available[node]), int(count[node]))
+                            for node in range(n) if np.isfinite(self.limit_W[node])}
+        return limits
@@ -11,6 +11,29 @@ import json
 import uuid
 import os
 from aiohttp import web  # 
+import numpy as np
+from async_logging import install_queued_logging
+from meter_ingest import DailyJsonlWriter, meter_fields
+from uplink import UplinkSender
+from spool import TelemetrySpool
+from learned_powers_store import LearnedPowersStore, SKETCHES_KEY
+from power_sketch import LearnedPowerEstimator
+from ocpp_frame import OcppFrame, CALL, CALL_RESULT, CALL_ERROR
+from pending_calls import PendingCalls, CallError
+from control_trigger import ControlTrigger
+from profile_commands import ProfileCommands
+from meter_poll import MeterPollScheduler
+from meter_values import power_samples, SAMPLED_MEASURANDS
+from reconnect import ReconnectManager
+from load_groups import LoadGroup, LoadGroupTree, load_load_groups
+from allocation import site_phase_ceilings
+from charger_phases import ChargerPhases, load_charger_phases, PHASES
+from charger_table import ChargerTable
+from charger_session import status_notified, power_observed, RELEASE, KEEP_PAUSED
+from message_buffer import ChargePointBuffers, DIRECTION_TO_CSMS
+from send_queue import LinkWriter
+from rollups import (MinuteRollup, RollupWriter, SERIES_CHARGER_POWER, SERIES_SITE_POWER, SERIES_CHARGER_LIMIT,
+                     SERIES_BUFFER_TO_CSMS, SERIES_BUFFER_TO_CHARGER, SERIES_BUFFER_DRAIN_S, SERIES_CALL_RTT)
 #----------------------------------------------------------
 
 #-------------URL base do servidor OCPP externo (MOVE)--------------
@@ -19,6 +42,15 @@ EXTERNAL_CSMS_URL = "ws://127.0.0.1:9999/ocpp"      ############################
 #-------------URL base do servidor OCPP externo (TCHARGE)--------------
 EXTERNAL_DATA_WS_URL = "ws://localhost:8765"
 external_data_ws = None
+# Envio em lote (uplink.py): até N mensagens por frame ou um frame a cada X segundos
+EXTERNAL_DATA_QUEUE_MAXSIZE = 10000
+EXTERNAL_DATA_BATCH_MAX_MESSAGES = 200
+EXTERNAL_DATA_BATCH_INTERVAL_S = 0.2
+# Spool em disco (spool.py): guarda a telemetria durante quedas do uplink e a
+# reenvia em ordem após a reconexão, sem ultrapassar N mensagens/s
+EXTERNAL_DATA_SPOOL_ENABLED = True
+EXTERNAL_DATA_SPOOL_SEGMENT_BYTES = 8 * 1024 * 1024
+EXTERNAL_DATA_REPLAY_MAX_PER_S = 500
 
 # --- CONFIGURAÇÕES DE HOST (AGORA PARA AMBOS OS SERVIDORES) --- 
 LOCAL_SERVER_HOST = "127.0.0.1"  # IP(FIXO) para o GATEWAY OCPP ################################"192.168.0.14"
@@ -33,9 +65,34 @@ LOCAL_METER_PORT = 8000             # Porta que o medidor vai enviar
 UPSTREAM_CLIENTS = {}
 DOWNSTREAM_CLIENTS = {}
 UPSTREAM_TASKS = {}
+# Escritoras (send_queue.py) de cada conexão: quem lê um lado só enfileira para o outro
+UPSTREAM_WRITERS = {}
+DOWNSTREAM_WRITERS = {}
+# Reconexão ao CSMS (reconnect.py): backoff exponencial com jitter e teto de handshakes simultâneos
+UPSTREAM_RECONNECT_BASE_S = 1.0
+UPSTREAM_RECONNECT_MAX_S = 60.0
+UPSTREAM_RECONNECT_FAST_S = 0.5          # primeira tentativa após uma queda
+UPSTREAM_MAX_CONCURRENT_HANDSHAKES = 20
+UPSTREAM_HEALTHY_AFTER_S = 30.0          # conexão que durou isso zera o backoff
+UPSTREAM_OPEN_TIMEOUT_S = 10
+UPSTREAM_RECONNECT = ReconnectManager(
+    base_delay_s=UPSTREAM_RECONNECT_BASE_S, max_delay_s=UPSTREAM_RECONNECT_MAX_S,
+    fast_retry_s=UPSTREAM_RECONNECT_FAST_S, max_concurrent_handshakes=UPSTREAM_MAX_CONCURRENT_HANDSHAKES,
+    healthy_after_s=UPSTREAM_HEALTHY_AFTER_S,
+)
 #------------------------------------------------------------
 
 LEARNED_POWERS_FILE = "learned_powers.json"
+# Alterações dentro desta janela (s) são gravadas juntas, numa única escrita
+LEARNED_POWERS_SAVE_DELAY_S = 2.0
+# Potência aprendida (power_sketch.py): percentil das leituras em carga numa janela
+# deslizante de 7 dias (7 janelas de 1 dia), com folga; o estado dos sketches é
+# gravado no learned_powers.json uma vez por minuto
+LEARNED_POWER_QUANTILE = 0.99
+LEARNED_POWER_HEADROOM = 0.02
+LEARNED_POWER_MIN_SAMPLES = 60      # antes disso, só sobe (regra do máximo)
+LEARNED_POWER_WINDOW_S = 7 * 86400.0
+LEARNED_POWER_SUB_WINDOWS = 7
 
 # ----------- CONFIGURAÇÕES DE CONTROLE DE DEMANDA -----------
 
@@ -44,19 +101,92 @@ MAX_TOTAL_POWER_W = 60000.0
 
 DEFAULT_MAX_POWER_SEED = 3600.0 
 MIN_CHARGE_POWER_W = 1380.0 
+# Alocação (allocation.py): folga acima do consumo atual de quem não está no limite
+ALLOCATION_MARGIN_W = 1000.0
+# Consumo >= esta fração do limite atual: o carro aceitaria mais (recebe até o máximo aprendido)
+ALLOCATION_SATURATION = 0.95
+# Grupos de carga (load_groups.py): alimentadores/quadros com limite e submedidor próprios.
+# Sem o arquivo, só o site (MAX_TOTAL_POWER_W). Pacotes do medidor com "medidor" igual
+# ao "meter" de um grupo alimentam esse grupo em vez do site.
+LOAD_GROUPS_FILE = "load_groups.json"
+LOAD_GROUPS = LoadGroupTree(LoadGroup("site", MAX_TOTAL_POWER_W))
+# Limite por fase do site (W, L1/L2/L3), aplicado com as leituras por fase do medidor
+# ("pa", "pb", "pc"): monofásicos configurados pesam só na sua fase (charger_phases.py)
+PHASE_AWARE_ALLOCATION = True
+MAX_PHASE_POWER_W = (MAX_TOTAL_POWER_W / 3, MAX_TOTAL_POWER_W / 3, MAX_TOTAL_POWER_W / 3)
+# Fases do site de cada carregador. Quem não está no arquivo é tratado como trifásico;
+# se as leituras por fase dos MeterValues mostrarem um monofásico, ele pesa em todas as
+# fases do site (o rótulo de fase do carregador não diz em qual fase do site ele está)
+# e não é descontado das fases em que talvez não esteja (allocation.site_phase_ceilings)
+CHARGER_PHASES_FILE = "charger_phases.json"
+CHARGER_PHASES = ChargerPhases()
+
+# Reavaliação por eventos (control_trigger.py): medidor, status e potência dos carregadores
+# disparam o controle; o tick periódico continua como garantia
+DEMAND_CONTROL_EVENT_DRIVEN = True
+DEMAND_CONTROL_STARTUP_S = 10        # espera inicial para os carregadores se conectarem
+DEMAND_CONTROL_MIN_INTERVAL_S = 1.0  # intervalo mínimo entre duas passadas
+DEMAND_CONTROL_DEBOUNCE_S = 0.2      # junta rajadas de eventos numa passada só
+DEMAND_CONTROL_FALLBACK_S = 10.0     # tick periódico sem eventos
+DEMAND_CONTROL_SITE_DELTA_W = 500.0     # variação da potência do site que dispara o controle
+DEMAND_CONTROL_CHARGER_DELTA_W = 500.0  # variação da potência de um carregador que dispara o controle
+DEMAND_TRIGGER = ControlTrigger(
+    min_interval_s=DEMAND_CONTROL_MIN_INTERVAL_S, debounce_s=DEMAND_CONTROL_DEBOUNCE_S,
+    fallback_s=DEMAND_CONTROL_FALLBACK_S, event_driven=DEMAND_CONTROL_EVENT_DRIVEN,
+)
 
-CHARGE_POINT_STATE = {}
-GATEWAY_PENDING_REQUESTS = set()
+# Estado dos carregadores (charger_table.py): linhas fixas e colunas NumPy;
+# `CHARGE_POINT_STATE[cp]["status"]` etc. continuam funcionando nos handlers
+CHARGE_POINT_STATE = ChargerTable()
+# Chamadas do gateway aguardando resposta, por (carregador, message id); expiram após o TTL (s)
+GATEWAY_CALL_TTL_S = 30.0
+GATEWAY_PENDING_REQUESTS = PendingCalls(ttl_s=GATEWAY_CALL_TTL_S)
+# Prazo (s) de cada SetChargingProfile (envio + confirmação) no canal de comandos
+PROFILE_COMMAND_DEADLINE_S = 10.0
+# Pedidos de MeterValues (meter_poll.py): intervalo adaptativo por carregador, com jitter
+METER_POLL_BASE_INTERVAL_S = 60.0
+METER_POLL_MIN_INTERVAL_S = 15.0      # potência variando
+METER_POLL_MAX_INTERVAL_S = 300.0     # carga estável
+METER_POLL_PRESSURE_INTERVAL_S = 30.0 # teto do intervalo com o site perto do limite
+METER_POLL_VOLATILE_DELTA_W = 500.0   # variação entre leituras que encurta o intervalo
+METER_POLL_PRESSURE_FRACTION = 0.9    # site acima desta fração de MAX_TOTAL_POWER_W
+# Na conexão o gateway pede ao carregador MeterValues periódicos (ChangeConfiguration):
+# intervalo de amostragem (s) e medidas (meter_values.SAMPLED_MEASURANDS)
+METER_CONFIGURE_ON_CONNECT = True
+METER_SAMPLE_INTERVAL_S = 10
+
+# --- Buffers de mensagens por carregador (message_buffer.py) ---
+# Frames em memória por carregador e por direção; o excedente vai para disco
+MESSAGE_BUFFER_MEMORY_CAP = 1000
+MESSAGE_BUFFER_SEGMENT_MESSAGES = 1000
+MESSAGE_BUFFER_SPILL_DIR = os.path.join("logs", "buffers")
+# Esvaziamento do buffer pela escritora da conexão: no máximo N frames/s
+BUFFER_DRAIN_MAX_PER_S = 50
+# Fila de envio de cada conexão (send_queue.py); cheia, os frames vão para o buffer
+SEND_QUEUE_MAXSIZE = 100
 
 # ---  Variável Global para Potência do Site(ALIMENTADA PELO MEDIDOR DA IE)---
 # Esta variável será atualizada pelo servidor HTTP do medidor
 SITE_POWER_STATE = {
     "current_total_W": 0.0, # Potência total atual do site (lida do medidor)
+    "phase_W": None,        # Potência por fase [L1, L2, L3] (None sem "pa"/"pb"/"pc")
     "last_updated": None    # Timestamp da última leitura
 }
 #------------------------------------------------------------
 
+# --- Agregados por minuto (rollups) ---
+# Intervalo (s) em que os limites alocados são amostrados e os minutos encerrados gravados
+ROLLUP_SAMPLE_INTERVAL_S = 10
+# Acima deste p95 (ms) de RTT de SetChargingProfile, os carregadores mais lentos são listados no log
+SLOW_PROFILE_RTT_MS = 1000
+#------------------------------------------------------------
+
 # --- Configuração de Log  ---
+# Com LOG_QUEUE_ENABLED, arquivo e console são escritos por uma thread própria
+# (async_logging.py) e o loop asyncio só enfileira os registros.
+LOG_QUEUE_ENABLED = True
+LOG_QUEUE_MAXSIZE = 10000      # registros em memória aguardando escrita
+LOG_QUEUE_POLICY = "drop"      # "drop" (descarta se a fila encher) ou "block" (espera)
 from logging.handlers import TimedRotatingFileHandler
 
 log_dir = "logs"
@@ -78,114 +208,139 @@ logger.addHandler(file_handler)
 stream_handler = logging.StreamHandler()
 stream_handler.setFormatter(formatter)
 logger.addHandler(stream_handler)
+log_writer = None
+if LOG_QUEUE_ENABLED:
+    log_writer = install_queued_logging(logger, maxsize=LOG_QUEUE_MAXSIZE, policy=LOG_QUEUE_POLICY)
 
+# Minutos encerrados gravados em logs/rollups por uma thread própria (ver rollups.py)
+ROLLUP_WRITER = RollupWriter(os.path.join(log_dir, "rollups"))
+ROLLUPS = MinuteRollup(os.path.join(log_dir, "rollups"), writer=ROLLUP_WRITER)
+# Pacotes do medidor em logs/medidor/medidor_AAAA-MM-DD.jsonl (thread própria, ver meter_ingest.py)
+METER_JSONL_WRITER = DailyJsonlWriter(os.path.join(log_dir, "medidor"), "medidor")
+
+# Potências aprendidas: gravadas em segundo plano (learned_powers_store.py)
+LEARNED_POWERS = LearnedPowersStore(LEARNED_POWERS_FILE, LEARNED_POWERS_SAVE_DELAY_S)
+LEARNED_POWER_ESTIMATOR = LearnedPowerEstimator(
+    quantile=LEARNED_POWER_QUANTILE, headroom=LEARNED_POWER_HEADROOM, min_samples=LEARNED_POWER_MIN_SAMPLES,
+    saturation=ALLOCATION_SATURATION, window_s=LEARNED_POWER_WINDOW_S, sub_windows=LEARNED_POWER_SUB_WINDOWS,
+)
+
+UPLINK = UplinkSender(
+    maxsize=EXTERNAL_DATA_QUEUE_MAXSIZE,
+    batch_max_messages=EXTERNAL_DATA_BATCH_MAX_MESSAGES,
+    batch_interval_s=EXTERNAL_DATA_BATCH_INTERVAL_S,
+    spool=TelemetrySpool(os.path.join(log_dir, "spool"), EXTERNAL_DATA_SPOOL_SEGMENT_BYTES) if EXTERNAL_DATA_SPOOL_ENABLED else None,
+    replay_max_per_s=EXTERNAL_DATA_REPLAY_MAX_PER_S,
+)
 #------------------------------------------------------------
 
 
 # --- FUNÇÕES PARA CARREGAR/SALVAR POTÊNCIAS(JSON INSTALADOR) ---
 def load_learned_powers(filename=LEARNED_POWERS_FILE):
-
+    # Retorna (potências, estado dos sketches); arquivos antigos não têm sketches
     if not os.path.exists(filename):
         logging.info(f"Arquivo '{filename}' não encontrado. Iniciando sem potências pré-carregadas.")
-        return {}
+        return {}, {}
     try:
         with open(filename, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            if isinstance(data, dict) and all(isinstance(v, (int, float)) for v in data.values()):
-                logging.info(f"Carregadas {len(data)} potências máximas aprendidas de '{filename}'.")
-                return data
+            sketches = data.pop(SKETCHES_KEY, {}) if isinstance(data, dict) else {}
+            if isinstance(data, dict) and all(isinstance(v, (int, float)) for v in data.values()) and isinstance(sketches, dict):
+                logging.info(f"Carregadas {len(data)} potências máximas aprendidas de '{filename}' ({len(sketches)} com histórico de leituras).")
+                return data, sketches
             else:
                 logging.error(f"Arquivo '{filename}' contém dados inválidos. Ignorando.")
-                return {}
+                return {}, {}
     except (json.JSONDecodeError, IOError) as e:
         logging.error(f"Erro ao carregar potências de '{filename}': {e}. Ignorando.")
-        return {}
+        return {}, {}
 
-def save_learned_powers(data_to_save, filename=LEARNED_POWERS_FILE):
-
-    powers_only_dict = {}
-    first_value = next(iter(data_to_save.values()), None)
-    if isinstance(first_value, dict): 
-        powers_only_dict = {
-            cp_id: state.get("learned_max_power", DEFAULT_MAX_POWER_SEED)
-            for cp_id, state in data_to_save.items()
-        }
-    elif isinstance(first_value, (int, float)):
-        powers_only_dict = data_to_save
-    elif first_value is None and not data_to_save:
-         powers_only_dict = {}
-    else:
-        logging.error(f"Formato inesperado de dados passado para save_learned_powers...")
-        return
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(powers_only_dict, f, indent=4)
-        logging.info(f"Potências máximas ({len(powers_only_dict)} carregadores) salvas em '{filename}'.")
-    except IOError as e:
-        logging.error(f"Erro ao salvar potências em '{filename}': {e}.")
-    except Exception as e:
-         logging.error(f"Erro inesperado ao salvar potências: {e}", exc_info=True)
 # ------------------------------------------------------------
 
 
 
 # ---  Handler HTTP Assíncrono (aiohttp) ---
 async def handle_meter_post(request):
-    # Envia o pacote bruto do medidor para o servidor externo simulado
+    # O aiohttp já filtra a rota: o corpo é lido, decodificado e interpretado UMA vez
     try:
         post_data_bytes = await request.read()
         dados_brutos_str = post_data_bytes.decode('utf-8')
+        agora = datetime.now()
         try:
             pacote_json = json.loads(dados_brutos_str)
-        except Exception:
-            pacote_json = dados_brutos_str
-        pacote_envio = {
-            "source": "medidor",
-            "type": "medidor_raw",
-            "data": pacote_json,
-            "timestamp": datetime.now().isoformat()
-        }
-        asyncio.create_task(send_data_to_external_ws(pacote_envio))
-    except Exception as e:
-        logging.error(f"[EXTERNAL_DATA_WS] Falha ao enviar pacote bruto do medidor: {e}")
-    
-    # O aiohttp já filtra a rota, então só é necessário processar
-    try:
-        # Lê o corpo da requisição (assíncrono)
-        post_data_bytes = await request.read()
-        dados_brutos_str = post_data_bytes.decode('utf-8')
-
-        # Loga no logger principal
-        logging.info(f"[METER_SERVER] Pacote recebido: {dados_brutos_str}")
+        except json.JSONDecodeError:
+            pacote_json = None
 
-        # Salva o pacote recebido em formato JSONL diário na pasta correta, incluindo timestamp
-        medidor_log_dir = os.path.join("logs", "medidor")
-        os.makedirs(medidor_log_dir, exist_ok=True)
-        jsonl_filename = os.path.join(medidor_log_dir, f"medidor_{datetime.now().strftime('%Y-%m-%d')}.jsonl")
+        # Envia o pacote bruto do medidor para o servidor externo simulado
         try:
-            # Adiciona timestamp ao pacote
-            pacote = json.loads(dados_brutos_str)
-            pacote["timestamp"] = datetime.now().isoformat()
-            with open(jsonl_filename, "a", encoding="utf-8") as f_jsonl:
-                f_jsonl.write(json.dumps(pacote, ensure_ascii=False) + "\n")
+            pacote_envio = {
+                "source": "medidor",
+                "type": "medidor_raw",
+                "data": pacote_json if pacote_json is not None else dados_brutos_str,
+                "timestamp": agora.isoformat()
+            }
+            send_data_to_external_ws(pacote_envio)
         except Exception as e:
-            logging.error(f"[METER_SERVER] Falha ao salvar pacote no JSONL: {e}")
+            logging.error(f"[EXTERNAL_DATA_WS] Falha ao enviar pacote bruto do medidor: {e}")
 
-        # Tenta extrair a Potência Total ("pt")
-        try:
-            data_json = json.loads(dados_brutos_str)
-            potencia_total_str = data_json.get("pt")
-            if potencia_total_str is not None:
-                # --- ATUALIZA A VARIÁVEL GLOBAL ---
-                SITE_POWER_STATE["current_total_W"] = float(potencia_total_str)
-                SITE_POWER_STATE["last_updated"] = datetime.now()
-                logging.info(f"[METER_SERVER] Potência total do site atualizada: {SITE_POWER_STATE['current_total_W']:.2f}W")
-                # ----------------------------------
-            else:
-                logging.warning("[METER_SERVER] Pacote JSON recebido, mas chave 'pt' não encontrada.")
-        except json.JSONDecodeError:
+        # Loga no logger principal
+        logging.info(f"[METER_SERVER] Pacote recebido: {dados_brutos_str}")
+
+        if pacote_json is None:
             logging.error(f"[METER_SERVER] Erro: Pacote recebido não é JSON válido: {dados_brutos_str}")
             return web.Response(status=400, text="Bad Request: Invalid JSON")
+        if not isinstance(pacote_json, dict):
+            logging.warning("[METER_SERVER] Pacote JSON recebido não é um objeto. Ignorando.")
+            return web.Response(text="OK")
+
+        # Salva o pacote (com timestamp) no JSONL diário; a escrita é feita em lote por outra thread
+        METER_JSONL_WRITER.write(dict(pacote_json, timestamp=agora.isoformat()), agora)
+
+        # Todos os campos numéricos são validados antes de mudar qualquer estado.
+        # 'pt' inválido descarta o pacote; uma fase inválida descarta só as leituras
+        # por fase (as fases anteriores continuam valendo, como num pacote sem elas)
+        medidor_W, invalidos = meter_fields(pacote_json)
+        if "pt" in invalidos:
+            logging.warning(f"[METER_SERVER] Pacote com 'pt' inválido ({invalidos['pt']!r}). Ignorando: {dados_brutos_str}")
+            return web.Response(status=400, text="Bad Request: Invalid value")
+        if invalidos:
+            logging.warning(f"[METER_SERVER] Leituras por fase inválidas ignoradas: "
+                            f"{', '.join(f'{key}={value!r}' for key, value in invalidos.items())}")
+
+        # Submedidor de um grupo de carga: atualiza só o grupo
+        medidor = pacote_json.get("medidor")
+        if medidor is not None and str(medidor) in LOAD_GROUPS.meters:
+            if medidor_W["pt"] is None:
+                logging.warning(f"[METER_SERVER] Pacote do submedidor '{medidor}' sem a chave 'pt'.")
+                return web.Response(text="OK")
+            previous_W = LOAD_GROUPS.meter_reading(medidor)
+            LOAD_GROUPS.observe_meter(medidor, medidor_W["pt"])
+            if previous_W is None or abs(medidor_W["pt"] - previous_W) >= DEMAND_CONTROL_SITE_DELTA_W:
+                DEMAND_TRIGGER.notify("group_power")
+            logging.info(f"[METER_SERVER] Potência do submedidor '{medidor}' atualizada: {medidor_W['pt']:.2f}W")
+            return web.Response(text="OK")
+
+        # Tenta extrair a Potência Total ("pt")
+        if medidor_W["pt"] is not None:
+            # --- ATUALIZA A VARIÁVEL GLOBAL ---
+            previous_total_W = SITE_POWER_STATE["current_total_W"]
+            SITE_POWER_STATE["current_total_W"] = medidor_W["pt"]
+            if (abs(SITE_POWER_STATE["current_total_W"] - previous_total_W) >= DEMAND_CONTROL_SITE_DELTA_W
+                    or SITE_POWER_STATE["current_total_W"] > MAX_TOTAL_POWER_W):
+                DEMAND_TRIGGER.notify("site_power")
+            phase_W = [medidor_W[key] for key in ("pa", "pb", "pc")]
+            if all(value is not None for value in phase_W):
+                previous_phase_W = SITE_POWER_STATE["phase_W"] or [0.0, 0.0, 0.0]
+                SITE_POWER_STATE["phase_W"] = phase_W
+                if any(abs(new - old) >= DEMAND_CONTROL_SITE_DELTA_W or new > limit
+                       for new, old, limit in zip(phase_W, previous_phase_W, MAX_PHASE_POWER_W)):
+                    DEMAND_TRIGGER.notify("phase_power")
+            SITE_POWER_STATE["last_updated"] = agora
+            ROLLUPS.observe(SERIES_SITE_POWER, "site", SITE_POWER_STATE["current_total_W"], now=agora)
+            logging.info(f"[METER_SERVER] Potência total do site atualizada: {SITE_POWER_STATE['current_total_W']:.2f}W")
+            # ----------------------------------
+        else:
+            logging.warning("[METER_SERVER] Pacote JSON recebido, mas chave 'pt' não encontrada.")
 
         # Responde 200 OK
         return web.Response(text="OK")
@@ -200,20 +355,16 @@ async def handle_meter_post(request):
 # --- Lógica do Servidor Local  ---
 async def local_server_handler(websocket):
     # Envio de todos os pacotes recebidos do carregador para o servidor externo simulado
-    async def enviar_pacote_bruto_carregador(msg_str):
+    async def enviar_pacote_bruto_carregador(frame):
         try:
-            try:
-                pacote_json = json.loads(msg_str)
-            except Exception:
-                pacote_json = msg_str
             pacote_envio = {
                 "source": "carregador",
                 "type": "carregador_raw",
                 "charge_point_id": charge_point_id,
-                "data": pacote_json,
+                "data": frame.uplink_data(),
                 "timestamp": datetime.now().isoformat()
             }
-            asyncio.create_task(send_data_to_external_ws(pacote_envio))
+            send_data_to_external_ws(pacote_envio)
         except Exception as e:
             logging.error(f"[EXTERNAL_DATA_WS] Falha ao enviar pacote bruto do carregador: {e}")
     path = websocket.path
@@ -229,20 +380,26 @@ async def local_server_handler(websocket):
         else:
              power_source_log = f"padrão ({DEFAULT_MAX_POWER_SEED}W)"
              loaded_learned_powers[charge_point_id] = DEFAULT_MAX_POWER_SEED
-             save_learned_powers(loaded_learned_powers, filename=LEARNED_POWERS_FILE) 
+             LEARNED_POWERS.update(charge_point_id, DEFAULT_MAX_POWER_SEED)
         logging.info(f"[Local Server] Carregador '{charge_point_id}' detectado. Usando {initial_max_power:.0f}W ({power_source_log}) como máximo inicial.")
         CHARGE_POINT_STATE[charge_point_id] = {
             "status": "Available", "current_power_W": 0.0,
             "learned_max_power": initial_max_power, "current_limit_W": initial_max_power,
-            "message_buffer": []
+            "buffers": new_charge_point_buffers(charge_point_id)
         }
     else:
         logging.info(f"[Local Server] Carregador '{charge_point_id}' (Max: {CHARGE_POINT_STATE[charge_point_id]['learned_max_power']}W) reconectado.")
         CHARGE_POINT_STATE[charge_point_id]["status"] = "Available"
         logging.info(f"[Local Server] O limite de potência anterior ({CHARGE_POINT_STATE[charge_point_id]['current_limit_W']:.0f}W) foi mantido para '{charge_point_id}'.")
-        if "message_buffer" not in CHARGE_POINT_STATE[charge_point_id]:
-             CHARGE_POINT_STATE[charge_point_id]["message_buffer"] = []
+        if "buffers" not in CHARGE_POINT_STATE[charge_point_id]:
+             CHARGE_POINT_STATE[charge_point_id]["buffers"] = new_charge_point_buffers(charge_point_id)
     DOWNSTREAM_CLIENTS[charge_point_id] = websocket
+    # A configuração dos MeterValues sai na primeira chamada do carregador depois do
+    # BootNotification (o carregador só as envia depois de aceito pelo CSMS)
+    meter_configured = not METER_CONFIGURE_ON_CONNECT
+    # Frames do CSMS para este carregador (inclusive o buffer da desconexão) saem pela escritora
+    writer = start_link_writer(charge_point_id, websocket, CHARGE_POINT_STATE[charge_point_id]["buffers"].to_charger)
+    DOWNSTREAM_WRITERS[charge_point_id] = writer
     task = UPSTREAM_TASKS.get(charge_point_id)
     if task is None or task.done():
         if task and task.done():
@@ -256,70 +413,107 @@ async def local_server_handler(websocket):
         logging.info(f"[Local Server] Conexão externa para '{charge_point_id}' já está ativa.")
     try:
         async for message in websocket:
+            # O frame é decodificado uma única vez; estado, correlação e uplink usam o
+            # mesmo resultado. Frames que não são JSON/OCPP válidos não são encaminhados
+            frame = OcppFrame(message)
+            if not frame.valid:
+                logging.warning(f"[PARSER {charge_point_id}]: Frame OCPP inválido - Mensagem: {message}")
+                await enviar_pacote_bruto_carregador(frame)
+                continue
+            if not meter_configured and frame.msg_type_id == CALL and frame.action != "BootNotification":
+                meter_configured = True
+                asyncio.create_task(configure_meter_values(charge_point_id))
+            is_own_response = (frame.msg_type_id in (CALL_RESULT, CALL_ERROR)
+                               and (charge_point_id, frame.msg_id) in GATEWAY_PENDING_REQUESTS)
             # Envia o pacote bruto do carregador para o servidor externo simulado
-            await enviar_pacote_bruto_carregador(message)
+            await enviar_pacote_bruto_carregador(frame)
             try:
-                msg_json = json.loads(message)
-                msg_type_id = msg_json[0]
                 if charge_point_id not in CHARGE_POINT_STATE: continue
                 state = CHARGE_POINT_STATE[charge_point_id]
-                if msg_type_id == 3:
-                    msg_id = msg_json[1]
-                    if msg_id in GATEWAY_PENDING_REQUESTS:
-                        logging.info(f"[GATEWAY CONSUME {charge_point_id}]: Resposta recebida para '{msg_id}'. Mensagem consumida (não encaminhada).")
-                        GATEWAY_PENDING_REQUESTS.discard(msg_id)
-                        continue
-                msg_action = msg_json[2]
+                if is_own_response:
+                    error = None
+                    if frame.msg_type_id == CALL_ERROR:
+                        error = CallError(frame.message[2], frame.message[3] if len(frame.message) > 3 else "")
+                    resolved = GATEWAY_PENDING_REQUESTS.resolve(charge_point_id, frame.msg_id, frame.payload, error)
+                    if resolved is not None:
+                        action, rtt_ms = resolved
+                        if action in SERIES_CALL_RTT:
+                            ROLLUPS.observe(SERIES_CALL_RTT[action], charge_point_id, rtt_ms)
+                        logging.info(f"[GATEWAY CONSUME {charge_point_id}]: Resposta de {action} recebida para '{frame.msg_id}' em {rtt_ms:.0f}ms{' (CallError: ' + str(error) + ')' if error else ''}. Mensagem consumida (não encaminhada).")
+                    continue
+                msg_action = frame.action
                 if msg_action == "StatusNotification":
-                    payload = msg_json[3]
+                    payload = frame.payload
                     new_status = payload.get("status")
                     if new_status:
-                        old_status = state["status"]
-                        state["status"] = new_status
+                        old_status, session_action = status_notified(state, new_status)
+                        if new_status != old_status:
+                            DEMAND_TRIGGER.notify("status")
                         logging.info(f"[STATE UPDATE {charge_point_id}]: Status alterado de '{old_status}' para '{new_status}'")
-                        if old_status == "Charging" and new_status not in ["Charging", "SuspendedEV"]:
+                        if session_action == RELEASE:
                             logging.info(f"[CONTROL {charge_point_id}] Carga finalizada (Status: {new_status}). Removendo limitação DESTE carregador.")
-                            asyncio.create_task(send_charging_profile(charge_point_id, state["learned_max_power"]))
+                            PROFILE_COMMANDS.set_limit(charge_point_id, state["learned_max_power"])
+                        elif session_action == KEEP_PAUSED:
+                            logging.info(f"[CONTROL {charge_point_id}] Carregador pausado pelo controle (Status: {new_status}). Limite de 0W mantido até o controle retomá-lo.")
                 elif msg_action == "MeterValues":
-                    payload = msg_json[3]
-                    values = payload.get("meterValue", [{}])[0].get("sampledValue", [])
-                    current_power = 0.0
-                    found = False
-                    for v in values:
-                        if v.get("measurand") == "Power.Active.Import":
-                            current_power = float(v.get("value", 0))
-                            if v.get("unit") == "kW":
-                                current_power *= 1000.0
-                            found = True
-                            break
-                    if found:
+                    # Todas as amostras do frame (cada meterValue com o seu timestamp) vão
+                    # para os rollups; o estado fica com a mais recente
+                    samples = power_samples(frame.payload)
+                    if samples:
+                        for sample in samples:
+                            ROLLUPS.observe(SERIES_CHARGER_POWER, charge_point_id, sample.power_W, now=sample.timestamp)
+                        latest = samples[-1]
+                        current_power = latest.power_W
+                        if abs(current_power - state["current_power_W"]) >= DEMAND_CONTROL_CHARGER_DELTA_W:
+                            DEMAND_TRIGGER.notify("charger_power")
                         state["current_power_W"] = current_power
-                        logging.info(f"[STATE UPDATE {charge_point_id}]: Potência atual: {current_power:.2f}W")
-                        if current_power > 500 and state["status"] not in ["Charging", "SuspendedEV", "SuspendedEVSE"]:
-                             logging.warning(f"[STATE INFERENCE {charge_point_id}] Potência detectada ({current_power:.0f}W) mas status era '{state['status']}'. Forçando para 'Charging'.")
-                             state["status"] = "Charging"
-                        elif current_power <= 500 and state["status"] == "Charging":
+                        state["phase_power_W"] = latest.phases_W
+                        state["phase_current_A"] = latest.currents_A
+                        METER_POLL.observe(charge_point_id, current_power)
+                        if current_power > 500:
+                            CHARGER_PHASES.observe(charge_point_id, latest.currents_A, latest.phases_W)
+                        logging.info(f"[STATE UPDATE {charge_point_id}]: Potência atual: {current_power:.2f}W ({len(samples)} amostra(s))")
+                        # Pausado pelo controle, a potência baixa é a própria pausa: sem inferência
+                        previous_status = state["status"]
+                        inferred_status, session_action = power_observed(state, current_power)
+                        if inferred_status == "Charging":
+                             logging.warning(f"[STATE INFERENCE {charge_point_id}] Potência detectada ({current_power:.0f}W) mas status era '{previous_status}'. Forçando para 'Charging'.")
+                             DEMAND_TRIGGER.notify("status")
+                        elif inferred_status is not None:
                              logging.warning(f"[STATE INFERENCE {charge_point_id}] Potência caiu para {current_power:.0f}W enquanto status era 'Charging'. Forçando para 'Available'.")
-                             state["status"] = "Available"
+                             DEMAND_TRIGGER.notify("status")
+                        if session_action == RELEASE:
                              logging.info(f"[CONTROL {charge_point_id}] Carga inferida como finalizada. Removendo limitação DESTE carregador.")
-                             asyncio.create_task(send_charging_profile(charge_point_id, state["learned_max_power"]))
-                        if current_power > (state["learned_max_power"] * 1.01):
-                            logging.warning(f"[LEARNING {charge_point_id}]: Novo máximo aprendido! De {state['learned_max_power']:.0f}W para {current_power:.0f}W")
-                            state["learned_max_power"] = current_power
-                            state["current_limit_W"] = current_power
-                            save_learned_powers(CHARGE_POINT_STATE)
+                             PROFILE_COMMANDS.set_limit(charge_point_id, state["learned_max_power"])
+                        # Potência aprendida: percentil das leituras em carga (um pico isolado
+                        # não infla mais o máximo para sempre)
+                        old_learned_W = learned_W = state["learned_max_power"]
+                        for sample in samples:
+                            if sample.power_W > 500:
+                                estimate = LEARNED_POWER_ESTIMATOR.observe(
+                                    charge_point_id, sample.power_W, learned_W, state["current_limit_W"], sample.timestamp.timestamp())
+                                if estimate is not None:
+                                    learned_W = estimate
+                        if learned_W != old_learned_W:
+                            logging.warning(f"[LEARNING {charge_point_id}]: Potência aprendida alterada de {old_learned_W:.0f}W para {learned_W:.0f}W")
+                            state["learned_max_power"] = learned_W
+                            if learned_W > old_learned_W:
+                                state["current_limit_W"] = learned_W
+                            LEARNED_POWERS.update(charge_point_id, learned_W)
             except Exception as e:
                 logging.warning(f"[PARSER {charge_point_id}]: Erro ao processar mensagem JSON: {e} - Mensagem: {message}")
                 continue
             logging.info(f"[FROM CHARGER {charge_point_id}]: {message}")
-            upstream_socket = UPSTREAM_CLIENTS.get(charge_point_id)
-            if upstream_socket and not upstream_socket.closed:
-                await upstream_socket.send(message)
+            # Só enfileira: um CSMS lento não atrasa a leitura dos próximos frames
+            upstream_writer = UPSTREAM_WRITERS.get(charge_point_id)
+            if upstream_writer is not None and upstream_writer.offer(message):
                 logging.info(f"[TO EXTERNAL SERVER FOR {charge_point_id}]: Mensagem encaminhada.")
+            elif upstream_writer is not None:
+                logging.warning(f"[BUFFERING {charge_point_id}] Fila de envio ao servidor externo cheia. Mensagem armazenada no buffer.")
             else:
                 logging.warning(f"[BUFFERING {charge_point_id}] Conexão externa indisponível. Armazenando mensagem no buffer.")
                 if charge_point_id in CHARGE_POINT_STATE:
-                    CHARGE_POINT_STATE[charge_point_id]["message_buffer"].append(message)
+                    CHARGE_POINT_STATE[charge_point_id]["buffers"].to_csms.append(message)
                 else:
                     logging.error(f"[BUFFERING {charge_point_id}] ERRO: Estado não existe mais. Mensagem descartada.")
     except websockets.exceptions.ConnectionClosed as e:
@@ -327,13 +521,20 @@ async def local_server_handler(websocket):
     except Exception as e:
         logging.error(f"[Local Server] Erro inesperado no handler do carregador '{charge_point_id}': {e}", exc_info=True)
     finally:
+        writer.close()
+        if DOWNSTREAM_WRITERS.get(charge_point_id) is writer:
+            del DOWNSTREAM_WRITERS[charge_point_id]
+        GATEWAY_PENDING_REQUESTS.drop_charger(charge_point_id)
+        PROFILE_COMMANDS.drop_charger(charge_point_id)
         if charge_point_id in DOWNSTREAM_CLIENTS:
             del DOWNSTREAM_CLIENTS[charge_point_id]
         if charge_point_id in CHARGE_POINT_STATE:
             CHARGE_POINT_STATE[charge_point_id]["status"] = "Offline"
+            DEMAND_TRIGGER.notify("status")
         logging.info(f"[Local Server] Cliente '{charge_point_id}' desconectado e removido.")
         logging.info(f"[Gateway] Propagando desconexão para o servidor externo de '{charge_point_id}'...")
         task = UPSTREAM_TASKS.pop(charge_point_id, None) 
+        UPSTREAM_RECONNECT.forget(charge_point_id)
         if task and not task.done():
             task.cancel()
             logging.info(f"[Gateway] Tarefa de conexão externa para '{charge_point_id}' foi cancelada.")
@@ -357,15 +558,30 @@ async def connect_external_data_ws():
             logging.error(f"[EXTERNAL_DATA_WS] Erro na conexão: {e}")
         await asyncio.sleep(5)
 
-async def send_data_to_external_ws(data):
-    if external_data_ws and not external_data_ws.closed:
-        try:
-            await external_data_ws.send(json.dumps(data))
-            logging.info(f"[EXTERNAL_DATA_WS] Dados enviados: {data}")
-        except Exception as e:
-            logging.error(f"[EXTERNAL_DATA_WS] Falha ao enviar dados: {e}")
-    else:
-        logging.warning("[EXTERNAL_DATA_WS] WebSocket não conectado. Dados não enviados.")
+def new_charge_point_buffers(charge_point_id):
+    return ChargePointBuffers(
+        charge_point_id, MESSAGE_BUFFER_SPILL_DIR,
+        memory_cap=MESSAGE_BUFFER_MEMORY_CAP, segment_messages=MESSAGE_BUFFER_SEGMENT_MESSAGES,
+    )
+
+def buffer_occupancy():
+    """Ocupação dos buffers de mensagens de cada carregador (memória, disco, prioridade)."""
+    return {cp_id: state["buffers"].occupancy() for cp_id, state in CHARGE_POINT_STATE.items() if "buffers" in state}
+
+def start_link_writer(charge_point_id, websocket, buffer):
+    # Fila + tarefa escritora da conexão; sem frames ao vivo, esvazia o buffer (até N/s)
+    destino = "servidor externo" if buffer.direction == DIRECTION_TO_CSMS else "carregador"
+    def drenado(sent, elapsed):
+        if buffer.direction == DIRECTION_TO_CSMS:
+            ROLLUPS.observe(SERIES_BUFFER_DRAIN_S, charge_point_id, elapsed)
+    return LinkWriter(
+        f"{charge_point_id} -> {destino}", websocket, buffer, maxsize=SEND_QUEUE_MAXSIZE,
+        drain_max_per_s=BUFFER_DRAIN_MAX_PER_S, on_drained=drenado,
+    ).start()
+
+def send_data_to_external_ws(data):
+    # Apenas enfileira; o envio (em lote) é feito pela tarefa UPLINK.run
+    UPLINK.enqueue(data)
 
 
 # --- Lógica do Cliente Externo  ---
@@ -374,55 +590,50 @@ async def external_client_handler(charge_point_id):
     ssl_context = None
     if EXTERNAL_CSMS_URL.startswith("wss://"):
         ssl_context = ssl._create_unverified_context()
+    def abrir_conexao():
+        return websockets.connect(
+            url, subprotocols=["ocpp1.6"], ssl=ssl_context,
+            extra_headers={"User-Agent": "Gateway-TCharge-Python"}, open_timeout=UPSTREAM_OPEN_TIMEOUT_S
+        )
     while True:
+        writer = None
+        websocket = None
         try:
             logging.debug(f"[External Client] Tentando conectar a: {url}")
-            async with websockets.connect(
-                url, subprotocols=["ocpp1.6"], ssl=ssl_context,
-                extra_headers={"User-Agent": "Gateway-TCharge-Python"}, open_timeout=10
-            ) as websocket:
-                logging.info(f"[External Client] Conectado ao servidor externo como '{charge_point_id}'")
-                UPSTREAM_CLIENTS[charge_point_id] = websocket
-                try:
-                    if charge_point_id in CHARGE_POINT_STATE:
-                        buffer = CHARGE_POINT_STATE[charge_point_id].get("message_buffer", [])
-                        if buffer:
-                            logging.info(f"[BUFFER FLUSH {charge_point_id}] Conexão externa pronta. Enviando {len(buffer)} mensagens pendentes (FIFO)...")
-                            messages_to_flush = list(buffer)
-                            CHARGE_POINT_STATE[charge_point_id]["message_buffer"].clear()
-                            
-                            for buffered_msg in messages_to_flush:
-                                await websocket.send(buffered_msg) # Envia para o servidor externo
-                                logging.info(f"[BUFFER SEND {charge_point_id} via FLUSH]: {buffered_msg}")
-                            logging.info(f"[BUFFER FLUSH {charge_point_id}] Buffer limpo.")
-                except Exception as e:
-                    logging.error(f"[BUFFER FLUSH {charge_point_id}] Erro ao enviar buffer: {e}. Mensagens podem ter sido perdidas.")
-                
-                async for message in websocket:
-                    logging.info(f"[FROM EXTERNAL SERVER FOR {charge_point_id}]: {message}")
-                    downstream_socket = DOWNSTREAM_CLIENTS.get(charge_point_id)
-                    if downstream_socket and not downstream_socket.closed:
-                        await downstream_socket.send(message)
+            # O handshake espera uma vaga no teto global de handshakes simultâneos
+            websocket = await UPSTREAM_RECONNECT.connect(charge_point_id, abrir_conexao)
+            logging.info(f"[External Client] Conectado ao servidor externo como '{charge_point_id}'")
+            UPSTREAM_CLIENTS[charge_point_id] = websocket
+            if charge_point_id in CHARGE_POINT_STATE:
+                # Frames do carregador para o CSMS (inclusive o buffer da desconexão) saem pela escritora
+                writer = start_link_writer(charge_point_id, websocket, CHARGE_POINT_STATE[charge_point_id]["buffers"].to_csms)
+                UPSTREAM_WRITERS[charge_point_id] = writer
+
+            async for message in websocket:
+                logging.info(f"[FROM EXTERNAL SERVER FOR {charge_point_id}]: {message}")
+                # Só enfileira: um carregador lento não atrasa a leitura do CSMS
+                downstream_writer = DOWNSTREAM_WRITERS.get(charge_point_id)
+                if downstream_writer is not None and not downstream_writer.closed:
+                    frame = OcppFrame(message)
+                    is_stop_command = frame.msg_type_id == CALL and frame.action == "RemoteStopTransaction"
+                    if downstream_writer.offer(message, priority=is_stop_command):
                         logging.info(f"[TO CHARGER {charge_point_id}]: Mensagem encaminhada.")
                     else:
-                        logging.warning(f"[BUFFERING {charge_point_id}] Carregador local offline. Verificando prioridade...")
-                        is_stop_command = False
-                        try:
-                            msg_json = json.loads(message)
-                            if msg_json[0] == 2 and msg_json[2] == "RemoteStopTransaction":
-                                is_stop_command = True
-                        except Exception:
-                            pass 
-                        if charge_point_id in CHARGE_POINT_STATE:
-                            buffer = CHARGE_POINT_STATE[charge_point_id].get("message_buffer", [])
-                            if is_stop_command:
-                                buffer.insert(0, message)
-                                logging.warning(f"[PRIORITY BUFFER {charge_point_id}] Comando RemoteStopTransaction armazenado com PRIORIDADE.")
-                            else:
-                                buffer.append(message)
-                                logging.warning(f"[BUFFERING {charge_point_id}] Mensagem normal armazenada no buffer.")
+                        logging.warning(f"[BUFFERING {charge_point_id}] Fila de envio ao carregador cheia. Mensagem armazenada no buffer.")
+                else:
+                    logging.warning(f"[BUFFERING {charge_point_id}] Carregador local offline. Verificando prioridade...")
+                    frame = OcppFrame(message)
+                    is_stop_command = frame.msg_type_id == CALL and frame.action == "RemoteStopTransaction"
+                    if charge_point_id in CHARGE_POINT_STATE:
+                        buffer = CHARGE_POINT_STATE[charge_point_id]["buffers"].to_charger
+                        if is_stop_command:
+                            buffer.append_priority(message)
+                            logging.warning(f"[PRIORITY BUFFER {charge_point_id}] Comando RemoteStopTransaction armazenado com PRIORIDADE.")
                         else:
-                            logging.error(f"[BUFFERING {charge_point_id}] ERRO: Estado não existe mais. Mensagem descartada.")
+                            buffer.append(message)
+                            logging.warning(f"[BUFFERING {charge_point_id}] Mensagem normal armazenada no buffer.")
+                    else:
+                        logging.error(f"[BUFFERING {charge_point_id}] ERRO: Estado não existe mais. Mensagem descartada.")
         except asyncio.CancelledError:
             logging.info(f"[External Client] Tarefa para '{charge_point_id}' cancelada (carregador local desconectou). Encerrando.")
             break 
@@ -431,17 +642,28 @@ async def external_client_handler(charge_point_id):
         except Exception as e:
             logging.error(f"[External Client] Erro inesperado para '{charge_point_id}': {e}...", exc_info=True)
         finally:
+            if writer is not None:
+                writer.close()
+                if UPSTREAM_WRITERS.get(charge_point_id) is writer:
+                    del UPSTREAM_WRITERS[charge_point_id]
             if charge_point_id in UPSTREAM_CLIENTS:
                 del UPSTREAM_CLIENTS[charge_point_id]
+            if websocket is not None:
+                await websocket.close()
         if not asyncio.current_task().cancelled():
-            logging.info(f"[External Client] '{charge_point_id}' desconectado. Aguardando 10s para reconectar.")
-            await asyncio.sleep(10)
+            # Primeira tentativa quase imediata; se falhar, backoff exponencial com jitter
+            # (encurtado se outra conexão com o CSMS se recuperar antes)
+            logging.info(f"[External Client] '{charge_point_id}' desconectado. Aguardando para reconectar.")
+            waited = await UPSTREAM_RECONNECT.wait_before_retry(charge_point_id)
+            logging.debug(f"[External Client] '{charge_point_id}' nova tentativa após {waited:.1f}s.")
     logging.info(f"[External Client] Tarefa para '{charge_point_id}' finalizada.")
 # ------------------------------------------------------------
 
 
 
 # --- FUNÇÕES DE CONTROLE OCPP (send_trigger_message, send_charging_profile) ---
+# Ambas devolvem o future da resposta do carregador (ou None se o envio falhou);
+# quem quiser a confirmação pode aguardá-lo, com timeout.
 async def send_trigger_message(cp_id, message_name="MeterValues"):
     socket = DOWNSTREAM_CLIENTS.get(cp_id)
     if not socket or socket.closed:
@@ -449,12 +671,16 @@ async def send_trigger_message(cp_id, message_name="MeterValues"):
     message_id = str(uuid.uuid4())
     payload = {"requestedMessage": message_name}
     message = [2, message_id, "TriggerMessage", payload]
+    # Registrada antes do envio para não perder uma resposta muito rápida
+    future = GATEWAY_PENDING_REQUESTS.register(cp_id, message_id, "TriggerMessage")
     try:
         await socket.send(json.dumps(message))
-        GATEWAY_PENDING_REQUESTS.add(message_id)
         logging.info(f"[TO CHARGER {cp_id}]: Solicitando {message_name}...")
     except Exception as e:
+        GATEWAY_PENDING_REQUESTS.discard(cp_id, message_id)
         logging.error(f"[TRIGGER] Erro ao enviar TriggerMessage para '{cp_id}': {e}")
+        return None
+    return future
 
 async def send_charging_profile(cp_id, limit_in_watts):
     socket = DOWNSTREAM_CLIENTS.get(cp_id)
@@ -479,29 +705,113 @@ async def send_charging_profile(cp_id, limit_in_watts):
         }
     }
     message = [2, message_id, "SetChargingProfile", payload]
+    future = GATEWAY_PENDING_REQUESTS.register(cp_id, message_id, "SetChargingProfile")
     try:
         await socket.send(json.dumps(message))
-        GATEWAY_PENDING_REQUESTS.add(message_id)
         logging.info(f"[TO CHARGER {cp_id}]: Enviando SetChargingProfile (MaxProfile), limite: {limit_in_watts}W")
     except Exception as e:
+        GATEWAY_PENDING_REQUESTS.discard(cp_id, message_id)
         logging.error(f"[CONTROL] Erro ao enviar SetChargingProfile para '{cp_id}': {e}")
+        return None
+    return future
+
+async def send_change_configuration(cp_id, key, value):
+    socket = DOWNSTREAM_CLIENTS.get(cp_id)
+    if not socket or socket.closed:
+        return None
+    message_id = str(uuid.uuid4())
+    message = [2, message_id, "ChangeConfiguration", {"key": key, "value": str(value)}]
+    future = GATEWAY_PENDING_REQUESTS.register(cp_id, message_id, "ChangeConfiguration")
+    try:
+        await socket.send(json.dumps(message))
+        logging.info(f"[TO CHARGER {cp_id}]: ChangeConfiguration {key}={value}")
+    except Exception as e:
+        GATEWAY_PENDING_REQUESTS.discard(cp_id, message_id)
+        logging.error(f"[CONFIG] Erro ao enviar ChangeConfiguration para '{cp_id}': {e}")
+        return None
+    return future
+
+async def configure_meter_values(cp_id):
+    # MeterValues periódicos com potência (e corrente por fase): o gateway passa a
+    # receber amostras sem precisar de TriggerMessage para cada leitura
+    settings = (("MeterValuesSampledData", ",".join(SAMPLED_MEASURANDS)),
+                ("MeterValueSampleInterval", METER_SAMPLE_INTERVAL_S))
+    for key, value in settings:
+        future = await send_change_configuration(cp_id, key, value)
+        if future is None:
+            return
+        try:
+            response = await asyncio.wait_for(future, timeout=GATEWAY_CALL_TTL_S)
+            status = response.get("status") if isinstance(response, dict) else response
+        except Exception as e:
+            status = f"sem resposta ({e.__class__.__name__})"
+        logging.info(f"[CONFIG {cp_id}] {key}={value}: {status}")
+        if cp_id in CHARGE_POINT_STATE and key == "MeterValueSampleInterval":
+            CHARGE_POINT_STATE[cp_id]["meter_sample_interval_s"] = METER_SAMPLE_INTERVAL_S if status in ("Accepted", "RebootRequired") else None
+
+# Canal por carregador: vale o último limite, sem reenviar o que já foi confirmado
+PROFILE_COMMANDS = ProfileCommands(send_charging_profile, deadline_s=PROFILE_COMMAND_DEADLINE_S)
 # ------------------------------------
 
 
 
 # --- LOOP DE SOLICITAÇÃO DE MEDIDORES ---
+# Cada carregador em carga tem o seu prazo (espalhado, com jitter); os pedidos
+# são concorrentes e o intervalo encurta com potência variando ou site no limite.
+METER_POLL = MeterPollScheduler(
+    lambda cp_id: send_trigger_message(cp_id, "MeterValues"),
+    base_interval_s=METER_POLL_BASE_INTERVAL_S, min_interval_s=METER_POLL_MIN_INTERVAL_S,
+    max_interval_s=METER_POLL_MAX_INTERVAL_S, pressure_interval_s=METER_POLL_PRESSURE_INTERVAL_S,
+    volatile_delta_W=METER_POLL_VOLATILE_DELTA_W,
+)
+
 async def request_meter_values_loop():
+    await METER_POLL.run(
+        lambda: CHARGE_POINT_STATE.charging()[0],
+        lambda: SITE_POWER_STATE.get("current_total_W", 0.0) >= MAX_TOTAL_POWER_W * METER_POLL_PRESSURE_FRACTION,
+    )
+# ------------------------------------------------------------
+
+
+
+# --- LOOP DE AGREGADOS POR MINUTO ---
+async def rollup_loop():
+    # Potências são observadas quando chegam; aqui amostramos os limites alocados,
+    # a ocupação dos buffers de mensagens e gravamos os minutos já encerrados.
     while True:
         try:
-            active_chargers = [
-                cp_id for cp_id, state in CHARGE_POINT_STATE.items() 
-                if state["status"] == "Charging"
-            ]
-            for cp_id in active_chargers:
-                await send_trigger_message(cp_id, "MeterValues")
+            for cp_id, state in list(CHARGE_POINT_STATE.items()):
+                if state.get("status") != "Offline":
+                    ROLLUPS.observe(SERIES_CHARGER_LIMIT, cp_id, state.get("current_limit_W", 0.0))
+                buffers = state.get("buffers")
+                if buffers is not None:
+                    if len(buffers.to_csms):
+                        ROLLUPS.observe(SERIES_BUFFER_TO_CSMS, cp_id, len(buffers.to_csms))
+                    if len(buffers.to_charger):
+                        ROLLUPS.observe(SERIES_BUFFER_TO_CHARGER, cp_id, len(buffers.to_charger))
+            if ROLLUPS.flush():
+                # Uma vez por minuto: ocupação dos buffers que não estão vazios
+                ocupados = {cp_id: occ for cp_id, occ in buffer_occupancy().items()
+                            if any(d["priority"] + d["memory"] + d["disk"] for d in occ.values())}
+                if ocupados:
+                    logging.info(f"[BUFFER] Ocupação dos buffers de mensagens: {ocupados}")
+                lentos = sorted(GATEWAY_PENDING_REQUESTS.summary("SetChargingProfile").items(),
+                                key=lambda item: item[1]["p95_ms"] or 0, reverse=True)[:5]
+                if lentos and (lentos[0][1]["p95_ms"] or 0) >= SLOW_PROFILE_RTT_MS:
+                    logging.info(f"[PENDING] Carregadores mais lentos para confirmar SetChargingProfile (RTT): {dict(lentos)}")
+                logging.info(f"[PROFILE] Comandos SetChargingProfile: {PROFILE_COMMANDS.stats()}")
+                logging.info(f"[METER_POLL] Pedidos de MeterValues: {METER_POLL.stats()}")
+                logging.info(f"[UPSTREAM] Conexões com o CSMS: {UPSTREAM_RECONNECT.stats()}")
+                # Checkpoint dos sketches de potência alterados (gravado pelo LearnedPowersStore)
+                LEARNED_POWERS.update_sketches(LEARNED_POWER_ESTIMATOR.take_dirty())
+                logging.info(f"[LEARNING] Potências aprendidas: {LEARNED_POWER_ESTIMATOR.stats()}")
+                cheias = {writer.name: writer.stats() for writers in (UPSTREAM_WRITERS, DOWNSTREAM_WRITERS)
+                          for writer in writers.values() if writer.spilled or len(writer)}
+                if cheias:
+                    logging.info(f"[SEND QUEUE] Filas de envio com frames pendentes ou transbordo: {cheias}")
         except Exception as e:
-            logging.error(f"[METER_LOOP] Erro no loop de pedido de MeterValues: {e}")          
-        await asyncio.sleep(60) # 1 minuto
+            logging.error(f"[ROLLUP] Erro no loop de agregados: {e}")
+        await asyncio.sleep(ROLLUP_SAMPLE_INTERVAL_S)
 # ------------------------------------------------------------
 
 
@@ -509,27 +819,21 @@ async def request_meter_values_loop():
 # --- CÉREBRO DE CONTROLE DE DEMANDA  ---
 async def demand_control_loop():
     # Espera inicial para dar tempo aos carregadores se conectarem e enviarem dados.
-    await asyncio.sleep(10) 
+    await asyncio.sleep(DEMAND_CONTROL_STARTUP_S)
+    gatilhos = {"inicial"}
     
-    # Loop infinito que mantém o controle ativo.
+    # Loop infinito que mantém o controle ativo (reavaliado por eventos ou pelo tick periódico).
     while True:
         try:
             # --- 1. COLETA DE DADOS ---
             
-            # Pega um snapshot seguro do estado atual
-            current_state_snapshot = CHARGE_POINT_STATE.copy()
-
-            # Cria um dicionário temporário ('charging_chargers') contendo APENAS
-            # os carregadores que estão ATUALMENTE no estado "Charging".
-            charging_chargers = {
-                cp_id: state for cp_id, state in current_state_snapshot.items()
-                if state.get("status") == "Charging"
-            }
+            # Carregadores em carga (lista refeita só quando algum status muda) e
+            # agregados mantidos pela tabela a cada atualização dos handlers
+            charging_ids, charging_rows = CHARGE_POINT_STATE.charging()
             
             # --- CONTAGEM DE CARREGADORES EM ESPERA ---
             # (Calculado apenas para fins de log)
-            connected_chargers_count = sum(1 for state in current_state_snapshot.values() if state.get("status") != "Offline")
-            waiting_chargers_count = connected_chargers_count - len(charging_chargers)
+            waiting_chargers_count = CHARGE_POINT_STATE.connected_count - len(charging_ids)
             
             # ---  CÁLCULO DA POTÊNCIA DISPONÍVEL ---
             
@@ -537,7 +841,7 @@ async def demand_control_loop():
             current_site_power_W = SITE_POWER_STATE.get("current_total_W", 0.0)
             
             # Calcula a demanda ATUAL (real) apenas dos carregadores
-            total_charger_demand_W = sum(state["current_power_W"] for state in charging_chargers.values())
+            total_charger_demand_W = CHARGE_POINT_STATE.charging_power_W
             
             # Calcula a potência que NÃO VEM dos carregadores (consumo da "casa")
             non_charger_site_power_W = max(0, current_site_power_W - total_charger_demand_W)
@@ -556,71 +860,104 @@ async def demand_control_loop():
             # --- Log informativo mostrando a situação atual ---
             logging.info(
                 f"[CONTROL] Demanda (Carreg.): {total_charger_demand_W:.2f}W / {available_power_for_CHARGER_GROUP_W:.0f}W (Disponível p/ Carregadores) | "
-                f"Ativos: {len(charging_chargers)} | "
+                f"Ativos: {len(charging_ids)} | "
                 f"Espera: {waiting_chargers_count} | "
                 f"Consumo Total Site: {current_site_power_W:.0f}W | "
-                f"Consumo Outros: {non_charger_site_power_W:.0f}W"
+                f"Consumo Outros: {non_charger_site_power_W:.0f}W | "
+                f"Gatilho: {','.join(sorted(gatilhos))}"
             )
 
 
-            tasks_to_run = []
+            log_details = [] # Lista para o novo log de resumo
 
 
-            if charging_chargers:
+            if charging_ids:
                 
-                total_learned_max_power_active = sum(state.get("learned_max_power", DEFAULT_MAX_POWER_SEED) for state in charging_chargers.values())
-
-                if total_learned_max_power_active > 0:
-                    
-                    # Verifica se há sobrecarga REAL
-                    is_overload = total_charger_demand_W > available_power_for_CHARGER_GROUP_W
-                    
-                    # --- ALTERAÇÃO AQUI: Log condicional ---
-                    # Log de aviso SÓ se houver sobrecarga
-                    if is_overload:
-                        logging.warning(f"[CONTROL] SOBRECARGA! ⚡ Demanda: {total_charger_demand_W:.2f}W > Disponível: {available_power_for_CHARGER_GROUP_W:.0f}W. Aplicando balanceamento.")
-                    # --- FIM DA ALTERAÇÃO ---
-                    
-                    log_details = [] # Lista para o novo log de resumo
-                    
-                    for cp_id, state in charging_chargers.items():
-                        my_share_percent = state.get("learned_max_power", DEFAULT_MAX_POWER_SEED) / total_learned_max_power_active
-                        new_limit_W = available_power_for_CHARGER_GROUP_W * my_share_percent
-                        new_limit_W = max(new_limit_W, MIN_CHARGE_POWER_W)
-                        new_limit_W = min(new_limit_W, state.get("learned_max_power", DEFAULT_MAX_POWER_SEED))
-                        
-                        # Envia o comando se o limite for diferente (com persistência se houver sobrecarga real)
-                        # (1% de tolerância)
-                        if abs(new_limit_W - state.get("current_limit_W", 0)) > (new_limit_W * 0.01) or is_overload:
-                            tasks_to_run.append(send_charging_profile(cp_id, new_limit_W))
-                            log_details.append(f"{cp_id}: {new_limit_W:.0f}W") # Adiciona ao resumo
-                            
-                else:
-                    logging.error("[CONTROL] Carregadores ativos detectados, mas 'total_learned_max_power_active' é zero. Não é possível balancear.")
-            
-            # --- 5. EXECUTAR TODOS OS COMANDOS ---
-            if tasks_to_run:
-                logging.info(f"Enviando {len(tasks_to_run)} atualizações de perfil de carga...")
-                await asyncio.gather(*tasks_to_run) 
+                # Verifica se há sobrecarga REAL
+                is_overload = total_charger_demand_W > available_power_for_CHARGER_GROUP_W
+                
+                # --- ALTERAÇÃO AQUI: Log condicional ---
+                # Log de aviso SÓ se houver sobrecarga
+                if is_overload:
+                    logging.warning(f"[CONTROL] SOBRECARGA! ⚡ Demanda: {total_charger_demand_W:.2f}W > Disponível: {available_power_for_CHARGER_GROUP_W:.0f}W. Aplicando balanceamento.")
+                # --- FIM DA ALTERAÇÃO ---
                 
-                # Log de resumo APÓS o envio
-                if log_details:
-                     logging.info(f"[CONTROL] Limites aplicados: {' | '.join(log_details)}")
+                # Teto de cada carregador para nenhuma fase do site passar do limite
+                # (mesma corrente por fase para todos quando uma fase satura)
+                ceilings = None
+                site_phase_W = SITE_POWER_STATE.get("phase_W")
+                if PHASE_AWARE_ALLOCATION and site_phase_W is not None:
+                    charging_demand_W = CHARGE_POINT_STATE.column("current_power_W", charging_rows)
+                    ceilings, charger_phase_W, phase_available_W = site_phase_ceilings(
+                        MAX_PHASE_POWER_W, site_phase_W, CHARGER_PHASES.shares(charging_ids),
+                        CHARGER_PHASES.known(charging_ids), charging_demand_W,
+                        CHARGE_POINT_STATE.column("learned_max_power", charging_rows),
+                        CHARGE_POINT_STATE.column("current_limit_W", charging_rows),
+                        min_W=MIN_CHARGE_POWER_W, margin_W=ALLOCATION_MARGIN_W, saturation=ALLOCATION_SATURATION,
+                    )
+                    logging.info("[CONTROL] Fases (carregadores / disponível p/ carregadores): " + " | ".join(
+                        f"{phase}: {charger_W:.0f}W / {available_W:.0f}W"
+                        for phase, charger_W, available_W in zip(PHASES, charger_phase_W, phase_available_W)))
+
+                # Water-filling em cada grupo de carga (só o site, sem load_groups.json):
+                # quem consome pouco fica com consumo + margem e a sobra vai para quem está
+                # no limite; a soma nunca passa do disponível do site nem de nenhum grupo.
+                new_limits = LOAD_GROUPS.allocate(
+                    charging_ids,
+                    CHARGE_POINT_STATE.column("current_power_W", charging_rows),
+                    CHARGE_POINT_STATE.column("learned_max_power", charging_rows),
+                    CHARGE_POINT_STATE.column("current_limit_W", charging_rows),
+                    current_site_power_W,
+                    min_W=MIN_CHARGE_POWER_W, margin_W=ALLOCATION_MARGIN_W, saturation=ALLOCATION_SATURATION,
+                    ceiling_W=ceilings,
+                )
+                if not LOAD_GROUPS.is_flat():
+                    logging.info("[CONTROL] Grupos (demanda / disponível, ativos): " + " | ".join(
+                        f"{name}: {demand:.0f}W / {available:.0f}W ({count})"
+                        for name, (demand, available, count) in LOAD_GROUPS.last_report.items()))
+                # Só os limites que mudaram (1% de tolerância, como no canal) em relação
+                # ao último alocado, mais os que o carregador não confirmou, vão ao canal
+                allocated = CHARGE_POINT_STATE.column("allocated_W", charging_rows)
+                changed = ~(np.abs(new_limits - allocated) <= allocated * PROFILE_COMMANDS.tolerance)
+                if PROFILE_COMMANDS.unconfirmed:
+                    changed |= np.fromiter((cp_id in PROFILE_COMMANDS.unconfirmed for cp_id in charging_ids),
+                                           dtype=bool, count=len(charging_ids))
+                changed_idx = np.flatnonzero(changed)
+                CHARGE_POINT_STATE.set_column("allocated_W", charging_rows[changed_idx], new_limits[changed_idx])
+                for i in changed_idx.tolist():
+                    cp_id, new_limit_W = charging_ids[i], float(new_limits[i])
+                    # O canal ainda descarta o que já está pendente, em voo ou confirmado
+                    if PROFILE_COMMANDS.set_limit(cp_id, new_limit_W):
+                        log_details.append(f"{cp_id}: {new_limit_W:.0f}W") # Adiciona ao resumo
+                # Pausados (0W) continuam com o controle: potência baixa ou SuspendedEVSE
+                # não os liberam mais para o máximo aprendido
+                for cp_id, paused in CHARGE_POINT_STATE.set_paused(charging_rows, new_limits <= 0.0):
+                    logging.info(f"[CONTROL {cp_id}] {'Pausado' if paused else 'Retomado'} pelo controle de demanda.")
+
+            # --- 5. COMANDOS ---
+            # Não espera os carregadores: envio e confirmação seguem no canal de cada
+            # um, com prazo, e o ciclo de controle não depende de carregadores lentos.
+            if log_details:
+                logging.info(f"[CONTROL] Limites agendados ({len(log_details)}): {' | '.join(log_details)}")
 
         except Exception as e:
             logging.error(f"[CONTROL_LOOP] Erro no loop de controle de demanda: {e}", exc_info=True)
 
-        # Pausa a execução desta tarefa por 10 segundos antes de verificar tudo de novo.
-        await asyncio.sleep(10)
+        # Espera o próximo evento (medidor, status, potência) ou o tick periódico.
+        gatilhos = await DEMAND_TRIGGER.wait()
 
 
 # --- Função Principal ---
 async def main():
     # Inicia conexão WebSocket com servidor externo de dados
     asyncio.create_task(connect_external_data_ws())
+    asyncio.create_task(UPLINK.run(lambda: external_data_ws))
     logging.info("Iniciando o Gateway OCPP e o Servidor do Medidor...")
     
     # --- 1. Configurar Servidor do Medidor (aiohttp) ---
+    METER_JSONL_WRITER.start()
+    ROLLUP_WRITER.start()
+    LEARNED_POWERS.start()
     app = web.Application()
     # Adiciona a rota POST que o medidor usará
     app.router.add_post("/api/insert.php", handle_meter_post) 
@@ -643,6 +980,8 @@ async def main():
     logging.info("Iniciando loops de controle de demanda e medição...")
     asyncio.create_task(demand_control_loop())
     asyncio.create_task(request_meter_values_loop())
+    asyncio.create_task(rollup_loop())
+    asyncio.create_task(GATEWAY_PENDING_REQUESTS.run())
     
     # --- 4. Iniciar os servidores e esperar ---
     await meter_server.start() # Inicia o servidor http
@@ -658,7 +997,11 @@ async def main():
 # --- Bloco de Inicialização  ---
 if __name__ == "__main__":
     # Carrega as potências salvas ANTES de iniciar qualquer coisa
-    loaded_learned_powers = load_learned_powers()
+    loaded_learned_powers, loaded_power_sketches = load_learned_powers()
+    LEARNED_POWERS.load(loaded_learned_powers, loaded_power_sketches)
+    LEARNED_POWER_ESTIMATOR.load(loaded_power_sketches)
+    LOAD_GROUPS = load_load_groups(LOAD_GROUPS_FILE, MAX_TOTAL_POWER_W)
+    CHARGER_PHASES = ChargerPhases(load_charger_phases(CHARGER_PHASES_FILE))
     
     loop = None
     try:
@@ -669,6 +1012,9 @@ if __name__ == "__main__":
 
     except KeyboardInterrupt:
         logging.info("Gateway desligando (Ctrl+C)... Removendo limitações de potência.")
+        # Potências aprendidas ainda não gravadas vão para o disco antes de qualquer outra coisa
+        LEARNED_POWERS.update_sketches(LEARNED_POWER_ESTIMATOR.take_dirty())
+        LEARNED_POWERS.flush()
         
         if loop and loop.is_running() and DOWNSTREAM_CLIENTS:
             shutdown_tasks = []
@@ -701,8 +1047,17 @@ if __name__ == "__main__":
             logging.info("Nenhum carregador conectado para liberar ou loop não está rodando.")
             
     finally:
+        # Grava o que restou dos agregados (inclusive o minuto corrente) e dos pacotes do medidor
+        ROLLUPS.flush(include_current=True)
+        ROLLUP_WRITER.stop()
+        METER_JSONL_WRITER.stop()
+        LEARNED_POWERS.stop()
+        # Telemetria ainda não enviada vai para o spool e é reenviada na próxima execução
+        UPLINK.close()
         # Limpeza final do loop asyncio
         if loop and loop.is_running():
             logging.info("Fechando o loop de eventos asyncio...")
             loop.close()
-        logging.info("Gateway desligado.")
\ No newline at end of file
+        logging.info("Gateway desligado.")
+        if log_writer is not None:
+            log_writer.stop()
\ No newline at end of file
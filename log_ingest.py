@@ -0,0 +1,393 @@
+#----------------------------------------------------------
+# Ingestão colunar dos logs do gateway (gateway.log / logs combinados).
+#
+# Uma única passada pelo arquivo: cada linha é classificada pela tag entre
+# colchetes que vem logo após o nível do log e apenas os campos necessários
+# são extraídos. Os eventos vão direto para colunas tipadas (timestamps em
+# int64 ms desde a época, seriais como códigos de categoria, potência em
+# float32), sem listas de dicts intermediárias.
+#----------------------------------------------------------
+from array import array
+from datetime import date
+import os
+import numpy as np
+import pandas as pd
+#----------------------------------------------------------
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_MS_PER_DAY = 86400000
+
+# Tags reconhecidas (bytes, pois o arquivo é lido em modo binário)
+_TAG_STATE_UPDATE = b"[STATE UPDATE "
+_TAG_FROM_CHARGER = b"[FROM CHARGER "
+_TAG_CONTROL = b"[CONTROL] "
+_TAG_METER_SERVER = b"[METER_SERVER] "
+_TAG_LOCAL_SERVER = b"[Local Server] "
+
+_POWER_MARKER = b"]: Pot\xc3\xaancia atual: "              # "Potência atual: "
+_SITE_POWER_MARKER = b"Pot\xc3\xaancia total do site atualizada: "
+_OVERLOAD_MARKER = b"SOBRECARGA!"
+_OVERLOAD_SUFFIX = b"Aplicando balanceamento."
+_DISCONNECT_PREFIX = b"Cliente '"
+_DISCONNECT_SUFFIX = b"' desconectado e removido."
+_STATUS_NOTIFICATION = b'"StatusNotification"'
+_STATUS_KEY = b'"status"'
+
+
+def is_serial(cp_id):
+    # Filtra apenas IDs que parecem número de série (sem espaços, sem 'EXTERNAL SERVER')
+    return bool(cp_id) and not cp_id.startswith("EXTERNAL SERVER") and cp_id.replace(' ', '').isalnum()
+
+
+class ParsedLog:
+    """
+    Resultado colunar da ingestão. Cada tipo de evento é um conjunto de arrays
+    NumPy de mesmo tamanho; os seriais são guardados como códigos (int32) em
+    `serials` e os status como códigos em `statuses`.
+    """
+
+    def __init__(self, serials, statuses, columns):
+        self.serials = serials
+        self.statuses = statuses
+        self.power_ts = columns["power_ts"]
+        self.power_serial = columns["power_serial"]
+        self.power_W = columns["power_W"]
+        self.status_ts = columns["status_ts"]
+        self.status_serial = columns["status_serial"]
+        self.status_code = columns["status_code"]
+        self.control_ts = columns["control_ts"]
+        self.site_ts = columns["site_ts"]
+        self.site_W = columns["site_W"]
+        self.disconnect_ts = columns["disconnect_ts"]
+        self.disconnect_serial = columns["disconnect_serial"]
+        self.line_ts = columns["line_ts"]
+        self.min_ts = columns["min_ts"]
+        self.max_ts = columns["max_ts"]
+
+    # --- Conversões para pandas (usadas pelo dashboard e pelo script de análise) ---
+    def _serial_categorical(self, codes):
+        return pd.Categorical.from_codes(codes, categories=list(self.serials))
+
+    def power_frame(self):
+        return pd.DataFrame({
+            "timestamp": _to_datetime(self.power_ts),
+            "serial_number": self._serial_categorical(self.power_serial),
+            "potencia_W": self.power_W,
+        })
+
+    def status_frame(self):
+        return pd.DataFrame({
+            "timestamp": _to_datetime(self.status_ts),
+            "serial_number": self._serial_categorical(self.status_serial),
+            "status": pd.Categorical.from_codes(self.status_code, categories=list(self.statuses)),
+        })
+
+    def site_frame(self):
+        return pd.DataFrame({
+            "timestamp": _to_datetime(self.site_ts),
+            "power": self.site_W,
+        })
+
+    def control_times(self):
+        return _to_datetime(self.control_ts)
+
+    def line_times(self):
+        # Instantes distintos de todas as linhas com timestamp (ordenados)
+        return _to_datetime(np.unique(self.line_ts))
+
+    def disconnect_frame(self):
+        return pd.DataFrame({
+            "timestamp": _to_datetime(self.disconnect_ts),
+            "serial_number": self._serial_categorical(self.disconnect_serial),
+        })
+
+    def disconnect_counts(self):
+        # {cp_id: {dia: quantidade}}, mesmo formato do antigo get_disconnects
+        df = self.disconnect_frame()
+        disconnects = {}
+        if df.empty:
+            return disconnects
+        df["day"] = df["timestamp"].dt.date
+        counts = df.groupby(["serial_number", "day"], observed=True).size()
+        for (cp_id, day), count in counts.items():
+            disconnects.setdefault(cp_id, {})[day] = int(count)
+        return disconnects
+
+    def days(self):
+        # Dias (datetime.date) que possuem qualquer linha com timestamp válido
+        if self.min_ts is None:
+            return []
+        first = int(self.min_ts // _MS_PER_DAY)
+        last = int(self.max_ts // _MS_PER_DAY)
+        return [date.fromordinal(_EPOCH_ORDINAL + d) for d in range(first, last + 1)]
+
+
+def _to_datetime(ts_ms):
+    return pd.Series(np.asarray(ts_ms, dtype=np.int64).astype("datetime64[ms]").astype("datetime64[ns]"))
+
+
+class LogIngestor:
+    """
+    Parser de passada única. Mantém os dicionários de seriais/status entre
+    chamadas de `feed`, de modo que os códigos de categoria são estáveis.
+    """
+
+    def __init__(self):
+        self.serial_index = {}
+        self.serials = []
+        self.status_index = {}
+        self.statuses = []
+        self._day_cache = {}
+        self._reset_columns()
+
+    def _reset_columns(self):
+        self._power_ts = array("q")
+        self._power_serial = array("i")
+        self._power_W = array("f")
+        self._status_ts = array("q")
+        self._status_serial = array("i")
+        self._status_code = array("i")
+        self._control_ts = array("q")
+        self._site_ts = array("q")
+        self._site_W = array("f")
+        self._disconnect_ts = array("q")
+        self._disconnect_serial = array("i")
+        self._line_ts = array("q")   # timestamp de cada linha (repetições seguidas guardadas uma vez)
+        self._min_ts = None
+        self._max_ts = None
+
+    def _serial_code(self, raw):
+        code = self.serial_index.get(raw)
+        if code is None:
+            cp_id = raw.decode("utf-8", "replace").strip()
+            code = -1
+            if is_serial(cp_id):
+                code = len(self.serials)
+                self.serials.append(cp_id)
+            self.serial_index[raw] = code
+        return code
+
+    def _status_code_for(self, raw):
+        code = self.status_index.get(raw)
+        if code is None:
+            code = len(self.statuses)
+            self.statuses.append(raw.decode("ascii"))
+            self.status_index[raw] = code
+        return code
+
+    def _parse_ts(self, line):
+        # "YYYY-MM-DD HH:MM:SS,mmm" nas posições fixas 0..22
+        if len(line) < 26 or line[10] != 32 or line[19] != 44 or line[23:26] != b" - ":
+            return None
+        day_key = line[:10]
+        day_ms = self._day_cache.get(day_key)
+        if day_ms is None:
+            try:
+                d = date(int(day_key[0:4]), int(day_key[5:7]), int(day_key[8:10]))
+            except ValueError:
+                return None
+            day_ms = (d.toordinal() - _EPOCH_ORDINAL) * _MS_PER_DAY
+            self._day_cache[day_key] = day_ms
+        try:
+            return (day_ms + int(line[11:13]) * 3600000 + int(line[14:16]) * 60000
+                    + int(line[17:19]) * 1000 + int(line[20:23]))
+        except ValueError:
+            return None
+
+    def feed_line(self, line):
+        ts = self._parse_ts(line)
+        if ts is None:
+            return
+        line_ts = self._line_ts
+        if not line_ts or line_ts[-1] != ts:
+            line_ts.append(ts)
+        if self._min_ts is None or ts < self._min_ts:
+            self._min_ts = ts
+        if self._max_ts is None or ts > self._max_ts:
+            self._max_ts = ts
+
+        # A mensagem começa após "<ts> - <NIVEL> - "
+        msg_start = line.find(b" - ", 26)
+        if msg_start < 0:
+            return
+        msg_start += 3
+        if line[msg_start:msg_start + 1] != b"[":
+            return
+        msg = line[msg_start:]
+
+        if msg.startswith(_TAG_STATE_UPDATE):
+            pos = msg.find(_POWER_MARKER)
+            if pos < 0:
+                return
+            code = self._serial_code(msg[len(_TAG_STATE_UPDATE):pos])
+            if code < 0:
+                return
+            value_start = pos + len(_POWER_MARKER)
+            value_end = msg.find(b"W", value_start)
+            try:
+                power = float(msg[value_start:value_end])
+            except ValueError:
+                return
+            self._power_ts.append(ts)
+            self._power_serial.append(code)
+            self._power_W.append(power)
+
+        elif msg.startswith(_TAG_FROM_CHARGER):
+            if _STATUS_NOTIFICATION not in msg:
+                return
+            id_end = msg.find(b"]:")
+            if id_end < 0:
+                return
+            key = msg.rfind(_STATUS_KEY)
+            if key < 0:
+                return
+            status = _quoted_value(msg, key + len(_STATUS_KEY))
+            if not status:
+                return
+            code = self._serial_code(msg[len(_TAG_FROM_CHARGER):id_end])
+            if code < 0:
+                return
+            self._status_ts.append(ts)
+            self._status_serial.append(code)
+            self._status_code.append(self._status_code_for(status))
+
+        elif msg.startswith(_TAG_CONTROL):
+            if msg.startswith(_OVERLOAD_MARKER, len(_TAG_CONTROL)) and _OVERLOAD_SUFFIX in msg:
+                self._control_ts.append(ts)
+
+        elif msg.startswith(_TAG_METER_SERVER):
+            pos = msg.find(_SITE_POWER_MARKER)
+            if pos < 0:
+                return
+            value_start = pos + len(_SITE_POWER_MARKER)
+            value_end = msg.find(b"W", value_start)
+            try:
+                power = float(msg[value_start:value_end])
+            except ValueError:
+                return
+            self._site_ts.append(ts)
+            self._site_W.append(power)
+
+        elif msg.startswith(_TAG_LOCAL_SERVER):
+            body = len(_TAG_LOCAL_SERVER)
+            if not msg.startswith(_DISCONNECT_PREFIX, body):
+                return
+            id_start = body + len(_DISCONNECT_PREFIX)
+            id_end = msg.find(_DISCONNECT_SUFFIX, id_start)
+            if id_end < 0:
+                return
+            raw_id = msg[id_start:id_end]
+            code = self._serial_code(raw_id)
+            if code < 0:
+                return
+            self._disconnect_ts.append(ts)
+            self._disconnect_serial.append(code)
+
+    def feed(self, fileobj, include_partial=False):
+        """
+        Processa todas as linhas completas de `fileobj` (aberto em modo binário)
+        a partir da posição atual e devolve quantos bytes foram consumidos.
+        Uma última linha sem '\\n' (ainda sendo escrita pelo logger) não é
+        consumida, para ser lida inteira na próxima chamada (a menos que
+        `include_partial` seja verdadeiro, caso de arquivos já fechados).
+        """
+        feed_line = self.feed_line
+        consumed = 0
+        for line in fileobj:
+            if not include_partial and not line.endswith(b"\n"):
+                break
+            consumed += len(line)
+            feed_line(line)
+        return consumed
+
+    def result(self):
+        """Converte as colunas acumuladas em um ParsedLog e zera os acumuladores."""
+        columns = {
+            "power_ts": np.frombuffer(self._power_ts, dtype=np.int64).copy(),
+            "power_serial": np.frombuffer(self._power_serial, dtype=np.int32).copy(),
+            "power_W": np.frombuffer(self._power_W, dtype=np.float32).copy(),
+            "status_ts": np.frombuffer(self._status_ts, dtype=np.int64).copy(),
+            "status_serial": np.frombuffer(self._status_serial, dtype=np.int32).copy(),
+            "status_code": np.frombuffer(self._status_code, dtype=np.int32).copy(),
+            "control_ts": np.frombuffer(self._control_ts, dtype=np.int64).copy(),
+            "site_ts": np.frombuffer(self._site_ts, dtype=np.int64).copy(),
+            "site_W": np.frombuffer(self._site_W, dtype=np.float32).copy(),
+            "disconnect_ts": np.frombuffer(self._disconnect_ts, dtype=np.int64).copy(),
+            "disconnect_serial": np.frombuffer(self._disconnect_serial, dtype=np.int32).copy(),
+            "line_ts": np.frombuffer(self._line_ts, dtype=np.int64).copy(),
+            "min_ts": self._min_ts,
+            "max_ts": self._max_ts,
+        }
+        self._reset_columns()
+        return ParsedLog(tuple(self.serials), tuple(self.statuses), columns)
+
+
+def _quoted_value(msg, pos):
+    # Lê `\s*:\s*"<valor>"` a partir de `pos` (equivalente ao regex antigo)
+    n = len(msg)
+    while pos < n and msg[pos] in b" \t":
+        pos += 1
+    if pos >= n or msg[pos] != 58:  # ':'
+        return None
+    pos += 1
+    while pos < n and msg[pos] in b" \t":
+        pos += 1
+    if pos >= n or msg[pos] != 34:  # '"'
+        return None
+    end = msg.find(b'"', pos + 1)
+    if end < 0:
+        return None
+    value = msg[pos + 1:end]
+    return value if value.isalpha() else None
+
+
+def ingest_log_file(log_file):
+    """Lê o arquivo inteiro em uma passada e devolve um ParsedLog."""
+    ingestor = LogIngestor()
+    with open(log_file, "rb") as f:
+        ingestor.feed(f, include_partial=True)
+    return ingestor.result()
+
+
+# --- Leitura incremental de logs que crescem (checkpoint de offset/inode) ---
+def has_appended(path, offset, inode):
+    """Verdadeiro se o arquivo cresceu ou foi rotacionado desde o checkpoint."""
+    st = os.stat(path)
+    return st.st_ino != inode or st.st_size != offset
+
+
+def feed_appended(ingestor, path, offset=0, inode=None):
+    """
+    Alimenta `ingestor` com as linhas acrescentadas a `path` desde o
+    checkpoint (offset, inode) e devolve o novo checkpoint (offset, inode,
+    tamanho). Se o arquivo foi rotacionado, o final ainda não lido do
+    arquivo antigo é consumido antes de recomeçar do byte 0.
+    """
+    st = os.stat(path)
+    if inode is not None and (st.st_ino != inode or st.st_size < offset):
+        rotated = _find_rotated(path, inode)
+        if rotated is not None:
+            # O arquivo rotacionado não cresce mais: lê até o último byte
+            with open(rotated, "rb") as f:
+                f.seek(offset)
+                ingestor.feed(f, include_partial=True)
+        offset = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        offset += ingestor.feed(f)
+    return offset, st.st_ino, st.st_size
+
+
+def _find_rotated(path, inode):
+    # Procura no mesmo diretório o arquivo que ainda tem o inode antigo
+    directory = os.path.dirname(path) or "."
+    base = os.path.basename(path)
+    try:
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.name != base and item.name.startswith(base.split(".")[0]) and item.is_file():
+                    if item.inode() == inode:
+                        return item.path
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,184 @@
+#----------------------------------------------------------
+# Buffer de mensagens OCPP por carregador e por direção.
+#
+# Cada carregador tem dois buffers independentes:
+#   to_csms    -> frames do carregador aguardando a conexão com o CSMS
+#   to_charger -> frames do CSMS aguardando o carregador reconectar
+#
+# Cada buffer é uma fila FIFO com:
+#   - uma fila de prioridade (RemoteStopTransaction), entregue antes das
+#     demais, com inserção O(1);
+#   - no máximo `memory_cap` frames em memória; o excedente vai para
+#     segmentos em disco (um frame JSON por linha) e volta para a memória,
+#     um segmento por vez, conforme a fila é consumida.
+#
+# Quem esvazia o buffer é a escritora da conexão (send_queue.LinkWriter):
+# `take` mantém o frame "em voo" até o send retornar (`ack`) e `nack` o
+# devolve à frente da sua fila (a de prioridade, se veio dela) se o envio
+# falhar. `prepend` devolve à frente os frames ao vivo que a escritora
+# ainda não tinha enviado (mais antigos que os que transbordaram).
+#
+# Segmentos deixados no disco por uma execução anterior voltam para a fila
+# como estão, com os ids de mensagem originais. Num to_csms, as CALLs do
+# carregador (StopTransaction, MeterValues...) chegam ao CSMS depois do
+# reinício, e a resposta do CSMS vai para um carregador que já não espera
+# aquele id e a ignora. As respostas do carregador (CallResult/CallError) a
+# pedidos da conexão anterior também são reenviadas, e o CSMS as ignora.
+# Nada disso é descartado, para não perder eventos de transação.
+#----------------------------------------------------------
+import json
+import logging
+import os
+import re
+from collections import deque
+#----------------------------------------------------------
+
+DIRECTION_TO_CSMS = "to_csms"
+DIRECTION_TO_CHARGER = "to_charger"
+
+
+def _safe_name(text):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", text)
+
+
+class MessageBuffer:
+    """FIFO de frames com prioridade e transbordo para disco. Use só no loop asyncio."""
+
+    def __init__(self, charge_point_id, direction, spill_dir, memory_cap=1000, segment_messages=1000):
+        self.charge_point_id = charge_point_id
+        self.direction = direction
+        self.spill_dir = spill_dir
+        self.memory_cap = memory_cap
+        self.segment_messages = segment_messages
+        self._priority = deque()
+        self._memory = deque()
+        self._inflight = deque()   # (frame, prioritário) retirados por take(), aguardando ack()/nack()
+        self._prefix = f"{_safe_name(charge_point_id)}_{direction}_"
+        self._segments = deque()   # [número, quantidade de frames], do mais antigo ao mais novo
+        self._write_file = None
+        self._disk_count = 0
+        self.spilled = 0           # frames que já passaram pelo disco
+        self.last_drain_s = None   # duração do último esvaziamento completo (LinkWriter)
+        self._resume_segments()
+
+    # --- Segmentos em disco ---
+    def _segment_path(self, seq):
+        return os.path.join(self.spill_dir, f"{self._prefix}{seq:06d}.seg")
+
+    def _resume_segments(self):
+        # Segmentos deixados por uma execução anterior voltam para a fila
+        if not os.path.isdir(self.spill_dir):
+            return
+        found = []
+        for name in os.listdir(self.spill_dir):
+            if name.startswith(self._prefix) and name.endswith(".seg"):
+                try:
+                    found.append(int(name[len(self._prefix):-4]))
+                except ValueError:
+                    continue
+        for seq in sorted(found):
+            with open(self._segment_path(seq), "r", encoding="utf-8") as f:
+                count = sum(1 for line in f if line.endswith("\n"))
+            self._segments.append([seq, count])
+            self._disk_count += count
+        if found:
+            logging.info(f"[BUFFER {self.charge_point_id}] {self._disk_count} mensagens '{self.direction}' recuperadas do disco (reenviadas com os ids originais).")
+
+    def _spill(self, message):
+        if self._write_file is None or self._segments[-1][1] >= self.segment_messages:
+            self._close_write_file()
+            seq = self._segments[-1][0] + 1 if self._segments else 1
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._write_file = open(self._segment_path(seq), "a", encoding="utf-8")
+            self._segments.append([seq, 0])
+        self._write_file.write(json.dumps(message) + "\n")
+        self._write_file.flush()
+        self._segments[-1][1] += 1
+        self._disk_count += 1
+        self.spilled += 1
+
+    def _close_write_file(self):
+        if self._write_file is not None:
+            self._write_file.close()
+            self._write_file = None
+
+    def _load_segment(self):
+        # Traz o segmento mais antigo de volta para a memória e o apaga do disco
+        seq, count = self._segments.popleft()
+        if not self._segments:
+            self._close_write_file()
+        path = self._segment_path(seq)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    self._memory.append(json.loads(line))
+        os.remove(path)
+        self._disk_count -= count
+
+    # --- Fila ---
+    def append(self, message):
+        # Com frames no disco, os novos vão para o fim do disco para manter a ordem
+        if self._segments or len(self._memory) >= self.memory_cap:
+            self._spill(message)
+        else:
+            self._memory.append(message)
+
+    def append_priority(self, message):
+        self._priority.append(message)
+
+    def prepend(self, messages):
+        """Coloca `messages` à frente da fila normal, na ordem dada (a memória pode passar do limite)."""
+        self._memory.extendleft(reversed(messages))
+
+    def _pop(self):
+        if self._priority:
+            return self._priority.popleft(), True
+        if not self._memory and self._segments:
+            self._load_segment()
+        if self._memory:
+            return self._memory.popleft(), False
+        return None, False
+
+    def popleft(self):
+        """Retira o próximo frame (prioritários primeiro) ou None se vazio."""
+        return self._pop()[0]
+
+    def take(self):
+        """Como popleft, mas o frame fica em voo até ack() (enviado) ou nack() (devolvido)."""
+        message, priority = self._pop()
+        if message is not None:
+            self._inflight.append((message, priority))
+        return message
+
+    def ack(self):
+        self._inflight.popleft()
+
+    def nack(self):
+        # Frames em voo voltam à frente da sua fila, na ordem original
+        for message, priority in reversed(self._inflight):
+            (self._priority if priority else self._memory).appendleft(message)
+        self._inflight.clear()
+
+    def __len__(self):
+        return len(self._priority) + len(self._memory) + self._disk_count + len(self._inflight)
+
+    def occupancy(self):
+        return {
+            "priority": len(self._priority),
+            "memory": len(self._memory),
+            "disk": self._disk_count,
+            "disk_segments": len(self._segments),
+            "spilled_total": self.spilled,
+            "last_drain_s": self.last_drain_s,
+        }
+
+
+class ChargePointBuffers:
+    """Par de buffers (to_csms / to_charger) de um carregador."""
+
+    def __init__(self, charge_point_id, spill_dir, memory_cap=1000, segment_messages=1000):
+        self.to_csms = MessageBuffer(charge_point_id, DIRECTION_TO_CSMS, spill_dir, memory_cap, segment_messages)
+        self.to_charger = MessageBuffer(charge_point_id, DIRECTION_TO_CHARGER, spill_dir, memory_cap, segment_messages)
+
+    def occupancy(self):
+        return {DIRECTION_TO_CSMS: self.to_csms.occupancy(), DIRECTION_TO_CHARGER: self.to_charger.occupancy()}
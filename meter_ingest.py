@@ -0,0 +1,130 @@
+#----------------------------------------------------------
+# Escrita dos pacotes do medidor em JSONL diário, fora do loop asyncio.
+#
+# O handler HTTP apenas enfileira (pacote, horário); uma thread mantém o
+# arquivo logs/medidor/medidor_AAAA-MM-DD.jsonl aberto, troca de arquivo na
+# virada do dia, serializa os pacotes e faz flush em lotes.
+#
+# `meter_fields` valida os campos numéricos de um pacote de uma vez, antes
+# de o handler mudar qualquer estado; um campo inválido é separado dos
+# demais (uma fase inválida não descarta a potência total).
+#----------------------------------------------------------
+import json
+import logging
+import math
+import os
+import queue
+import threading
+#----------------------------------------------------------
+
+_STOP = object()
+METER_FIELDS = ("pt", "pa", "pb", "pc")   # potência total e por fase (W)
+
+
+def _meter_float(value):
+    if isinstance(value, bool):
+        raise ValueError(repr(value))
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(repr(value)) from None
+    if not math.isfinite(number):
+        raise ValueError(repr(value))
+    return number
+
+
+def meter_fields(packet, keys=METER_FIELDS):
+    """
+    ({campo: float ou None}, {campo: valor recebido}) dos campos `keys` do
+    pacote: None se ausente ou inválido (não é um número finito); os
+    inválidos também vão, com o valor recebido, para o segundo dict.
+    """
+    values, invalid = {}, {}
+    for key in keys:
+        values[key] = None
+        if packet.get(key) is None:
+            continue
+        try:
+            values[key] = _meter_float(packet[key])
+        except ValueError:
+            invalid[key] = packet[key]
+    return values, invalid
+
+
+class DailyJsonlWriter(threading.Thread):
+
+    def __init__(self, directory, prefix="medidor", maxsize=100000, batch_size=500, flush_interval=0.5):
+        super().__init__(name=f"{prefix}-jsonl-writer", daemon=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.written = 0
+        self._file = None
+        self._file_day = None
+
+    def write(self, record, when):
+        """Enfileira `record` (dict) para o arquivo do dia de `when`. Nunca bloqueia."""
+        try:
+            self.queue.put_nowait((record, when))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(item is _STOP for item in batch):
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            self._write_batch(batch)
+        self._close()
+
+    def _write_batch(self, batch):
+        try:
+            for record, when in batch:
+                day = when.date()
+                if day != self._file_day:
+                    self._open(day)
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if self._file is not None:
+                self._file.flush()
+            self.written += len(batch)
+        except Exception as e:
+            logging.error(f"[METER_SERVER] Falha ao salvar pacotes no JSONL: {e}")
+
+    def _open(self, day):
+        self._close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.prefix}_{day.isoformat()}.jsonl")
+        self._file = open(path, "a", encoding="utf-8")
+        self._file_day = day
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+        self._file = None
+        self._file_day = None
+
+    def stop(self, timeout=5.0):
+        """Grava o que estiver na fila, fecha o arquivo e encerra a thread."""
+        if not self.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
@@ -0,0 +1,139 @@
+#----------------------------------------------------------
+# Agenda dos TriggerMessage(MeterValues) para os carregadores em carga.
+#
+# Cada carregador tem o seu próprio intervalo e o seu próprio prazo, com
+# jitter, então os pedidos se espalham ao longo do intervalo em vez de
+# saírem todos no mesmo instante. Os envios são concorrentes (cada um em
+# sua task, com timeout) e o loop nunca espera um carregador.
+#
+# O intervalo se adapta a cada leitura de potência (`observe`):
+#   - variação >= `volatile_delta_W` desde a última leitura: intervalo cai
+#     pela metade (até `min_interval_s`);
+#   - carga estável: intervalo cresce 50% (até `max_interval_s`);
+#   - site perto do limite (`pressure()` verdadeiro): todos usam no máximo
+#     `pressure_interval_s`.
+# Uma leitura que chega sozinha (MeterValues periódico do carregador)
+# também conta: o próximo pedido é adiado, economizando uma ida e volta.
+#----------------------------------------------------------
+import asyncio
+import heapq
+import logging
+import random
+import time
+#----------------------------------------------------------
+
+
+class MeterPollScheduler:
+    """Use só no loop asyncio. `trigger(cp_id)` é a corrotina que envia o TriggerMessage."""
+
+    def __init__(self, trigger, base_interval_s=60.0, min_interval_s=15.0, max_interval_s=300.0,
+                 pressure_interval_s=30.0, volatile_delta_W=500.0, jitter=0.1, send_timeout_s=10.0):
+        self.trigger = trigger
+        self.base_interval_s = base_interval_s
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max_interval_s
+        self.pressure_interval_s = pressure_interval_s
+        self.volatile_delta_W = volatile_delta_W
+        self.jitter = jitter
+        self.send_timeout_s = send_timeout_s
+        self._entries = {}   # cp_id -> [intervalo, prazo, última potência, pedido aguardando resposta]
+        self._heap = []      # (prazo, cp_id); entradas velhas são ignoradas
+        self._pressure = False
+        self._inflight = set()
+        # Métricas
+        self.triggers_sent = 0
+        self.postponed = 0       # pedidos adiados por leitura espontânea
+        self.send_failures = 0
+
+    def _interval(self, entry):
+        return min(entry[0], self.pressure_interval_s) if self._pressure else entry[0]
+
+    def _schedule(self, cp_id, entry, delay):
+        entry[1] = time.monotonic() + delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        heapq.heappush(self._heap, (entry[1], cp_id))
+
+    def observe(self, cp_id, power_W):
+        """Leitura de potência recebida (pedida ou não): adapta o intervalo e adia o próximo pedido."""
+        entry = self._entries.get(cp_id)
+        if entry is None:
+            return
+        if entry[2] is not None:
+            if abs(power_W - entry[2]) >= self.volatile_delta_W:
+                entry[0] = max(self.min_interval_s, entry[0] / 2.0)
+            else:
+                entry[0] = min(self.max_interval_s, entry[0] * 1.5)
+        entry[2] = power_W
+        if entry[3]:
+            entry[3] = False
+        else:
+            self.postponed += 1
+        self._schedule(cp_id, entry, self._interval(entry))
+
+    def _sync(self, cp_ids):
+        for cp_id in cp_ids:
+            if cp_id not in self._entries:
+                entry = self._entries[cp_id] = [self.base_interval_s, 0.0, None, False]
+                # Primeiro pedido em um ponto aleatório do intervalo: espalha a carga
+                entry[1] = time.monotonic() + random.uniform(0.0, self.base_interval_s)
+                heapq.heappush(self._heap, (entry[1], cp_id))
+        for cp_id in [c for c in self._entries if c not in cp_ids]:
+            del self._entries[cp_id]
+
+    def _set_pressure(self, pressure):
+        if pressure and not self._pressure:
+            # Antecipa os prazos longos para dentro do intervalo de pressão, espalhados
+            now = time.monotonic()
+            for cp_id, entry in self._entries.items():
+                if entry[1] > now + self.pressure_interval_s:
+                    entry[1] = now + random.uniform(0.0, self.pressure_interval_s)
+                    heapq.heappush(self._heap, (entry[1], cp_id))
+        self._pressure = pressure
+
+    async def _send(self, cp_id):
+        try:
+            await asyncio.wait_for(self.trigger(cp_id), timeout=self.send_timeout_s)
+            self.triggers_sent += 1
+        except Exception as e:
+            self.send_failures += 1
+            logging.warning(f"[METER_POLL {cp_id}] Falha ao pedir MeterValues: {e}")
+
+    def poll_due(self, cp_ids, pressure=False):
+        """Atualiza a lista de carregadores e dispara os pedidos vencidos. Retorna quantos."""
+        self._sync(set(cp_ids))
+        self._set_pressure(pressure)
+        now = time.monotonic()
+        count = 0
+        while self._heap and self._heap[0][0] <= now:
+            due, cp_id = heapq.heappop(self._heap)
+            entry = self._entries.get(cp_id)
+            if entry is None or entry[1] != due:
+                continue
+            task = asyncio.create_task(self._send(cp_id))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            # Sem resposta, o próximo pedido sai após o intervalo; a resposta reagenda
+            entry[3] = True
+            self._schedule(cp_id, entry, self._interval(entry))
+            count += 1
+        return count
+
+    async def run(self, targets, pressure, tick_s=1.0):
+        """`targets()` devolve os carregadores a consultar; `pressure()` se o site está perto do limite."""
+        while True:
+            try:
+                self.poll_due(targets(), pressure())
+            except Exception as e:
+                logging.error(f"[METER_POLL] Erro no agendador de MeterValues: {e}")
+            await asyncio.sleep(tick_s)
+
+    def stats(self):
+        intervals = [self._interval(e) for e in self._entries.values()]
+        return {
+            "chargers": len(intervals),
+            "triggers_sent": self.triggers_sent,
+            "postponed": self.postponed,
+            "send_failures": self.send_failures,
+            "in_flight": len(self._inflight),
+            "mean_interval_s": round(sum(intervals) / len(intervals), 1) if intervals else None,
+            "pressure": self._pressure,
+        }
@@ -0,0 +1,87 @@
+#----------------------------------------------------------
+# Leitura dos MeterValues (OCPP 1.6) enviados pelos carregadores.
+#
+# Um frame pode trazer vários meterValue (um por instante de amostragem),
+# cada um com vários sampledValue (medida, fase, unidade). Aqui cada
+# meterValue vira uma amostra de potência com o seu próprio timestamp:
+#   - Power.Active.Import sem fase é a potência total;
+#   - sem o total, soma-se a potência das fases (L1, L2, L3 ou L1-N...);
+#   - unidades W e kW (sem unidade: W);
+#   - Current.Import por fase é guardado junto (A).
+# Amostras de outras medidas (energia, tensão...) são ignoradas.
+#----------------------------------------------------------
+from collections import namedtuple
+from datetime import datetime
+#----------------------------------------------------------
+
+MEASURAND_POWER = "Power.Active.Import"
+MEASURAND_CURRENT = "Current.Import"
+# Medidas pedidas ao carregador na conexão (MeterValuesSampledData)
+SAMPLED_MEASURANDS = (MEASURAND_POWER, MEASURAND_CURRENT)
+
+_POWER_FACTOR = {"W": 1.0, "kW": 1000.0}
+
+# timestamp: datetime local (sem fuso); phases_W / currents_A: {"L1": ..., ...}
+PowerSample = namedtuple("PowerSample", ["timestamp", "power_W", "phases_W", "currents_A"])
+
+
+def parse_timestamp(text, now=None):
+    """ISO 8601 do OCPP ('...Z' ou com fuso) -> datetime local sem fuso; inválido ou no futuro -> now."""
+    now = now or datetime.now()
+    if not text:
+        return now
+    try:
+        ts = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return now
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    # Relógio do carregador adiantado não pode jogar amostras para minutos futuros
+    return min(ts, now)
+
+
+def _phase(phase):
+    # "L1-N" / "L1-L2" -> "L1"; "N" não conta como fase de carga
+    if not phase:
+        return None
+    phase = phase.split("-")[0]
+    return phase if phase in ("L1", "L2", "L3") else ""
+
+
+def power_samples(payload, now=None):
+    """Amostras de potência de um MeterValues.req, em ordem de timestamp."""
+    now = now or datetime.now()
+    samples = []
+    for meter_value in payload.get("meterValue") or []:
+        total = None
+        phases = {}
+        currents = {}
+        for sv in meter_value.get("sampledValue") or []:
+            measurand = sv.get("measurand")
+            if measurand not in (MEASURAND_POWER, MEASURAND_CURRENT):
+                continue
+            try:
+                value = float(sv.get("value"))
+            except (TypeError, ValueError):
+                continue
+            phase = _phase(sv.get("phase"))
+            if phase == "":
+                continue
+            if measurand == MEASURAND_CURRENT:
+                if phase is not None:
+                    currents[phase] = value
+                continue
+            factor = _POWER_FACTOR.get(sv.get("unit") or "W")
+            if factor is None:
+                continue
+            if phase is None:
+                total = value * factor
+            else:
+                phases[phase] = value * factor
+        if total is None and phases:
+            total = sum(phases.values())
+        if total is None:
+            continue
+        samples.append(PowerSample(parse_timestamp(meter_value.get("timestamp"), now), total, phases, currents))
+    samples.sort(key=lambda s: s.timestamp)
+    return samples
@@ -0,0 +1,97 @@
+#----------------------------------------------------------
+# Envelope de frame OCPP-J decodificado exatamente uma vez.
+#
+# Um frame OCPP é [2, id, ação, payload], [3, id, payload] ou
+# [4, id, código, descrição, detalhes]. `OcppFrame` decodifica o JSON
+# inteiro uma única vez, ao ser criado, e tira tipo, id e ação da lista;
+# quem precisa do frame (estado, correlação, prioridade, uplink)
+# reaproveita o mesmo resultado.
+#
+# Não há classificação "barata" nem decodificação sob demanda: todo frame
+# passa pelo json.loads, inclusive os que o gateway só encaminha
+# (Heartbeat, DataTransfer, respostas ao CSMS). O texto original vai
+# embutido no lote do uplink, então precisa ser JSON válido, e o json.loads
+# (em C) é a validação mais barata disponível: ler só o envelope com regex
+# não valida o resto do frame, e validar a gramática com regex custa de 4
+# a 6 vezes mais que decodificar.
+#
+# No uplink, um frame que é JSON válido vai como o texto original
+# (RawJson), sem serializar a lista de novo; um frame que não é JSON vai
+# como string.
+#----------------------------------------------------------
+import json
+#----------------------------------------------------------
+
+CALL = 2
+CALL_RESULT = 3
+CALL_ERROR = 4
+
+
+class RawJson(str):
+    """Texto JSON já serializado e validado, embutido como está por `encode_packet`."""
+    __slots__ = ()
+
+
+def encode_packet(packet):
+    """json.dumps de um pacote do uplink, copiando `data` como texto se for RawJson."""
+    data = packet.get("data") if isinstance(packet, dict) else None
+    if not isinstance(data, RawJson):
+        return json.dumps(packet)
+    rest = {k: v for k, v in packet.items() if k != "data"}
+    head = json.dumps(rest)
+    if rest:
+        return head[:-1] + ', "data": ' + data + "}"
+    return '{"data": ' + data + "}"
+
+
+class OcppFrame:
+    __slots__ = ("raw", "msg_type_id", "msg_id", "action", "message", "is_json")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.msg_type_id = None
+        self.msg_id = None
+        self.action = None
+        self.message = None
+        try:
+            self.message = json.loads(raw)
+        except ValueError:   # inclui JSONDecodeError e UnicodeDecodeError
+            self.is_json = False
+            return
+        self.is_json = True
+        message = self.message
+        if (isinstance(message, list) and len(message) >= 3 and type(message[0]) is int
+                and message[0] in (CALL, CALL_RESULT, CALL_ERROR) and isinstance(message[1], str)):
+            if message[0] == CALL:
+                if not isinstance(message[2], str):
+                    return
+                self.action = message[2]
+            self.msg_type_id = message[0]
+            self.msg_id = message[1]
+
+    @property
+    def valid(self):
+        """True se é JSON e o envelope (tipo, id e, numa CALL, a ação) foi reconhecido."""
+        return self.msg_type_id is not None
+
+    @property
+    def payload(self):
+        message = self.message
+        if self.msg_type_id == CALL:
+            return message[3] if len(message) > 3 else {}
+        if self.msg_type_id == CALL_RESULT:
+            return message[2]
+        return message[4] if len(message) > 4 else {}
+
+    def _text(self):
+        return self.raw.decode("utf-8", "replace") if isinstance(self.raw, bytes) else self.raw
+
+    def uplink_data(self):
+        """
+        Conteúdo de `data` no pacote bruto do uplink: o texto original como
+        RawJson se for JSON válido (já conferido pelo json.loads), senão o
+        texto como string, como sempre foi.
+        """
+        if self.is_json:
+            return RawJson(self._text())
+        return self._text()
@@ -0,0 +1,159 @@
+#----------------------------------------------------------
+# Tabela de correlação das chamadas OCPP originadas pelo gateway.
+#
+# Cada TriggerMessage / SetChargingProfile enviado a um carregador é
+# registrado com a chave (carregador, message id) e um prazo (TTL). A
+# resposta (CallResult ou CallError) resolve o future da chamada e o tempo
+# de ida e volta entra no histograma do par (carregador, ação). Chamadas
+# sem resposta expiram por um heap de prazos: o future recebe TimeoutError
+# e a entrada sai da tabela, então a memória fica limitada.
+#----------------------------------------------------------
+import asyncio
+import heapq
+import logging
+import time
+#----------------------------------------------------------
+
+# Limites superiores (ms) das faixas do histograma de RTT; a última faixa é "acima de 30 s"
+RTT_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class CallError(Exception):
+    """O carregador respondeu com CallError."""
+
+    def __init__(self, error_code, description=""):
+        super().__init__(f"{error_code}: {description}" if description else error_code)
+        self.error_code = error_code
+
+
+class RttHistogram:
+
+    __slots__ = ("counts", "total", "max_ms", "timeouts")
+
+    def __init__(self):
+        self.counts = [0] * (len(RTT_BUCKETS_MS) + 1)
+        self.total = 0
+        self.max_ms = 0.0
+        self.timeouts = 0
+
+    def add(self, rtt_ms):
+        i = 0
+        while i < len(RTT_BUCKETS_MS) and rtt_ms > RTT_BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += 1
+        if rtt_ms > self.max_ms:
+            self.max_ms = rtt_ms
+
+    def percentile(self, q):
+        """Limite superior (ms) da faixa que contém o quantil q, sem passar do máximo (None sem amostras)."""
+        if not self.total:
+            return None
+        target = q * self.total
+        acc = 0
+        for i, count in enumerate(self.counts):
+            acc += count
+            if acc >= target:
+                return min(RTT_BUCKETS_MS[i], round(self.max_ms, 1)) if i < len(RTT_BUCKETS_MS) else round(self.max_ms, 1)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max_ms, 1),
+            "timeouts": self.timeouts,
+        }
+
+
+class PendingCalls:
+    """Use só no loop asyncio."""
+
+    def __init__(self, ttl_s=30.0):
+        self.ttl_s = ttl_s
+        self._pending = {}   # (cp_id, msg_id) -> [ação, enviado_em, prazo, future]
+        self._deadlines = []  # heap de (prazo, cp_id, msg_id)
+        self.histograms = {}  # (cp_id, ação) -> RttHistogram
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def _histogram(self, cp_id, action):
+        hist = self.histograms.get((cp_id, action))
+        if hist is None:
+            hist = self.histograms[(cp_id, action)] = RttHistogram()
+        return hist
+
+    def register(self, cp_id, msg_id, action, ttl_s=None):
+        """Registra uma chamada prestes a ser enviada. Devolve o future da resposta."""
+        now = time.monotonic()
+        deadline = now + (ttl_s if ttl_s is not None else self.ttl_s)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(cp_id, msg_id)] = [action, now, deadline, future]
+        heapq.heappush(self._deadlines, (deadline, cp_id, msg_id))
+        return future
+
+    def discard(self, cp_id, msg_id):
+        """Remove uma chamada que não chegou a ser enviada."""
+        entry = self._pending.pop((cp_id, msg_id), None)
+        if entry is not None and not entry[3].done():
+            entry[3].cancel()
+
+    def resolve(self, cp_id, msg_id, payload=None, error=None):
+        """
+        Casa uma resposta com a chamada pendente. Retorna (ação, rtt_ms) ou
+        None se o id não era do gateway (ou já expirou).
+        """
+        entry = self._pending.pop((cp_id, msg_id), None)
+        if entry is None:
+            return None
+        action, sent_at, _, future = entry
+        rtt_ms = (time.monotonic() - sent_at) * 1000.0
+        self._histogram(cp_id, action).add(rtt_ms)
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+                future.exception()   # idem expire(): aguardar o future é opcional
+            else:
+                future.set_result(payload)
+        return action, rtt_ms
+
+    def expire(self, now=None):
+        """Remove as chamadas vencidas; os futures recebem TimeoutError. Retorna quantas."""
+        now = time.monotonic() if now is None else now
+        count = 0
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, cp_id, msg_id = heapq.heappop(self._deadlines)
+            entry = self._pending.get((cp_id, msg_id))
+            if entry is None or entry[2] != deadline:
+                continue   # já respondida (ou re-registrada)
+            del self._pending[(cp_id, msg_id)]
+            action, _, _, future = entry
+            self._histogram(cp_id, action).timeouts += 1
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError(f"{action} {msg_id} sem resposta de '{cp_id}'"))
+                # Ninguém é obrigado a aguardar o future; evita o aviso de exceção não lida
+                future.exception()
+            logging.warning(f"[PENDING {cp_id}] {action} '{msg_id}' expirou sem resposta.")
+            count += 1
+        self.expired += count
+        return count
+
+    def drop_charger(self, cp_id):
+        """Cancela as chamadas pendentes de um carregador que desconectou."""
+        for key in [k for k in self._pending if k[0] == cp_id]:
+            self.discard(*key)
+
+    def summary(self, action):
+        """RTT por carregador para uma ação: {cp_id: {count, p50_ms, p95_ms, max_ms, timeouts}}."""
+        return {cp_id: hist.summary() for (cp_id, act), hist in self.histograms.items() if act == action}
+
+    async def run(self, interval_s=1.0):
+        while True:
+            await asyncio.sleep(interval_s)
+            self.expire()
@@ -0,0 +1,154 @@
+#----------------------------------------------------------
+# Reamostragem "sem rampas" minuto a minuto, vetorizada.
+#
+# Regra (a mesma do dashboard e do script de análise): em cada minuto t,
+# um carregador está carregando se o último status até t é 'Charging' ou se
+# a última amostra de potência até t tem no máximo TOLERANCIA_MINUTOS de
+# idade. Carregando -> última potência; caso contrário -> 0.
+#
+# Em vez de varrer todos os eventos para cada minuto, cada carregador faz um
+# "as-of join" (np.searchsorted) dos minutos contra seus eventos ordenados.
+#----------------------------------------------------------
+import numpy as np
+import pandas as pd
+#----------------------------------------------------------
+
+TOLERANCIA_MINUTOS = 2
+
+
+def minute_grid(*timestamp_series):
+    """Todos os minutos entre o primeiro e o último timestamp das séries dadas."""
+    series = [s for s in timestamp_series if s is not None and len(s)]
+    if not series:
+        return pd.DatetimeIndex([], dtype="datetime64[ns]")
+    min_time = min(s.min() for s in series)
+    max_time = max(s.max() for s in series)
+    return pd.date_range(start=min_time.floor('min'), end=max_time.floor('min'), freq='min')
+
+
+def _as_int64_ns(values):
+    return np.asarray(values, dtype="datetime64[ns]").astype(np.int64)
+
+
+def _group_positions(serial_column, serials):
+    # Posições das linhas de cada serial, agrupadas de uma vez (sem filtrar o DF por serial)
+    if serial_column is None or not len(serial_column):
+        return {}
+    codes, uniques = pd.factorize(np.asarray(serial_column, dtype=object))
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    wanted = set(serials)
+    return {
+        sn: order[bounds[i]:bounds[i + 1]]
+        for i, sn in enumerate(uniques) if sn in wanted
+    }
+
+
+def _last_event(event_ts, rows, t):
+    """
+    "As-of join": para cada instante de `t`, a linha (índice em `event_ts`)
+    do último evento de `rows` até ele, ou -1 se não houver. Ordenação
+    estável: em empates vale o último evento na ordem do log.
+    """
+    last = np.full(len(t), -1, dtype=np.intp)
+    if rows is None or not len(rows):
+        return last
+    order = rows[np.argsort(event_ts[rows], kind="stable")]
+    idx = np.searchsorted(event_ts[order], t, side="right") - 1
+    has = idx >= 0
+    last[has] = order[idx[has]]
+    return last
+
+
+def _prepare(df_power, df_status, serials):
+    # Colunas int64/float e posições por serial, uma vez para todos os seriais
+    power = status = (None, None, {})
+    if df_power is not None and not df_power.empty:
+        power = (_as_int64_ns(df_power['timestamp'].values), df_power['potencia_W'].to_numpy(dtype=np.float64),
+                 _group_positions(df_power['serial_number'], serials))
+    if df_status is not None and not df_status.empty:
+        status = (_as_int64_ns(df_status['timestamp'].values),
+                  (df_status['status'].astype(object) == 'Charging').to_numpy(),
+                  _group_positions(df_status['serial_number'], serials))
+    return power, status
+
+
+def _serial_no_ramps(sn, t, power, status, tolerance_ns, forget_after_idle=False):
+    """Potência de `sn` em cada instante de `t` pela regra "sem rampas"."""
+    power_ts, power_val, power_rows = power
+    status_ts, status_charging, status_rows = status
+    values = np.zeros(len(t), dtype=np.float64)
+    charging = np.zeros(len(t), dtype=bool)
+    last = _last_event(status_ts, status_rows.get(sn), t)
+    has = last >= 0
+    charging[has] = status_charging[last[has]]
+    last = _last_event(power_ts, power_rows.get(sn), t)
+    has = last >= 0
+    if not has.any():
+        return values
+    last_ts = np.where(has, power_ts[last], 0)
+    charging |= has & ((t - last_ts) <= tolerance_ns)
+    on = has & charging
+    if forget_after_idle:
+        # Instante da amostra no eixo `t` x último instante sem carga antes dele
+        sample_pos = np.searchsorted(t, last_ts)
+        last_idle = np.maximum.accumulate(np.where(charging, -1, np.arange(len(t))))
+        on &= last_idle < sample_pos
+    values[on] = power_val[last[on]]
+    return values
+
+
+def resample_no_ramps(df_power, df_status, serials, minutes=None, tolerance_minutes=TOLERANCIA_MINUTOS):
+    """
+    Retorna um DataFrame com a coluna 'timestamp' (um por minuto), uma coluna
+    por serial em `serials` (potência em W) e 'total_power'.
+
+    `df_power` precisa das colunas timestamp/serial_number/potencia_W e
+    `df_status` de timestamp/serial_number/status. Se `minutes` não for
+    dado, usa todos os minutos cobertos pelos eventos.
+    """
+    if minutes is None:
+        minutes = minute_grid(
+            df_power['timestamp'] if df_power is not None and not df_power.empty else None,
+            df_status['timestamp'] if df_status is not None and not df_status.empty else None,
+        )
+    minutes = pd.DatetimeIndex(minutes)
+    t = _as_int64_ns(minutes.values)
+    tolerance_ns = np.int64(tolerance_minutes * 60 * 1_000_000_000)
+    power, status = _prepare(df_power, df_status, serials)
+
+    result = {"timestamp": minutes}
+    total = np.zeros(len(t), dtype=np.float64)
+    for sn in serials:
+        result[sn] = _serial_no_ramps(sn, t, power, status, tolerance_ns)
+        total += result[sn]
+    result["total_power"] = total
+    return pd.DataFrame(result)
+
+
+def event_means_no_ramps(df_power, df_status, serials, times, tolerance_minutes=TOLERANCIA_MINUTOS):
+    """
+    Mesma regra, avaliada em cada instante de `times` (os timestamps de todas
+    as linhas do log no período, ParsedLog.line_times) e depois agregada pela
+    média de cada minuto, como o script de análise sempre fez. Diferenças em
+    relação a resample_no_ramps:
+      - `df_power` deve ter só as amostras do período (a potência não vem
+        do dia anterior); em timestamps repetidos vale a primeira amostra;
+      - depois de um instante sem carga, a potência lembrada é esquecida
+        até a próxima amostra, mesmo que o status volte a 'Charging'.
+    """
+    t = np.unique(_as_int64_ns(pd.DatetimeIndex(times).values))
+    tolerance_ns = np.int64(tolerance_minutes * 60 * 1_000_000_000)
+    if df_power is not None and not df_power.empty:
+        df_power = df_power.drop_duplicates(['serial_number', 'timestamp'], keep='first')
+    power, status = _prepare(df_power, df_status, serials)
+
+    result = {"timestamp": pd.DatetimeIndex(t.astype("datetime64[ns]"))}
+    total = np.zeros(len(t), dtype=np.float64)
+    for sn in serials:
+        result[sn] = _serial_no_ramps(sn, t, power, status, tolerance_ns, forget_after_idle=True)
+        total += result[sn]
+    result["total_power"] = total
+    df = pd.DataFrame(result)
+    df['timestamp'] = df['timestamp'].dt.floor('min')
+    return df.groupby('timestamp').mean().reset_index()
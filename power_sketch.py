@@ -0,0 +1,153 @@
+#----------------------------------------------------------
+# Potência máxima aprendida por percentil em janela deslizante.
+#
+# Cada carregador tem um sketch de quantis (bins logarítmicos com erro
+# relativo de `relative_accuracy`, como o DDSketch) dividido em
+# `sub_windows` janelas de `window_s / sub_windows` segundos: a janela mais
+# velha é descartada inteira quando passa de `window_s`. Memória limitada:
+# no máximo sub_windows x bins contadores por carregador (só os bins usados).
+#
+# A potência aprendida é o percentil `quantile` das leituras em carga, com
+# `headroom` de folga. Um pico isolado não muda mais o máximo para sempre;
+# enquanto houver menos de `min_samples` leituras vale a regra antiga (sobe
+# quando uma leitura passa 1% do máximo atual). Leituras em que o carregador
+# estava preso a um limite do gateway abaixo do máximo não entram: mostram o
+# limite, não o que o carro aceitaria.
+#
+# O estado dos sketches vai junto no learned_powers.json (chave "_sketches").
+#----------------------------------------------------------
+import math
+import time
+from collections import deque
+#----------------------------------------------------------
+
+
+class PowerSketch:
+
+    def __init__(self, relative_accuracy=0.02, window_s=7 * 86400.0, sub_windows=7, min_power_W=100.0):
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.sub_window_s = window_s / sub_windows
+        self.sub_windows = sub_windows
+        self.min_power_W = min_power_W
+        self._windows = deque()   # (índice da janela, {bin: contagem})
+        self._totals = {}         # soma das janelas vivas, por bin
+        self.count = 0
+
+    def _bin(self, power_W):
+        return int(math.ceil(math.log(max(power_W, self.min_power_W)) / self._log_gamma))
+
+    def _value(self, index):
+        # Ponto do bin com erro relativo máximo de relative_accuracy
+        return 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+    def _expire(self, current):
+        while self._windows and self._windows[0][0] <= current - self.sub_windows:
+            _, counts = self._windows.popleft()
+            for index, n in counts.items():
+                left = self._totals[index] - n
+                if left:
+                    self._totals[index] = left
+                else:
+                    del self._totals[index]
+                self.count -= n
+
+    def add(self, power_W, timestamp=None):
+        current = int((time.time() if timestamp is None else timestamp) // self.sub_window_s)
+        self._expire(current)
+        if not self._windows or self._windows[-1][0] < current:
+            self._windows.append((current, {}))
+        counts = self._windows[-1][1]
+        index = self._bin(power_W)
+        counts[index] = counts.get(index, 0) + 1
+        self._totals[index] = self._totals.get(index, 0) + 1
+        self.count += 1
+
+    def quantile(self, q, now=None):
+        """Percentil `q` (0..1) das leituras dentro da janela, ou None se não houver nenhuma."""
+        if now is not None:
+            self._expire(int(now // self.sub_window_s))
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._totals):
+            seen += self._totals[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self._totals))
+
+    def to_state(self):
+        # {janela: "bin:contagem bin:contagem ..."}, compacto no JSON indentado
+        return {str(window): " ".join(f"{index}:{n}" for index, n in sorted(counts.items()))
+                for window, counts in self._windows}
+
+    def load_state(self, state, now=None):
+        self._windows.clear()
+        self._totals.clear()
+        self.count = 0
+        for window, counts in sorted(state.items(), key=lambda item: int(item[0])):
+            counts = {int(index): int(n) for index, n in (pair.split(":") for pair in counts.split())}
+            self._windows.append((int(window), counts))
+            for index, n in counts.items():
+                self._totals[index] = self._totals.get(index, 0) + n
+                self.count += n
+        self._expire(int((time.time() if now is None else now) // self.sub_window_s))
+
+
+class LearnedPowerEstimator:
+    """Use só no loop asyncio. Um PowerSketch por carregador."""
+
+    def __init__(self, quantile=0.99, headroom=0.02, min_samples=60, saturation=0.95,
+                 relative_accuracy=0.02, window_s=7 * 86400.0, sub_windows=7):
+        self.quantile = quantile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.saturation = saturation
+        self._sketch_args = (relative_accuracy, window_s, sub_windows)
+        self.sketches = {}
+        self._dirty = set()
+        # Métricas
+        self.samples = 0
+        self.skipped_limited = 0
+
+    def _sketch(self, cp_id):
+        sketch = self.sketches.get(cp_id)
+        if sketch is None:
+            sketch = self.sketches[cp_id] = PowerSketch(*self._sketch_args)
+        return sketch
+
+    def observe(self, cp_id, power_W, learned_W, limit_W, timestamp=None):
+        """
+        Leitura em carga. Retorna a nova potência aprendida, ou None se não
+        mudou (mais de 1%).
+        """
+        # Carro no limite que o gateway impôs abaixo do máximo: leitura censurada
+        if power_W >= limit_W * self.saturation and limit_W < learned_W * 0.99:
+            self.skipped_limited += 1
+            return None
+        sketch = self._sketch(cp_id)
+        sketch.add(power_W, timestamp)
+        self.samples += 1
+        self._dirty.add(cp_id)
+        if sketch.count < self.min_samples:
+            return power_W if power_W > learned_W * 1.01 else None
+        estimate = sketch.quantile(self.quantile) * (1.0 + self.headroom)
+        return estimate if abs(estimate - learned_W) > learned_W * 0.01 else None
+
+    def load(self, states):
+        for cp_id, state in states.items():
+            try:
+                self._sketch(cp_id).load_state(state)
+            except (AttributeError, TypeError, ValueError):
+                self.sketches.pop(cp_id, None)
+
+    def take_dirty(self):
+        """{cp_id: estado} dos sketches alterados desde a última chamada (para o checkpoint)."""
+        states = {cp_id: self.sketches[cp_id].to_state() for cp_id in self._dirty}
+        self._dirty.clear()
+        return states
+
+    def stats(self):
+        return {"chargers": len(self.sketches), "samples": self.samples, "skipped_limited": self.skipped_limited,
+                "bins": sum(len(sketch._totals) for sketch in self.sketches.values())}
@@ -0,0 +1,134 @@
+#----------------------------------------------------------
+# Canal de comandos SetChargingProfile por carregador.
+#
+# O controle de demanda (e os handlers de status) só chamam
+# `set_limit(cp, limite)`, que não bloqueia. Cada carregador tem no máximo
+# um comando em voo; enquanto ele não é confirmado, novos limites
+# substituem o pendente (vale o último). Um limite igual ao já confirmado
+# pelo carregador (com a mesma tolerância de antes, 1%) não é reenviado.
+# Cada comando tem um prazo: envio travado ou resposta que não chega
+# liberam o canal e o limite confirmado passa a ser desconhecido.
+# `unconfirmed` guarda os carregadores cujo último comando falhou ou não
+# foi confirmado, para o controle reenviar mesmo sem mudança de limite.
+#----------------------------------------------------------
+import asyncio
+import logging
+#----------------------------------------------------------
+
+
+class _Channel:
+
+    __slots__ = ("pending", "inflight", "acked", "task")
+
+    def __init__(self):
+        self.pending = None   # próximo limite a enviar (o mais recente)
+        self.inflight = None  # limite enviado aguardando resposta
+        self.acked = None     # último limite confirmado pelo carregador
+        self.task = None
+
+
+class ProfileCommands:
+    """Use só no loop asyncio. `send(cp_id, limite)` deve devolver o future da resposta (ou None)."""
+
+    def __init__(self, send, deadline_s=10.0, tolerance=0.01):
+        self.send = send
+        self.deadline_s = deadline_s
+        self.tolerance = tolerance
+        self._channels = {}
+        self.unconfirmed = set()
+        # Contadores
+        self.issued = 0      # comandos enviados
+        self.coalesced = 0   # limites substituídos por um mais novo antes do envio
+        self.skipped = 0     # limites já confirmados pelo carregador
+        self.timed_out = 0   # sem envio ou sem resposta dentro do prazo
+        self.failed = 0      # falha no envio ou CallError
+
+    def _same(self, a, b):
+        return a is not None and b is not None and abs(a - b) <= b * self.tolerance
+
+    def set_limit(self, cp_id, limit_W):
+        """Agenda o limite para o carregador. Retorna True se algo novo foi agendado."""
+        channel = self._channels.get(cp_id)
+        if channel is None:
+            channel = self._channels[cp_id] = _Channel()
+        if channel.pending is not None:
+            if self._same(limit_W, channel.pending):
+                return False
+            channel.pending = limit_W
+            self.coalesced += 1
+            return True
+        if channel.inflight is not None:
+            if self._same(limit_W, channel.inflight):
+                return False
+        elif self._same(limit_W, channel.acked):
+            self.skipped += 1
+            return False
+        channel.pending = limit_W
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.create_task(self._run(cp_id, channel))
+        return True
+
+    async def _run(self, cp_id, channel):
+        while channel.pending is not None:
+            limit_W, channel.pending = channel.pending, None
+            if self._same(limit_W, channel.acked):
+                self.skipped += 1
+                continue
+            channel.inflight = limit_W
+            try:
+                await self._command(cp_id, channel, limit_W)
+            finally:
+                channel.inflight = None
+
+    async def _command(self, cp_id, channel, limit_W):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_s
+        try:
+            future = await asyncio.wait_for(self.send(cp_id, limit_W), timeout=self.deadline_s)
+            if future is None:
+                self.failed += 1
+                channel.acked = None
+                self.unconfirmed.add(cp_id)
+                return
+            self.issued += 1
+            # shield: no prazo o canal é liberado, mas a chamada continua na
+            # tabela de pendentes (a resposta atrasada ainda é consumida lá)
+            payload = await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - loop.time(), 0.0))
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            channel.acked = None
+            self.unconfirmed.add(cp_id)
+            logging.warning(f"[PROFILE {cp_id}] SetChargingProfile de {limit_W:.0f}W sem confirmação em {self.deadline_s:.0f}s.")
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            channel.acked = None
+            self.unconfirmed.add(cp_id)
+            logging.warning(f"[PROFILE {cp_id}] SetChargingProfile de {limit_W:.0f}W falhou: {e}")
+            return
+        if isinstance(payload, dict) and payload.get("status") == "Accepted":
+            channel.acked = limit_W
+            self.unconfirmed.discard(cp_id)
+        else:
+            self.failed += 1
+            channel.acked = None
+            self.unconfirmed.add(cp_id)
+            logging.warning(f"[PROFILE {cp_id}] SetChargingProfile de {limit_W:.0f}W não aceito: {payload}")
+
+    def drop_charger(self, cp_id):
+        """Descarta o canal de um carregador que desconectou (o limite será reenviado ao reconectar)."""
+        channel = self._channels.pop(cp_id, None)
+        self.unconfirmed.discard(cp_id)
+        if channel is not None and channel.task is not None:
+            channel.task.cancel()
+
+    def in_flight(self):
+        return sum(1 for c in self._channels.values() if c.inflight is not None)
+
+    def stats(self):
+        return {
+            "issued": self.issued, "coalesced": self.coalesced, "skipped": self.skipped,
+            "timed_out": self.timed_out, "failed": self.failed, "in_flight": self.in_flight(),
+        }
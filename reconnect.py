@@ -0,0 +1,141 @@
+#----------------------------------------------------------
+# Reconexão das conexões upstream (gateway -> CSMS), uma por carregador.
+#
+# - Backoff exponencial com jitter completo: a n-ésima tentativa seguida
+#   espera um valor aleatório em [0, min(max_delay_s, base_delay_s * 2^n)].
+# - Caminho rápido: a primeira tentativa após uma queda sai em até
+#   `fast_retry_s` (o CSMS pode já ter voltado); o backoff só cresce se ela
+#   falhar.
+# - Uma conexão que caiu depois de ficar de pé por `healthy_after_s` zera o
+#   backoff; uma que cai logo após abrir continua crescendo (flapping).
+# - Teto global de handshakes simultâneos (TCP + TLS + upgrade), para que
+#   centenas de carregadores não reconectem todos no mesmo instante.
+# - Quando um handshake volta a funcionar depois de falhar (o CSMS voltou),
+#   os demais cujo handshake falhou são acordados e tentam já, passando
+#   pelo teto de handshakes, em vez de esperar o resto do backoff. Quedas
+#   logo após conectar (flapping) não acordam ninguém.
+# Métricas: tentativas, falhas, taxa de falha recente, latência de conexão.
+#----------------------------------------------------------
+import asyncio
+import random
+import time
+from collections import deque
+
+from pending_calls import RttHistogram
+#----------------------------------------------------------
+
+
+class ReconnectManager:
+    """Use só no loop asyncio."""
+
+    def __init__(self, base_delay_s=1.0, max_delay_s=60.0, fast_retry_s=0.5,
+                 max_concurrent_handshakes=20, healthy_after_s=30.0, failure_window=100):
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.fast_retry_s = fast_retry_s
+        self.max_concurrent_handshakes = max_concurrent_handshakes
+        self.healthy_after_s = healthy_after_s
+        self._semaphore = None     # criado no primeiro connect(), já dentro do loop
+        self._recovered = None     # asyncio.Event da próxima recuperação (idem)
+        self._failures = {}        # chave -> falhas seguidas
+        self._connected_at = {}    # chave -> instante da última conexão bem-sucedida
+        self._handshake_failed = set()   # chaves cuja última tentativa falhou no handshake
+        self._recent = deque(maxlen=failure_window)   # True = falha
+        # Métricas
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.handshaking = 0
+        self.waiting = 0
+        self.recoveries = 0
+        self.connect_latency = RttHistogram()
+
+    async def connect(self, key, open_connection):
+        """
+        Abre a conexão com `await open_connection()` respeitando o teto de
+        handshakes. Exceções do handshake são registradas e repassadas.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_handshakes)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.attempts += 1
+        self.handshaking += 1
+        start = time.monotonic()
+        try:
+            connection = await open_connection()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failures += 1
+            self._failures[key] = self._failures.get(key, 0) + 1
+            self._connected_at.pop(key, None)
+            self._handshake_failed.add(key)
+            self._recent.append(True)
+            raise
+        finally:
+            self.handshaking -= 1
+            self._semaphore.release()
+        self.successes += 1
+        self._recent.append(False)
+        if key in self._handshake_failed:
+            # O handshake deste vinha falhando e passou: acorda quem está em backoff
+            self._handshake_failed.discard(key)
+            self.recoveries += 1
+            if self._recovered is not None:
+                self._recovered.set()
+                self._recovered = asyncio.Event()
+        self.connect_latency.add((time.monotonic() - start) * 1000.0)
+        self._connected_at[key] = time.monotonic()
+        return connection
+
+    def next_delay(self, key):
+        """Espera (s) antes da próxima tentativa para `key`, depois de uma queda ou falha."""
+        connected_at = self._connected_at.pop(key, None)
+        if connected_at is not None:
+            if time.monotonic() - connected_at >= self.healthy_after_s:
+                self._failures[key] = 0
+            else:
+                # Caiu logo depois de abrir: conta como falha para o backoff
+                self._failures[key] = self._failures.get(key, 0) + 1
+        failures = self._failures.get(key, 0)
+        if failures == 0:
+            return random.uniform(0.0, self.fast_retry_s)
+        return random.uniform(0.0, min(self.max_delay_s, self.base_delay_s * (2 ** min(failures, 30))))
+
+    async def wait_before_retry(self, key):
+        """Espera a próxima tentativa (next_delay), acordando antes se outra conexão se recuperar."""
+        delay = self.next_delay(key)
+        if key not in self._handshake_failed:
+            await asyncio.sleep(delay)
+            return delay
+        if self._recovered is None:
+            self._recovered = asyncio.Event()
+        start = time.monotonic()
+        waiter = asyncio.ensure_future(self._recovered.wait())
+        try:
+            await asyncio.wait({waiter}, timeout=delay)
+        finally:
+            waiter.cancel()
+        return time.monotonic() - start
+
+    def forget(self, key):
+        self._failures.pop(key, None)
+        self._connected_at.pop(key, None)
+        self._handshake_failed.discard(key)
+
+    def stats(self):
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "recent_failure_rate": round(sum(self._recent) / len(self._recent), 3) if self._recent else None,
+            "handshaking": self.handshaking,
+            "waiting": self.waiting,
+            "recoveries": self.recoveries,
+            "backing_off": sum(1 for k, n in self._failures.items() if n and k not in self._connected_at),
+            "connect_ms": self.connect_latency.summary(),
+        }
@@ -0,0 +1,175 @@
+#----------------------------------------------------------
+# Agregados por minuto (rollups) materializados pelo gateway.
+#
+# O gateway observa cada medição no momento em que chega e acumula, por
+# (minuto, série, chave), soma/contagem/mínimo/máximo. Quando o minuto
+# termina, uma linha compacta é gravada em
+#   logs/rollups/rollup_AAAA-MM-DD.csv
+# com as colunas minute,series,key,sum,count,min,max. A análise de semanas
+# de dados passa a ler ~1440 linhas por carregador por dia em vez de
+# reconstruir médias a partir dos logs de texto.
+#
+# O loop asyncio só monta as linhas; a escrita no CSV fica com uma thread
+# (RollupWriter), como os pacotes do medidor (meter_ingest.py).
+#
+# Uma amostra atrasada (MeterValues com o timestamp do carregador) pode cair
+# num minuto já gravado: ela fica no seu minuto e gera outra linha com a
+# mesma (minuto, série, chave). load_rollups junta essas linhas.
+#----------------------------------------------------------
+import csv
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+#----------------------------------------------------------
+
+ROLLUP_COLUMNS = ["minute", "series", "key", "sum", "count", "min", "max"]
+
+# Séries gravadas pelo gateway
+SERIES_CHARGER_POWER = "charger_power_W"   # current_power_W de cada carregador
+SERIES_SITE_POWER = "site_power_W"         # SITE_POWER_STATE['current_total_W']
+SERIES_CHARGER_LIMIT = "charger_limit_W"   # current_limit_W alocado a cada carregador
+SERIES_BUFFER_TO_CSMS = "buffer_to_csms"         # frames aguardando o CSMS (só carregadores com buffer)
+SERIES_BUFFER_TO_CHARGER = "buffer_to_charger"   # frames aguardando o carregador
+SERIES_BUFFER_DRAIN_S = "buffer_drain_s"         # segundos para esvaziar o buffer após reconectar ao CSMS
+# RTT (ms) das chamadas do gateway, por ação
+SERIES_CALL_RTT = {
+    "SetChargingProfile": "rtt_set_charging_profile_ms",
+    "TriggerMessage": "rtt_trigger_message_ms",
+    "ChangeConfiguration": "rtt_change_configuration_ms",
+}
+
+
+_STOP = object()
+
+
+def write_rollup_rows(rollup_dir, by_day):
+    """Acrescenta {dia: linhas} aos CSVs diários. Retorna o número de linhas gravadas."""
+    written = 0
+    os.makedirs(rollup_dir, exist_ok=True)
+    for day, rows in by_day.items():
+        path = os.path.join(rollup_dir, f"rollup_{day.isoformat()}.csv")
+        new_file = not os.path.exists(path)
+        try:
+            with open(path, "a", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(ROLLUP_COLUMNS)
+                writer.writerows(rows)
+            written += len(rows)
+        except IOError as e:
+            logging.error(f"[ROLLUP] Erro ao gravar rollups em '{path}': {e}")
+    return written
+
+
+class RollupWriter(threading.Thread):
+    """Thread que grava os minutos encerrados, na ordem em que foram entregues."""
+
+    def __init__(self, rollup_dir, maxsize=1000):
+        super().__init__(name="rollup-writer", daemon=True)
+        self.rollup_dir = rollup_dir
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.written = 0
+
+    def write(self, by_day):
+        """Enfileira {dia: linhas}. Nunca bloqueia."""
+        try:
+            self.queue.put_nowait(by_day)
+        except queue.Full:
+            self.dropped += sum(len(rows) for rows in by_day.values())
+
+    def run(self):
+        while True:
+            by_day = self.queue.get()
+            if by_day is _STOP:
+                return
+            self.written += write_rollup_rows(self.rollup_dir, by_day)
+
+    def stop(self, timeout=5.0):
+        """Grava o que estiver na fila e encerra a thread."""
+        if not self.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+
+class MinuteRollup:
+    """
+    Acumulador em memória por minuto. Não é thread-safe: use no loop asyncio.
+    Com `writer` (RollupWriter já iniciado), `flush` só entrega as linhas à
+    thread; sem ele (ou com a thread parada), grava na hora.
+    """
+
+    def __init__(self, rollup_dir, writer=None):
+        self.rollup_dir = rollup_dir
+        self.writer = writer
+        self._buckets = {}   # minuto (datetime) -> {(série, chave): [sum, count, min, max]}
+
+    def observe(self, series, key, value, now=None):
+        minute = (now or datetime.now()).replace(second=0, microsecond=0)
+        bucket = self._buckets.get(minute)
+        if bucket is None:
+            bucket = self._buckets[minute] = {}
+        value = float(value)
+        acc = bucket.get((series, key))
+        if acc is None:
+            bucket[(series, key)] = [value, 1, value, value]
+        else:
+            acc[0] += value
+            acc[1] += 1
+            if value < acc[2]:
+                acc[2] = value
+            if value > acc[3]:
+                acc[3] = value
+
+    def flush(self, now=None, include_current=False):
+        """
+        Grava os minutos já encerrados (ou todos, com `include_current`, usado no
+        desligamento) e os remove da memória. Retorna o número de linhas
+        gravadas (ou entregues à thread escritora).
+        """
+        current = (now or datetime.now()).replace(second=0, microsecond=0)
+        ready = sorted(m for m in self._buckets if include_current or m < current)
+        if not ready:
+            return 0
+        by_day = {}
+        for minute in ready:
+            bucket = self._buckets.pop(minute)
+            rows = by_day.setdefault(minute.date(), [])
+            minute_str = minute.strftime("%Y-%m-%d %H:%M")
+            for (series, key), (total, count, vmin, vmax) in sorted(bucket.items()):
+                rows.append([minute_str, series, key, f"{total:.2f}", count, f"{vmin:.2f}", f"{vmax:.2f}"])
+        if self.writer is not None and self.writer.is_alive():
+            self.writer.write(by_day)
+            return sum(len(rows) for rows in by_day.values())
+        return write_rollup_rows(self.rollup_dir, by_day)
+
+
+def load_rollups(rollup_dir, start_day, end_day, series=None):
+    """
+    Lê os rollups dos dias start_day..end_day (inclusive) como DataFrame, com
+    a coluna extra 'mean' (= sum / count). Linhas repetidas de um mesmo
+    (minuto, série, chave) são somadas numa só. Requer pandas (só para análise).
+    """
+    import pandas as pd
+    frames = []
+    day = start_day
+    while day <= end_day:
+        path = os.path.join(rollup_dir, f"rollup_{day.isoformat()}.csv")
+        if os.path.exists(path):
+            frames.append(pd.read_csv(path, dtype={"key": str}, parse_dates=["minute"]))
+        day += timedelta(days=1)
+    if not frames:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS + ["mean"])
+    df = pd.concat(frames, ignore_index=True)
+    if series is not None:
+        df = df[df["series"] == series]
+    df = df.groupby(["minute", "series", "key"], as_index=False).agg(
+        {"sum": "sum", "count": "sum", "min": "min", "max": "max"})
+    df["mean"] = df["sum"] / df["count"]
+    return df
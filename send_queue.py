@@ -0,0 +1,173 @@
+#----------------------------------------------------------
+# Fila de envio por conexão (carregador -> CSMS e CSMS -> carregador).
+#
+# O handler que lê um lado só chama `offer(frame)`, que não bloqueia: o
+# frame entra numa fila limitada e uma tarefa escritora faz o `send` no
+# outro lado. Assim um CSMS (ou carregador) lento não impede a leitura dos
+# frames que o controle de demanda usa.
+#   - Fila cheia (ou escritora parada): o frame vai para o buffer do
+#     carregador (message_buffer.MessageBuffer, com transbordo para disco),
+#     e os seguintes também, até o buffer esvaziar, para não mudar a ordem.
+#   - Sem frames ao vivo na fila, a escritora esvazia o buffer (backlog da
+#     desconexão ou transbordo), no máximo `drain_max_per_s` frames/s; os
+#     frames ao vivo continuam passando na frente. Cada frame ao vivo que
+#     transbordou para o buffer dá um crédito de envio imediato: só o
+#     backlog anterior respeita o limite, e o transbordo termina mesmo com
+#     o link acima de `drain_max_per_s` frames/s.
+#   - Se o envio falhar, o frame atual e o resto da fila voltam à frente do
+#     buffer, na ordem, e a escritora termina: a escritora os enviaria antes
+#     do buffer, e eles são mais antigos que os frames que transbordaram.
+#----------------------------------------------------------
+import asyncio
+import logging
+import time
+#----------------------------------------------------------
+
+
+class LinkWriter:
+    """Use só no loop asyncio. `on_drained(enviados, segundos)` é chamado quando o buffer esvazia."""
+
+    def __init__(self, name, websocket, buffer, maxsize=100, drain_max_per_s=50, on_drained=None):
+        self.name = name
+        self.websocket = websocket
+        self.buffer = buffer
+        self.maxsize = maxsize
+        self.drain_max_per_s = drain_max_per_s
+        self.on_drained = on_drained
+        self._queue = asyncio.Queue(maxsize)
+        self._task = None
+        self.closed = False
+        self._spilling = False     # transbordou: novos frames vão para o buffer até ele esvaziar
+        self._spill_credit = 0     # frames ao vivo no buffer que saem sem esperar o limite
+        self._taken_live = None    # frame que saiu da fila quando a escritora foi cancelada
+        # Métricas
+        self.sent = 0
+        self.spilled = 0      # frames que foram para o buffer por fila cheia
+        self.drained = 0      # frames enviados a partir do buffer
+        self.max_depth = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self
+
+    def offer(self, message, priority=False):
+        """
+        Enfileira o frame. Retorna False se ele foi para o buffer (fila cheia,
+        transbordo ainda não esvaziado ou conexão encerrada); com `priority`,
+        na fila de prioridade do buffer.
+        """
+        if not self.closed and not self._spilling:
+            try:
+                self._queue.put_nowait(message)
+                depth = self._queue.qsize()
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                return True
+            except asyncio.QueueFull:
+                self._spilling = True
+        if self._spilling and not self.closed:
+            self._spill_credit += 1
+        if priority:
+            self.buffer.append_priority(message)
+        else:
+            self.buffer.append(message)
+        self.spilled += 1
+        return False
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    async def _next_live(self, timeout):
+        # asyncio.wait (e não wait_for) para não engolir o cancelamento da escritora
+        getter = asyncio.ensure_future(self._queue.get())
+        try:
+            await asyncio.wait({getter}, timeout=timeout)
+        except asyncio.CancelledError:
+            if getter.done() and not getter.cancelled():
+                self._taken_live = getter.result()   # já saiu da fila: não pode se perder
+            else:
+                getter.cancel()
+            raise
+        if not getter.done():
+            getter.cancel()
+            return None
+        return getter.result()
+
+    async def run(self):
+        message = None
+        from_buffer = False
+        drain_started = None
+        drain_count = 0
+        next_drain_at = 0.0
+        try:
+            while True:
+                if not self._queue.empty():
+                    message, from_buffer = self._queue.get_nowait(), False
+                elif len(self.buffer):
+                    if drain_started is None:
+                        drain_started, drain_count = time.monotonic(), 0
+                        logging.info(f"[BUFFER FLUSH {self.name}] Enviando {len(self.buffer)} mensagens pendentes (até {self.drain_max_per_s}/s)...")
+                    wait = 0 if self._spill_credit else next_drain_at - time.monotonic()
+                    message = await self._next_live(wait) if wait > 0 else None
+                    if message is not None:
+                        from_buffer = False
+                    else:
+                        if self._spill_credit:
+                            self._spill_credit -= 1
+                        elif time.monotonic() < next_drain_at:
+                            continue
+                        elif self.drain_max_per_s:
+                            next_drain_at = time.monotonic() + 1.0 / self.drain_max_per_s
+                        message, from_buffer = self.buffer.take(), True
+                        if message is None:
+                            continue
+                else:
+                    self._spilling = False
+                    self._spill_credit = 0
+                    if drain_started is not None:
+                        elapsed = time.monotonic() - drain_started
+                        self.buffer.last_drain_s = elapsed
+                        logging.info(f"[BUFFER FLUSH {self.name}] Buffer limpo: {drain_count} mensagens enviadas em {elapsed:.1f}s.")
+                        if self.on_drained is not None:
+                            self.on_drained(drain_count, elapsed)
+                        drain_started = None
+                    message, from_buffer = await self._queue.get(), False
+                await self.websocket.send(message)
+                if from_buffer:
+                    self.buffer.ack()
+                    self.drained += 1
+                    drain_count += 1
+                self.sent += 1
+                message = None
+        except asyncio.CancelledError:
+            self._return_to_buffer(message, from_buffer)
+            raise
+        except Exception as e:
+            self._return_to_buffer(message, from_buffer)
+            logging.warning(f"[SEND QUEUE {self.name}] Envio interrompido ({e.__class__.__name__}). {len(self.buffer)} mensagens no buffer.")
+
+    def _return_to_buffer(self, message, from_buffer):
+        # O frame em mãos e o que sobrou na fila voltam à frente do buffer, na ordem
+        # em que seriam enviados; um frame do buffer em voo volta à frente de todos
+        self.closed = True
+        live = []
+        if message is None and self._taken_live is not None:
+            message, from_buffer = self._taken_live, False
+        self._taken_live = None
+        if message is not None and not from_buffer:
+            live.append(message)
+        while not self._queue.empty():
+            live.append(self._queue.get_nowait())
+        self.buffer.prepend(live)
+        if message is not None and from_buffer:
+            self.buffer.nack()
+
+    def close(self):
+        """Para a escritora; o que não foi enviado fica no buffer."""
+        self.closed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "max_depth": self.max_depth, "sent": self.sent,
+                "spilled": self.spilled, "drained": self.drained}
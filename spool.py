@@ -0,0 +1,171 @@
+#----------------------------------------------------------
+# Spool em disco para a telemetria externa durante quedas do uplink.
+#
+# Segmentos append-only (seg_00000001.jsonl, seg_00000002.jsonl, ...), um
+# pacote JSON por linha. O arquivo `ack.json` guarda a posição
+# (segmento, offset) até onde os pacotes já foram reenviados com sucesso;
+# segmentos inteiramente antes dessa posição são apagados. Na
+# reinicialização do gateway o spool é reaberto e a reprodução continua de
+# onde parou; a escrita sempre começa num segmento novo, então uma linha
+# incompleta deixada por uma queda no meio da escrita é ignorada.
+#
+# O `ack.json` é regravado no máximo a cada `ack_interval_s` (e sempre que
+# um segmento é apagado ou no `close`): após uma queda, no pior caso os
+# pacotes desse intervalo são reenviados de novo.
+#
+# Não é thread-safe: todas as chamadas devem vir da mesma thread (o
+# UplinkSender usa uma thread própria para tirar o disco do loop asyncio).
+#----------------------------------------------------------
+import json
+import logging
+import os
+import time
+from ocpp_frame import encode_packet
+#----------------------------------------------------------
+
+_SEGMENT_PREFIX = "seg_"
+_SEGMENT_SUFFIX = ".jsonl"
+_ACK_FILE = "ack.json"
+
+
+class TelemetrySpool:
+
+    def __init__(self, directory, segment_max_bytes=8 * 1024 * 1024, ack_interval_s=5.0):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.ack_interval_s = ack_interval_s
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._scan_segments()
+        self._ack = self._saved_ack = self._load_ack()
+        self._saved_at = time.monotonic()
+        self._write_seg = (self._segments[-1] + 1) if self._segments else 1
+        self._write_file = None
+        self._write_size = 0
+        # Contador de pacotes gravados nesta execução
+        self.spooled = 0
+
+    # --- Estado persistido ---
+    def _segment_path(self, seg):
+        return os.path.join(self.directory, f"{_SEGMENT_PREFIX}{seg:08d}{_SEGMENT_SUFFIX}")
+
+    def _scan_segments(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                try:
+                    found.append(int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(found)
+
+    def _load_ack(self):
+        path = os.path.join(self.directory, _ACK_FILE)
+        default = (self._segments[0], 0) if self._segments else (1, 0)
+        if not os.path.exists(path):
+            return default
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (ValueError, KeyError, IOError, json.JSONDecodeError) as e:
+            logging.error(f"[SPOOL] ack.json inválido ({e}). Reenviando desde o primeiro segmento.")
+            return default
+
+    def _save_ack(self):
+        path = os.path.join(self.directory, _ACK_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"segment": self._ack[0], "offset": self._ack[1]}, f)
+        os.replace(path + ".tmp", path)
+        self._saved_ack = self._ack
+        self._saved_at = time.monotonic()
+
+    # --- Escrita ---
+    def append(self, records):
+        """Acrescenta pacotes ao segmento de escrita atual (um JSON por linha)."""
+        if not records:
+            return
+        if self._write_file is None:
+            self._write_file = open(self._segment_path(self._write_seg), "a", encoding="utf-8")
+            self._write_size = self._write_file.tell()
+            if self._write_seg not in self._segments:
+                self._segments.append(self._write_seg)
+        data = "".join(encode_packet(r) + "\n" for r in records)
+        self._write_file.write(data)
+        self._write_file.flush()
+        self._write_size += len(data.encode("utf-8"))
+        self.spooled += len(records)
+        if self._write_size >= self.segment_max_bytes:
+            self._write_file.close()
+            self._write_file = None
+            self._write_seg += 1
+
+    # --- Leitura / confirmação ---
+    def has_pending(self):
+        seg, offset = self._ack
+        for s in self._segments:
+            if s >= seg and self._segment_size(s) > (offset if s == seg else 0):
+                return True
+        return False
+
+    def read(self, max_records):
+        """
+        Lê até `max_records` pacotes a partir da posição confirmada. Retorna
+        (pacotes, posição) — a posição deve ser passada a `ack` depois que os
+        pacotes forem enviados com sucesso.
+        """
+        records = []
+        seg, offset = self._ack
+        for s in [s for s in self._segments if s >= seg]:
+            if s != seg:
+                seg, offset = s, 0
+            try:
+                with open(self._segment_path(s), "rb") as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        try:
+                            records.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            logging.warning(f"[SPOOL] Linha inválida ignorada no segmento {s}.")
+                        if len(records) >= max_records:
+                            return records, (seg, offset)
+            except FileNotFoundError:
+                continue
+        # Segmentos fechados não crescem mais (uma linha incompleta no fim é resto de
+        # uma queda): avança para o de escrita, liberando-os para remoção
+        if seg < self._write_seg:
+            seg, offset = self._write_seg, 0
+        return records, (seg, offset)
+
+    def _segment_size(self, seg):
+        try:
+            return os.path.getsize(self._segment_path(seg))
+        except OSError:
+            return 0
+
+    def ack(self, position, force=False):
+        """
+        Confirma tudo até `position` e apaga os segmentos já totalmente
+        reenviados. O ack.json só é regravado se `force`, se algum segmento
+        vai ser apagado ou se passou `ack_interval_s` desde a última gravação.
+        """
+        self._ack = position
+        done = [s for s in self._segments if s < position[0]]
+        if force or done or time.monotonic() - self._saved_at >= self.ack_interval_s:
+            self._save_ack()
+        for s in done:
+            try:
+                os.remove(self._segment_path(s))
+            except OSError as e:
+                logging.warning(f"[SPOOL] Não foi possível apagar o segmento {s}: {e}")
+                continue
+            self._segments.remove(s)
+
+    def close(self):
+        if self._ack != self._saved_ack:
+            self._save_ack()
+        if self._write_file is not None:
+            self._write_file.close()
+            self._write_file = None
@@ -0,0 +1,8 @@
+#----------------------------------------------------------
+# Os módulos ficam na raiz do repositório (como nos benchmarks/).
+#----------------------------------------------------------
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,96 @@
+import numpy as np
+
+from allocation import phase_ceilings, site_phase_ceilings, water_fill
+
+
+def test_water_fill_gives_spare_power_to_saturated_chargers():
+    # CP0 consome pouco (teto = demanda + margem); CP1 e CP2 estão no limite
+    demand = [2000.0, 7000.0, 7000.0]
+    limits = water_fill(15000.0, demand, [7400.0, 11000.0, 11000.0], [7400.0, 7000.0, 7000.0])
+    assert limits[0] == 3000.0
+    assert np.allclose(limits[1:], 6000.0)
+    assert limits.sum() <= 15000.0
+
+
+def test_water_fill_hands_out_leftover_up_to_learned_max():
+    limits = water_fill(50000.0, [2000.0, 3000.0], [7400.0, 11000.0], [7400.0, 11000.0])
+    assert limits.tolist() == [7400.0, 11000.0]
+
+
+def test_water_fill_pauses_lowest_demand_without_budget_for_minimums():
+    demand = [7000.0, 3000.0, 5000.0]
+    limits = water_fill(3000.0, demand, [7400.0] * 3, [7400.0] * 3)
+    assert limits.tolist() == [1500.0, 0.0, 1500.0]
+
+
+def test_water_fill_never_exceeds_available():
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        n = int(rng.integers(1, 40))
+        demand = rng.uniform(0.0, 22000.0, n)
+        max_W = rng.choice((7400.0, 11000.0, 22000.0), n)
+        available = float(rng.uniform(0.0, max_W.sum()))
+        limits = water_fill(available, demand, max_W, rng.uniform(1380.0, 22000.0, n))
+        assert limits.sum() <= available + 1e-6
+        assert (limits <= max_W + 1e-6).all()
+        assert ((limits == 0.0) | (limits >= np.minimum(1380.0, max_W) - 1e-6)).all()
+
+
+def test_phase_ceilings_keep_each_phase_under_its_limit():
+    # Três monofásicos em L1, um em L2 e um trifásico
+    share = np.array([[1, 0, 0], [1, 0, 0], [1, 0, 0], [0, 1, 0], [1 / 3, 1 / 3, 1 / 3]], dtype=float)
+    demand = np.array([7400.0, 7400.0, 7400.0, 7400.0, 11000.0])
+    available = np.array([12000.0, 20000.0, 20000.0])
+    ceilings = phase_ceilings(available, share, demand, demand, demand)
+    per_phase = share.T @ ceilings
+    assert (per_phase <= available + 1e-6).all()
+    # L2 tem folga: o monofásico de lá não é limitado pela L1
+    assert ceilings[3] == 7400.0
+    limits = water_fill(available.sum(), demand, demand, demand, ceiling_W=ceilings)
+    assert (share.T @ limits <= available + 1e-6).all()
+
+
+def test_phase_ceilings_pause_below_minimum_on_a_saturated_phase():
+    share = np.array([[1, 0, 0], [1, 0, 0]], dtype=float)
+    demand = np.array([7000.0, 3000.0])
+    ceilings = phase_ceilings(np.array([2000.0, 20000.0, 20000.0]), share, demand, [7400.0] * 2, [7400.0] * 2)
+    assert ceilings[1] == 0.0
+    assert 1380.0 <= ceilings[0] <= 2000.0
+    limits = water_fill(10000.0, demand, [7400.0] * 2, [7400.0] * 2, ceiling_W=ceilings)
+    assert limits[1] == 0.0 and limits[0] <= 2000.0
+
+
+def simulate_unknown_single_phase(real_phase, other_W, ticks, start_W, phase_limit_W=20000.0):
+    # Carregadores monofásicos sem fase configurada: pesam em todas as fases do site
+    n = len(real_phase)
+    real = np.zeros((n, 3))
+    real[np.arange(n), real_phase] = 1.0
+    share = np.ones((n, 3))
+    max_W = np.full(n, 7500.0)
+    draw = np.asarray(start_W, dtype=float)
+    history = []
+    for _ in range(ticks):
+        site = other_W + real.T @ draw
+        ceilings, _, _ = site_phase_ceilings(np.full(3, phase_limit_W), site, share, np.zeros(n, dtype=bool),
+                                             draw, max_W, np.maximum(draw, 1.0))
+        limits = water_fill(1e9, draw, max_W, np.maximum(draw, 1.0), ceiling_W=ceilings)
+        draw = np.minimum(limits, max_W)   # os carros aceitam o que receberem
+        history.append(other_W + real.T @ draw)
+    return np.array(history), draw
+
+
+def test_unknown_phase_chargers_do_not_overload_when_shedding():
+    # Limite de 20 kW por fase, 15 kW de outras cargas em cada fase, um monofásico
+    # de 7,5 kW em L1 e outro em L2 (o site começa 2,5 kW acima em L1 e L2)
+    other = np.full(3, 15000.0)
+    history, draw = simulate_unknown_single_phase([0, 1], other, ticks=30, start_W=[7500.0, 7500.0])
+    assert (history <= 20000.0 + 1e-6).all()
+    assert np.allclose(draw, 5000.0, atol=50.0)
+
+
+def test_unknown_phase_charger_alone_settles_without_flapping():
+    other = np.array([10000.0, 2000.0, 2000.0])
+    history, draw = simulate_unknown_single_phase([0], other, ticks=10, start_W=[0.0])
+    assert (history <= 20000.0 + 1e-6).all()
+    assert np.allclose(history[2:, 0], history[-1, 0])
+    assert draw[0] == 7500.0
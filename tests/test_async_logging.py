@@ -0,0 +1,92 @@
+import io
+import logging
+import queue
+
+from async_logging import POLICY_DROP, BatchLogWriter, QueuedLogHandler, install_queued_logging
+
+
+def make_logger(name, *handlers):
+    logger = logging.getLogger(name)
+    logger.handlers[:] = list(handlers)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def stream_handler(fmt="%(levelname)s %(message)s"):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(fmt))
+    return handler, stream
+
+
+def test_message_is_built_when_logged_not_when_written():
+    log_queue = queue.Queue()
+    handler = QueuedLogHandler(log_queue)
+    logger = make_logger("test_async_logging.prepare", handler)
+    state = {"status": "Charging"}
+    logger.info("[STATE] %s", state)
+    state["status"] = "Available"   # muda antes de a thread escritora ler o registro
+
+    record = log_queue.get_nowait()
+    assert record.getMessage() == "[STATE] {'status': 'Charging'}"
+    assert record.args is None and record.exc_info is None
+
+
+def test_traceback_is_rendered_once_in_the_message():
+    log_queue = queue.Queue()
+    logger = make_logger("test_async_logging.exc", QueuedLogHandler(log_queue))
+    try:
+        raise ValueError("frame inválido")
+    except ValueError:
+        logger.error("[PARSER] Erro", exc_info=True)
+    out, stream = stream_handler()
+    writer = BatchLogWriter(log_queue, [out], QueuedLogHandler(queue.Queue()))
+    writer._write_batch(out, [log_queue.get_nowait()])
+    text = stream.getvalue()
+    assert text.startswith("ERROR [PARSER] Erro\nTraceback")
+    assert text.count("ValueError: frame inválido") == 1
+
+
+def test_queued_and_destination_filters_are_applied():
+    log_queue = queue.Queue()
+    handler = QueuedLogHandler(log_queue)
+    handler.addFilter(lambda record: "[SKIP]" not in record.getMessage())
+    logger = make_logger("test_async_logging.filter", handler)
+    logger.info("[SKIP] não entra na fila")
+    logger.info("[KEEP] um")
+    logger.info("[CONSOLE] dois")
+    assert log_queue.qsize() == 2
+
+    out, stream = stream_handler()
+    out.addFilter(lambda record: not record.getMessage().startswith("[CONSOLE]"))
+    writer = BatchLogWriter(log_queue, [out], handler)
+    writer._write_batch(out, [log_queue.get_nowait(), log_queue.get_nowait()])
+    assert stream.getvalue() == "INFO [KEEP] um\n"
+
+
+def test_stop_flushes_everything_still_queued():
+    out, stream = stream_handler()
+    logger = make_logger("test_async_logging.stop", out)
+    writer = install_queued_logging(logger, maxsize=1000, policy=POLICY_DROP, batch_size=16)
+    for i in range(200):
+        logger.info("[LOOP] %d", i)
+    writer.stop()
+    assert not writer.is_alive()
+    assert stream.getvalue().splitlines() == [f"INFO [LOOP] {i}" for i in range(200)]
+
+
+def test_full_queue_drops_and_reports():
+    out, stream = stream_handler()
+    log_queue = queue.Queue(maxsize=2)
+    handler = QueuedLogHandler(log_queue, policy=POLICY_DROP)
+    logger = make_logger("test_async_logging.drop", handler)
+    for i in range(5):
+        logger.info("[LOOP] %d", i)
+    assert handler.dropped == 3
+    writer = BatchLogWriter(log_queue, [out], handler)
+    writer.start()
+    writer.stop()
+    lines = stream.getvalue().splitlines()
+    assert lines[:2] == ["INFO [LOOP] 0", "INFO [LOOP] 1"]
+    assert lines[2] == "WARNING [LOGGING] Fila de log cheia: 3 registros descartados."
@@ -0,0 +1,45 @@
+import numpy as np
+
+from allocation import phase_ceilings
+from charger_phases import THREE_PHASE, ChargerPhases
+
+
+def test_single_phase_label_does_not_pick_a_site_phase():
+    phases = ChargerPhases()
+    # Todo monofásico reporta "L1" nas próprias leituras
+    phases.observe("CP1", {"L1": 32.0, "L2": 0.0, "L3": 0.0}, {})
+    phases.observe("CP2", {"L1": 16.0}, {})
+    phases.observe("CP3", {"L1": 16.0, "L2": 16.0, "L3": 15.0}, {})
+    assert phases.shares(["CP1", "CP2", "CP3", "CP4"]).tolist() == [
+        [1.0, 1.0, 1.0], [1.0, 1.0, 1.0], list(THREE_PHASE), list(THREE_PHASE)]
+
+
+def test_configured_phase_wins_over_readings():
+    phases = ChargerPhases({"CP1": ["L2"]})
+    phases.observe("CP1", {"L1": 32.0}, {})
+    assert phases.shares(["CP1"]).tolist() == [[0.0, 1.0, 0.0]]
+    assert phases.phases_of("CP1") == ("L2",)
+
+
+def test_unconfigured_single_phase_units_never_overload_their_real_phase():
+    phases = ChargerPhases()
+    cp_ids = [f"CP{i}" for i in range(6)]
+    for cp_id in cp_ids:
+        phases.observe(cp_id, {"L1": 32.0}, {})
+    shares = phases.shares(cp_ids)
+    available = np.array([10000.0, 20000.0, 20000.0])
+    demand = np.full(6, 7400.0)
+    ceilings = phase_ceilings(available, shares, demand, demand, demand)
+    # Na instalação, todos podem estar na mesma fase (a mais apertada)
+    assert ceilings.sum() <= available.min() + 1e-6
+
+
+def test_version_changes_only_when_inference_changes():
+    phases = ChargerPhases()
+    ids = ["CP1"]
+    phases.observe("CP1", {"L1": 16.0, "L2": 16.0, "L3": 16.0}, {})
+    first = phases.shares(ids)
+    phases.observe("CP1", {"L1": 15.0, "L2": 16.0, "L3": 16.0}, {})
+    assert phases.shares(ids) is first
+    phases.observe("CP1", {"L1": 16.0, "L2": 0.5, "L3": 0.5}, {})
+    assert phases.shares(ids) is not first
@@ -0,0 +1,87 @@
+import numpy as np
+
+from allocation import water_fill
+from charger_session import KEEP_PAUSED, RELEASE, power_observed, status_notified
+from charger_table import ChargerTable
+
+
+def allocate(table, available_W):
+    cp_ids, rows = table.charging()
+    limits = water_fill(available_W, table.column("current_power_W", rows),
+                        table.column("learned_max_power", rows), table.column("current_limit_W", rows))
+    changes = table.set_paused(rows, limits <= 0.0)
+    return dict(zip(cp_ids, limits.tolist())), changes
+
+
+def two_chargers():
+    table = ChargerTable()
+    for cp_id, power_W in (("CP1", 7000.0), ("CP2", 3000.0)):
+        table.add(cp_id, status="Charging", current_power_W=power_W,
+                  learned_max_power=7400.0, current_limit_W=7400.0)
+    return table
+
+
+def test_paused_charger_is_not_released_by_low_power_or_suspended_evse():
+    table = two_chargers()
+    limits, changes = allocate(table, 2000.0)
+    assert limits["CP2"] == 0.0 and changes == [("CP2", True)]
+    state = table["CP2"]
+
+    # Com 0W o carregador para de consumir e reporta SuspendedEVSE
+    state["current_power_W"] = 0.0
+    assert power_observed(state, 0.0) == (None, None)
+    assert state["status"] == "Charging"
+    assert status_notified(state, "SuspendedEVSE") == ("Charging", KEEP_PAUSED)
+    assert status_notified(state, "SuspendedEVSE") == ("SuspendedEVSE", None)
+
+    # Continua com o controle e segue pausado enquanto não houver potência
+    assert table.charging()[0] == ["CP1", "CP2"]
+    assert table.charging_count == 2
+    limits, changes = allocate(table, 2000.0)
+    assert limits["CP2"] == 0.0 and changes == []
+
+
+def test_paused_charger_resumes_when_power_returns():
+    table = two_chargers()
+    allocate(table, 2000.0)
+    state = table["CP2"]
+    state["current_power_W"] = 0.0
+    status_notified(state, "SuspendedEVSE")
+
+    limits, changes = allocate(table, 10000.0)
+    assert limits["CP2"] >= 1380.0
+    # Só deixa de estar pausado quando volta a carregar
+    assert changes == [] and state["paused"]
+    assert status_notified(state, "Charging") == ("SuspendedEVSE", None)
+    state["current_power_W"] = 1300.0
+    _, changes = allocate(table, 10000.0)
+    assert changes == [("CP2", False)]
+    assert table.charging()[0] == ["CP1", "CP2"]
+
+
+def test_end_of_paused_session_releases_charger():
+    table = two_chargers()
+    allocate(table, 2000.0)
+    state = table["CP2"]
+    status_notified(state, "SuspendedEVSE")
+    assert status_notified(state, "Available") == ("SuspendedEVSE", RELEASE)
+    assert not state["paused"]
+    assert table.charging()[0] == ["CP1"]
+
+
+def test_offline_clears_pause_and_aggregates():
+    table = two_chargers()
+    allocate(table, 2000.0)
+    table["CP2"]["status"] = "Offline"
+    assert not table["CP2"]["paused"]
+    assert table.charging()[0] == ["CP1"]
+    assert table.charging_count == 1
+    assert np.isclose(table.charging_power_W, 7000.0)
+
+
+def test_unpaused_charger_keeps_inference_and_release():
+    table = two_chargers()
+    state = table["CP2"]
+    assert power_observed(state, 200.0) == ("Available", RELEASE)
+    assert power_observed(state, 3000.0) == ("Charging", None)
+    assert status_notified(state, "Finishing") == ("Charging", RELEASE)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from charger_table import ChargerTable
+
+
+def test_aggregates_follow_status_and_power_updates():
+    table = ChargerTable()
+    table.add("CP1", status="Charging", current_power_W=7000.0, learned_max_power=7400.0)
+    table.add("CP2", status="Available")
+    table.add("CP3", status="Offline")
+    assert (table.connected_count, table.charging_count, table.charging_power_W) == (2, 1, 7000.0)
+
+    table["CP2"]["current_power_W"] = 3000.0   # fora de carga: não entra na soma
+    table["CP2"]["status"] = "Charging"
+    table["CP1"]["current_power_W"] = 6500.0
+    assert table.charging_count == 2
+    assert np.isclose(table.charging_power_W, 9500.0)
+
+    table["CP1"]["status"] = "Offline"
+    assert (table.connected_count, table.charging_count) == (1, 1)
+    assert np.isclose(table.charging_power_W, 3000.0)
+
+
+def test_charging_rows_are_cached_until_a_status_changes():
+    table = ChargerTable()
+    for cp_id in ("CP1", "CP2", "CP3"):
+        table.add(cp_id, status="Charging", current_power_W=1000.0)
+    first = table.charging()
+    assert first[0] == ["CP1", "CP2", "CP3"]
+    table["CP2"]["current_power_W"] = 2000.0
+    assert table.charging() is first
+    table["CP2"]["status"] = "Finishing"
+    cp_ids, rows = table.charging()
+    assert cp_ids == ["CP1", "CP3"]
+    assert table.column("current_power_W", rows).tolist() == [1000.0, 1000.0]
+
+
+def test_status_change_invalidates_allocated_limit():
+    table = ChargerTable()
+    table.add("CP1", status="Charging")
+    _, rows = table.charging()
+    table.set_column("allocated_W", rows, [5000.0])
+    assert table["CP1"]["allocated_W"] == 5000.0
+    table["CP1"]["status"] = "Charging"   # mesmo status: nada muda
+    assert table["CP1"]["allocated_W"] == 5000.0
+    table["CP1"]["status"] = "SuspendedEV"
+    assert np.isnan(table["CP1"]["allocated_W"])
+
+
+def test_grows_and_keeps_rows_and_extra_fields():
+    table = ChargerTable(capacity=2)
+    for i in range(5):
+        table.add(f"CP{i}", status="Charging", current_power_W=1000.0 * (i + 1), buffers=f"buf{i}")
+    assert len(table) == 5 and list(table) == [f"CP{i}" for i in range(5)]
+    assert table["CP4"]["current_power_W"] == 5000.0 and table["CP0"]["buffers"] == "buf0"
+    assert table.charging_count == 5 and np.isclose(table.charging_power_W, 15000.0)
+    assert "buffers" in table["CP1"] and table["CP1"].get("phase_power_W") is None
+    assert table.get("CP9") is None and "CP9" not in table
+
+
+def test_unknown_status_gets_a_new_code():
+    table = ChargerTable()
+    table.add("CP1", status="VendorSpecific")
+    assert table["CP1"]["status"] == "VendorSpecific"
+    assert table.connected_count == 1 and table.charging_count == 0
+
+
+def test_set_paused_only_resumes_charging_rows():
+    table = ChargerTable()
+    table.add("CP1", status="Charging", current_power_W=0.0)
+    _, rows = table.charging()
+    assert table.set_paused(rows, [True]) == [("CP1", True)]
+    table["CP1"]["status"] = "SuspendedEVSE"
+    # Pausado continua com o controle, mas só é retomado quando volta a 'Charging'
+    _, rows = table.charging()
+    assert table.set_paused(rows, [False]) == []
+    table["CP1"]["status"] = "Charging"
+    assert table.set_paused(rows, [False]) == [("CP1", False)]
+
+
+def test_clear_and_memory():
+    table = ChargerTable(capacity=8)
+    table.add("CP1", status="Charging", current_power_W=7000.0)
+    assert table.memory_bytes() == 8 + 8 + 4 * 8 * 8
+    table.clear()
+    assert len(table) == 0 and table.charging_count == 0 and table.charging_power_W == 0.0
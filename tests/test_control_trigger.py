@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from control_trigger import REASON_PERIODIC, ControlTrigger
+
+
+def test_burst_of_events_becomes_one_run_after_debounce():
+    async def scenario():
+        trigger = ControlTrigger(min_interval_s=0.0, debounce_s=0.05, fallback_s=5.0)
+        waiter = asyncio.ensure_future(trigger.wait())
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        trigger.notify("site_power")
+        await asyncio.sleep(0.02)
+        trigger.notify("status")   # chega durante o debounce: mesma passada
+        reasons = await waiter
+        return reasons, time.monotonic() - start, trigger
+
+    reasons, elapsed, trigger = asyncio.run(scenario())
+    assert reasons == {"site_power", "status"}
+    assert 0.045 <= elapsed < 0.5
+    assert trigger.runs == 1 and trigger.last_latency_s >= 0.045
+
+
+def test_min_interval_is_kept_between_runs():
+    async def scenario():
+        trigger = ControlTrigger(min_interval_s=0.2, debounce_s=0.0, fallback_s=5.0)
+        trigger.notify("status")
+        await trigger.wait()
+        first = time.monotonic()
+        trigger.notify("status")
+        await trigger.wait()
+        return time.monotonic() - first
+
+    assert asyncio.run(scenario()) >= 0.19
+
+
+def test_event_before_the_first_wait_is_not_lost():
+    async def scenario():
+        trigger = ControlTrigger(min_interval_s=0.0, debounce_s=0.0, fallback_s=5.0)
+        trigger.notify("charger_power")
+        return await asyncio.wait_for(trigger.wait(), timeout=1.0)
+
+    assert asyncio.run(scenario()) == {"charger_power"}
+
+
+def test_fallback_tick_without_events():
+    async def scenario():
+        trigger = ControlTrigger(min_interval_s=0.0, debounce_s=0.0, fallback_s=0.05)
+        start = time.monotonic()
+        reasons = await trigger.wait()
+        return reasons, time.monotonic() - start, trigger
+
+    reasons, elapsed, trigger = asyncio.run(scenario())
+    assert reasons == {REASON_PERIODIC}
+    assert elapsed >= 0.04
+    assert trigger.runs_by_reason == {REASON_PERIODIC: 1}
+
+
+def test_periodic_only_ignores_events():
+    async def scenario():
+        trigger = ControlTrigger(min_interval_s=0.0, debounce_s=0.0, fallback_s=0.05, event_driven=False)
+        trigger.notify("status")
+        start = time.monotonic()
+        reasons = await trigger.wait()
+        return reasons, time.monotonic() - start
+
+    reasons, elapsed = asyncio.run(scenario())
+    assert reasons == {REASON_PERIODIC} and elapsed >= 0.04
@@ -0,0 +1,136 @@
+import glob
+import os
+from datetime import date, datetime, timedelta
+
+from event_store import EventStore
+
+
+def power_line(ts, cp_id, power_W):
+    return f"{ts},000 - INFO - [STATE UPDATE {cp_id}]: Potência atual: {power_W:.2f}W\n"
+
+
+def disconnect_line(ts, cp_id):
+    return f"{ts},000 - INFO - [Local Server] Cliente '{cp_id}' desconectado e removido.\n"
+
+
+def append(path, *lines):
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def read_power(store, day):
+    start = datetime.combine(day, datetime.min.time())
+    return store.read("power", start, start + timedelta(days=1))
+
+
+def test_sync_appends_chunks_and_compacts_when_day_closes(tmp_path):
+    store = EventStore(str(tmp_path / "store"))
+    log = str(tmp_path / "gateway.log")
+    day = date(2025, 11, 3)
+    append(log, power_line("2025-11-03 10:00:00", "CP1", 7000))
+    store.sync_log(log)
+    append(log, power_line("2025-11-03 10:01:00", "CP1", 7100), power_line("2025-11-03 10:02:00", "CP2", 3000))
+    store.sync_log(log)
+    store.sync_log(log)   # nada novo: nenhum pedaço vazio
+
+    chunks = glob.glob(str(tmp_path / "store" / "power" / "2025-11-03.*.part.npz"))
+    assert len(chunks) == 2
+    df = read_power(store, day)
+    assert df["potencia_W"].tolist() == [7000, 7100, 3000]
+    assert store.days("power") == [day]
+
+    # Evento de um dia posterior fecha o dia anterior: pedaços compactados
+    append(log, power_line("2025-11-04 00:00:05", "CP1", 6000))
+    store.sync_log(log)
+    assert not glob.glob(str(tmp_path / "store" / "power" / "2025-11-03.*.part.npz"))
+    assert os.path.exists(tmp_path / "store" / "power" / "2025-11-03.npz")
+    assert read_power(store, day)["potencia_W"].tolist() == [7000, 7100, 3000]
+    assert store.days("power") == [day, date(2025, 11, 4)]
+
+
+def test_chunks_already_compacted_are_not_read_twice(tmp_path):
+    store = EventStore(str(tmp_path / "store"))
+    columns = {"ts": [1762164000000], "serial": ["CP1"], "power_W": [7000.0]}
+    store.write("power", columns)
+    day = date(2025, 11, 3)
+    chunk = store._chunks("power", day)[0][2]
+    with open(chunk, "rb") as f:
+        saved = f.read()
+    store.compact("power", day)
+    # Queda entre a compactação e a remoção do pedaço: o pedaço volta ao disco
+    with open(chunk, "wb") as f:
+        f.write(saved)
+    assert read_power(store, day)["potencia_W"].tolist() == [7000]
+    store.write("power", {"ts": [1762164060000], "serial": ["CP1"], "power_W": [7100.0]})
+    assert read_power(store, day)["potencia_W"].tolist() == [7000, 7100]
+
+
+def test_disconnect_serials_cover_all_days(tmp_path):
+    store = EventStore(str(tmp_path / "store"))
+    log = str(tmp_path / "gateway.log")
+    append(log, disconnect_line("2025-11-03 10:00:00", "CP1"), disconnect_line("2025-11-04 10:00:00", "CP2"),
+           disconnect_line("2025-11-04 11:00:00", "CP2"))
+    store.sync_log(log)
+    assert store.serials("disconnect") == ["CP1", "CP2"]
+
+
+def test_disconnect_serials_come_from_the_index(tmp_path, monkeypatch):
+    store = EventStore(str(tmp_path / "store"))
+    log = str(tmp_path / "gateway.log")
+    append(log, disconnect_line("2025-11-03 10:00:00", "CP1"))
+    store.sync_log(log)
+    append(log, disconnect_line("2025-11-04 10:00:00", "CP2"))
+    store.sync_log(log)
+    assert os.path.exists(tmp_path / "store" / "disconnect" / "serials.json")
+
+    def no_partitions(*args, **kwargs):
+        raise AssertionError("serials() não deve abrir partições")
+    monkeypatch.setattr("event_store.np.load", no_partitions)
+    assert store.serials("disconnect") == ["CP1", "CP2"]
+
+
+def test_serial_index_is_rebuilt_for_an_older_store(tmp_path):
+    store = EventStore(str(tmp_path / "store"))
+    store.write("disconnect", {"ts": [1762164000000, 1762250400000], "serial": ["CP1", "CP2"]})
+    os.remove(tmp_path / "store" / "disconnect" / "serials.json")
+    assert store.serials("disconnect") == ["CP1", "CP2"]
+    assert os.path.exists(tmp_path / "store" / "disconnect" / "serials.json")
+
+
+def test_read_retries_when_a_chunk_is_compacted_away(tmp_path):
+    store = EventStore(str(tmp_path / "store"))
+    store.write("power", {"ts": [1762164000000], "serial": ["CP1"], "power_W": [7000.0]})
+    day = date(2025, 11, 3)
+    other = EventStore(str(tmp_path / "store"))
+    real_chunks = store._chunks
+    calls = []
+
+    def compacted_after_listing(kind, day=None):
+        # Outro processo compacta o dia logo depois da listagem dos pedaços
+        calls.append(day)
+        listed = real_chunks(kind, day)
+        if len(calls) == 1:
+            other.compact(kind, day)
+        return listed
+    store._chunks = compacted_after_listing
+    assert read_power(store, day)["potencia_W"].tolist() == [7000]
+    assert len(calls) == 2
+
+
+def test_backfill_sets_the_checkpoint_so_sync_does_not_duplicate(tmp_path):
+    from event_store import backfill
+    store = EventStore(str(tmp_path / "store"))
+    log = str(tmp_path / "gateway.log")
+    day = date(2025, 11, 3)
+    append(log, power_line("2025-11-03 10:00:00", "CP1", 7000))
+    store.sync_log(log)
+    append(log, power_line("2025-11-03 10:01:00", "CP1", 7100), "2025-11-03 10:02:00,000 - INFO - [STATE UPD")
+    backfill(store, [log])
+    assert read_power(store, day)["potencia_W"].tolist() == [7000, 7100]
+
+    store.sync_log(log)
+    assert read_power(store, day)["potencia_W"].tolist() == [7000, 7100]
+    # A linha que estava sendo escrita entra quando termina
+    append(log, "ATE CP2]: Potência atual: 3000.00W\n")
+    store.sync_log(log)
+    assert read_power(store, day)["potencia_W"].tolist() == [7000, 7100, 3000]
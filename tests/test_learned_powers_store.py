@@ -0,0 +1,53 @@
+import json
+import os
+import time
+
+from learned_powers_store import SKETCHES_KEY, LearnedPowersStore
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_updates_within_the_delay_become_one_write(tmp_path):
+    path = str(tmp_path / "learned_powers.json")
+    store = LearnedPowersStore(path, save_delay_s=0.1)
+    store.load({"CP1": 7400.0})
+    store.start()
+    store.update("CP1", 7400.0)   # sem mudança: nada a gravar
+    time.sleep(0.15)
+    assert not os.path.exists(path)
+
+    for power_W in (7500.0, 7600.0, 7700.0):
+        store.update("CP1", power_W)
+    store.update("CP2", 22000.0)
+    time.sleep(0.3)
+    assert store.writes == 1
+    assert read(path) == {"CP1": 7700.0, "CP2": 22000.0}
+    store.stop()
+    assert store.writes == 1
+
+
+def test_stop_flushes_pending_changes_before_the_delay(tmp_path):
+    path = str(tmp_path / "learned_powers.json")
+    store = LearnedPowersStore(path, save_delay_s=60.0)
+    store.start()
+    store.update("CP1", 7400.0)
+    store.update_sketches({"CP1": {"20395": "130:5"}})
+    store.stop()
+    assert not store.is_alive()
+    assert read(path) == {"CP1": 7400.0, SKETCHES_KEY: {"CP1": {"20395": "130:5"}}}
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_loaded_sketches_are_kept_on_the_next_write(tmp_path):
+    path = str(tmp_path / "learned_powers.json")
+    store = LearnedPowersStore(path, save_delay_s=60.0)
+    store.load({"CP1": 7400.0}, {"CP1": {"1": "2:3"}})
+    store.update_sketches({})   # nada alterado: não suja o estado
+    store.flush()
+    assert not os.path.exists(path)
+    store.update("CP2", 11000.0)
+    store.flush()
+    assert read(path) == {"CP1": 7400.0, "CP2": 11000.0, SKETCHES_KEY: {"CP1": {"1": "2:3"}}}
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+
+from load_groups import LoadGroup, LoadGroupTree, load_load_groups
+
+
+def tree():
+    return LoadGroupTree(LoadGroup("site", 30000, children=[
+        LoadGroup("alimentador-A", 15000, meter="ALIM-A", children=[
+            LoadGroup("quadro-1", 8000, chargers=["CP1", "CP2"]),
+            LoadGroup("quadro-2", 10000, chargers=["CP3"]),
+        ]),
+        LoadGroup("alimentador-B", 20000, chargers=["CP4"]),
+    ]))
+
+
+def allocate(groups, cp_ids, site_power_W=0.0):
+    n = len(cp_ids)
+    return groups.allocate(cp_ids, np.full(n, 7000.0), np.full(n, 11000.0), np.full(n, 7000.0), site_power_W)
+
+
+def test_no_group_gets_more_than_its_limit():
+    groups = tree()
+    cp_ids = ["CP1", "CP2", "CP3", "CP4", "CP9"]   # CP9 fora da configuração: direto no site
+    limits = dict(zip(cp_ids, allocate(groups, cp_ids)))
+    assert limits["CP1"] + limits["CP2"] <= 8000.0 + 1e-6
+    assert limits["CP1"] + limits["CP2"] + limits["CP3"] <= 15000.0 + 1e-6
+    assert sum(limits.values()) <= 30000.0 + 1e-6
+    assert groups.last_report["quadro-1"][2] == 2
+
+
+def test_submeter_other_load_reduces_group_budget():
+    groups = tree()
+    assert groups.meter_reading("ALIM-A") is None
+    assert groups.observe_meter("ALIM-A", 14000.0 + 6000.0)   # 6 kW de outras cargas
+    assert not groups.observe_meter("OUTRO", 1.0)
+    cp_ids = ["CP1", "CP3"]
+    limits = allocate(groups, cp_ids)
+    assert limits.sum() <= 15000.0 - 6000.0 + 1e-6
+
+
+def test_flat_tree_uses_site_limit(tmp_path):
+    groups = load_load_groups(str(tmp_path / "ausente.json"), 20000.0)
+    assert groups.is_flat()
+    limits = allocate(groups, ["CP1", "CP2", "CP3"], site_power_W=26000.0)
+    # 26 kW no site, 21 kW dos carregadores: 5 kW de outras cargas
+    assert limits.sum() <= 15000.0 + 1e-6
+
+
+def test_file_limit_is_capped_by_site_limit(tmp_path):
+    path = tmp_path / "load_groups.json"
+    path.write_text(json.dumps({"name": "site", "limit_W": 50000, "children": [
+        {"name": "quadro", "limit_W": 10000, "chargers": ["CP1"]}]}))
+    groups = load_load_groups(str(path), 20000.0)
+    assert groups.limit_W[0] == 20000.0
+    path.write_text(json.dumps({"name": "site"}))
+    assert load_load_groups(str(path), 20000.0).is_flat()
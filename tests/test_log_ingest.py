@@ -0,0 +1,63 @@
+import os
+
+from log_ingest import LogIngestor, feed_appended, has_appended, ingest_log_file
+
+
+def power_line(ts, cp_id, power_W):
+    return f"{ts},000 - INFO - [STATE UPDATE {cp_id}]: Potência atual: {power_W:.2f}W\n".encode("utf-8")
+
+
+def write(path, data, mode="ab"):
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def powers(ingestor):
+    return ingestor.result().power_frame()["potencia_W"].tolist()
+
+
+def test_partial_last_line_waits_for_next_read(tmp_path):
+    log = str(tmp_path / "gateway.log")
+    ingestor = LogIngestor()
+    write(log, power_line("2025-11-03 10:00:00", "CP1", 7000) + power_line("2025-11-03 10:01:00", "CP1", 7100)[:20])
+    offset, inode, _ = feed_appended(ingestor, log)
+    assert powers(ingestor) == [7000]
+    write(log, power_line("2025-11-03 10:01:00", "CP1", 7100)[20:])
+    assert has_appended(log, offset, inode)
+    offset, inode, size = feed_appended(ingestor, log, offset, inode)
+    assert powers(ingestor) == [7100]
+    assert offset == size and not has_appended(log, offset, inode)
+
+
+def test_rotation_reads_rest_of_old_file_then_new_one(tmp_path):
+    log = str(tmp_path / "gateway.log")
+    ingestor = LogIngestor()
+    write(log, power_line("2025-11-03 10:00:00", "CP1", 7000))
+    offset, inode, _ = feed_appended(ingestor, log)
+    ingestor.result()
+    # Linha escrita depois do último checkpoint e antes da rotação
+    write(log, power_line("2025-11-03 10:01:00", "CP1", 7100))
+    os.rename(log, str(tmp_path / "gateway.log.2025-11-03"))
+    write(log, power_line("2025-11-04 00:00:05", "CP1", 6000), mode="wb")
+    assert has_appended(log, offset, inode)
+    offset, inode, _ = feed_appended(ingestor, log, offset, inode)
+    assert powers(ingestor) == [7100, 6000]
+    assert offset == os.path.getsize(log)
+
+
+def test_truncated_file_restarts_from_start(tmp_path):
+    log = str(tmp_path / "gateway.log")
+    ingestor = LogIngestor()
+    write(log, power_line("2025-11-03 10:00:00", "CP1", 7000) * 3)
+    offset, inode, _ = feed_appended(ingestor, log)
+    ingestor.result()
+    write(log, power_line("2025-11-03 11:00:00", "CP2", 3000), mode="wb")
+    feed_appended(ingestor, log, offset, inode)
+    assert powers(ingestor) == [3000]
+
+
+def test_whole_file_ingest_includes_unterminated_line(tmp_path):
+    log = str(tmp_path / "gateway.log")
+    write(log, power_line("2025-11-03 10:00:00", "CP1", 7000) + power_line("2025-11-03 10:01:00", "CP2", 3000)[:-1])
+    df = ingest_log_file(log).power_frame()
+    assert df["serial_number"].astype(str).tolist() == ["CP1", "CP2"]
@@ -0,0 +1,62 @@
+from message_buffer import MessageBuffer
+
+
+def drain(buffer):
+    out = []
+    while True:
+        message = buffer.popleft()
+        if message is None:
+            return out
+        out.append(message)
+
+
+def test_priority_frames_go_first(tmp_path):
+    buffer = MessageBuffer("CP1", "to_charger", str(tmp_path))
+    buffer.append("a")
+    buffer.append_priority("stop")
+    buffer.append("b")
+    assert drain(buffer) == ["stop", "a", "b"]
+
+
+def test_nack_returns_frames_to_their_own_lane(tmp_path):
+    buffer = MessageBuffer("CP1", "to_charger", str(tmp_path))
+    buffer.append("a")
+    buffer.append("b")
+    buffer.append_priority("stop")
+    assert buffer.take() == "stop"
+    assert buffer.take() == "a"
+    buffer.nack()
+    # Chegou outro prioritário: o devolvido continua na frente dele e dos normais
+    buffer.append_priority("stop2")
+    assert buffer.occupancy()["priority"] == 2
+    assert drain(buffer) == ["stop", "stop2", "a", "b"]
+
+
+def test_overflow_goes_to_disk_and_keeps_order(tmp_path):
+    buffer = MessageBuffer("CP1", "to_csms", str(tmp_path), memory_cap=3, segment_messages=2)
+    for i in range(8):
+        buffer.append([2, str(i), "Heartbeat", {}])
+    assert buffer.occupancy()["disk"] == 5
+    assert len(buffer) == 8
+    assert [m[1] for m in drain(buffer)] == [str(i) for i in range(8)]
+    assert not list(tmp_path.iterdir())
+
+
+def test_segments_left_on_disk_are_resumed(tmp_path):
+    buffer = MessageBuffer("CP1", "to_csms", str(tmp_path), memory_cap=1, segment_messages=2)
+    for i in range(4):
+        buffer.append(i)
+    buffer._close_write_file()
+    # Nova execução: o que estava em memória se perdeu, o disco volta
+    resumed = MessageBuffer("CP1", "to_csms", str(tmp_path), memory_cap=1, segment_messages=2)
+    assert len(resumed) == 3
+    assert drain(resumed) == [1, 2, 3]
+
+
+def test_prepend_goes_before_memory_and_disk(tmp_path):
+    buffer = MessageBuffer("CP1", "to_csms", str(tmp_path), memory_cap=2, segment_messages=2)
+    for i in range(4):
+        buffer.append(i)
+    buffer.append_priority("stop")
+    buffer.prepend(["x", "y"])
+    assert drain(buffer) == ["stop", "x", "y", 0, 1, 2, 3]
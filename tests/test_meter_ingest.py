@@ -0,0 +1,21 @@
+import pytest
+
+from meter_ingest import meter_fields
+
+
+def test_meter_fields_parses_numbers_and_missing_keys():
+    assert meter_fields({"pt": "1500.5", "pa": 500, "pb": 500.5}) == (
+        {"pt": 1500.5, "pa": 500.0, "pb": 500.5, "pc": None}, {})
+
+
+@pytest.mark.parametrize("value", ["abc", "nan", "inf", [1], {"a": 1}, True])
+def test_invalid_phase_is_dropped_and_total_kept(value):
+    values, invalid = meter_fields({"pt": 1000, "pa": 300, "pb": 300, "pc": value})
+    assert values == {"pt": 1000.0, "pa": 300.0, "pb": 300.0, "pc": None}
+    assert invalid == {"pc": value}
+
+
+def test_invalid_total_is_reported():
+    values, invalid = meter_fields({"pt": "x", "pa": 300})
+    assert values["pt"] is None and values["pa"] == 300.0
+    assert invalid == {"pt": "x"}
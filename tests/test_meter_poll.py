@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from meter_poll import MeterPollScheduler
+
+
+async def no_op(cp_id):
+    return None
+
+
+def scheduler(**kwargs):
+    params = dict(base_interval_s=60.0, min_interval_s=15.0, max_interval_s=300.0,
+                  pressure_interval_s=30.0, volatile_delta_W=500.0, jitter=0.0)
+    params.update(kwargs)
+    return MeterPollScheduler(no_op, **params)
+
+
+def interval(poll, cp_id):
+    return poll._entries[cp_id][0]
+
+
+def test_interval_halves_on_volatile_load_and_grows_when_stable():
+    poll = scheduler()
+    poll._sync({"CP1"})
+    poll.observe("CP1", 7000.0)
+    assert interval(poll, "CP1") == 60.0   # primeira leitura: nada a comparar
+    poll.observe("CP1", 3000.0)
+    assert interval(poll, "CP1") == 30.0
+    poll.observe("CP1", 7000.0)
+    poll.observe("CP1", 1000.0)
+    assert interval(poll, "CP1") == 15.0   # não passa do mínimo
+    poll.observe("CP1", 1200.0)
+    assert interval(poll, "CP1") == 22.5
+    for _ in range(20):
+        poll.observe("CP1", 1200.0)
+    assert interval(poll, "CP1") == 300.0  # nem do máximo
+
+
+def test_reading_postpones_next_trigger():
+    poll = scheduler()
+    poll._sync({"CP1"})
+    before = time.monotonic()
+    poll.observe("CP1", 7000.0)
+    # Leitura espontânea: o próximo pedido fica um intervalo inteiro adiante
+    assert poll._entries["CP1"][1] >= before + 60.0
+    assert poll.postponed == 1
+
+
+def test_pressure_caps_interval_and_pulls_deadlines_in():
+    async def scenario():
+        poll = scheduler()
+        poll.poll_due(["CP1", "CP2"])
+        for cp_id in ("CP1", "CP2"):
+            for _ in range(5):
+                poll.observe(cp_id, 7000.0)
+        now = time.monotonic()
+        assert all(entry[1] > now + 30.0 for entry in poll._entries.values())
+        poll.poll_due(["CP1", "CP2"], pressure=True)
+        deadlines = [entry[1] for entry in poll._entries.values()]
+        stats = poll.stats()
+        poll.poll_due(["CP1", "CP2"], pressure=False)
+        return now, deadlines, stats, poll
+
+    now, deadlines, stats, poll = asyncio.run(scenario())
+    assert all(deadline <= now + 30.5 for deadline in deadlines)
+    assert stats["pressure"] and stats["mean_interval_s"] == 30.0
+    assert poll.stats()["mean_interval_s"] > 30.0
+
+
+def test_due_chargers_are_triggered_and_rescheduled():
+    async def scenario():
+        sent = []
+
+        async def trigger(cp_id):
+            sent.append(cp_id)
+        poll = MeterPollScheduler(trigger, base_interval_s=60.0, jitter=0.0)
+        poll._sync({"CP1", "CP2"})
+        for entry in poll._entries.values():
+            entry[1] = 0.0
+        poll._heap = [(0.0, "CP1"), (0.0, "CP2")]
+        assert poll.poll_due(["CP1", "CP2"]) == 2
+        assert poll.poll_due(["CP1", "CP2"]) == 0   # só no próximo intervalo
+        await asyncio.sleep(0.01)
+        # A resposta ao pedido não conta como leitura espontânea
+        poll.observe("CP1", 7000.0)
+        # Carregador que saiu da carga deixa de ser consultado
+        poll.poll_due(["CP1"])
+        return sorted(sent), poll
+
+    sent, poll = asyncio.run(scenario())
+    assert sent == ["CP1", "CP2"]
+    assert poll.triggers_sent == 2 and poll.postponed == 0
+    assert list(poll._entries) == ["CP1"]
+
+
+def test_failed_trigger_is_counted():
+    async def scenario():
+        async def offline(cp_id):
+            raise ConnectionError("carregador offline")
+        poll = MeterPollScheduler(offline, base_interval_s=60.0, jitter=0.0)
+        poll._sync({"CP1"})
+        poll._entries["CP1"][1] = 0.0
+        poll._heap = [(0.0, "CP1")]
+        poll.poll_due(["CP1"])
+        await asyncio.sleep(0.01)
+        return poll
+
+    poll = asyncio.run(scenario())
+    assert poll.send_failures == 1 and poll.triggers_sent == 0
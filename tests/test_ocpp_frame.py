@@ -0,0 +1,45 @@
+import json
+
+from ocpp_frame import CALL, CALL_ERROR, CALL_RESULT, OcppFrame, RawJson, encode_packet
+from uplink import encode_batch
+
+
+def packet(data):
+    return {"source": "carregador", "charge_point_id": "CP1", "data": data}
+
+
+def test_envelope_fields():
+    frame = OcppFrame('[2, "abc", "StatusNotification", {"status": "Charging"}]')
+    assert (frame.valid, frame.msg_type_id, frame.msg_id, frame.action) == (True, CALL, "abc", "StatusNotification")
+    assert frame.payload == {"status": "Charging"}
+    assert OcppFrame('[3, "abc", {"status": "Accepted"}]').payload == {"status": "Accepted"}
+    error = OcppFrame('[4, "abc", "NotSupported", "x", {"k": 1}]')
+    assert (error.msg_type_id, error.payload) == (CALL_ERROR, {"k": 1})
+    assert OcppFrame(b'[3, "abc", {}]').msg_type_id == CALL_RESULT
+
+
+def test_msg_id_is_unescaped():
+    frame = OcppFrame(r'[3, "a\"bé", {}]')
+    assert frame.msg_id == 'a"bé'
+
+
+def test_invalid_json_is_not_valid_and_goes_up_as_a_string():
+    frame = OcppFrame('[2,"id","Heartbeat",{oops]')
+    assert not frame.valid and not frame.is_json
+    data = frame.uplink_data()
+    assert not isinstance(data, RawJson)
+    assert json.loads(encode_packet(packet(data)))["data"] == '[2,"id","Heartbeat",{oops]'
+
+
+def test_json_that_is_not_ocpp_is_not_valid():
+    for text in ('{"a": 1}', '[5, "id", "X", {}]', '[2, 7, "X", {}]', '[2, "id", 3, {}]', '[3, "id"]', '[true, "id", {}]'):
+        frame = OcppFrame(text)
+        assert frame.is_json and not frame.valid, text
+        assert json.loads(encode_packet(packet(frame.uplink_data())))["data"] == json.loads(text)
+
+
+def test_one_bad_frame_does_not_poison_the_batch():
+    texts = ['[2, "1", "Heartbeat", {}]', '[2,"id","Heartbeat",{oops]', '[3, "2", {"currentTime": "x"}]']
+    batch = [packet(OcppFrame(text).uplink_data()) for text in texts]
+    decoded = json.loads(encode_batch(batch))
+    assert [p["data"] for p in decoded] == [[2, "1", "Heartbeat", {}], texts[1], [3, "2", {"currentTime": "x"}]]
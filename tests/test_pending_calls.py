@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from pending_calls import CallError, PendingCalls, RttHistogram
+
+
+def test_response_resolves_future_and_records_rtt():
+    async def scenario():
+        calls = PendingCalls(ttl_s=30.0)
+        future = calls.register("CP1", "m1", "TriggerMessage")
+        assert ("CP1", "m1") in calls
+        assert calls.resolve("CP1", "m1", {"status": "Accepted"})[0] == "TriggerMessage"
+        return calls, await future
+
+    calls, payload = asyncio.run(scenario())
+    assert payload == {"status": "Accepted"}
+    assert len(calls) == 0
+    assert calls.summary("TriggerMessage")["CP1"]["count"] == 1
+    # Resposta repetida (ou de id desconhecido) não é do gateway
+    assert calls.resolve("CP1", "m1") is None
+
+
+def test_call_error_is_raised_to_the_caller():
+    async def scenario():
+        calls = PendingCalls()
+        future = calls.register("CP1", "m1", "SetChargingProfile")
+        calls.resolve("CP1", "m1", error=CallError("NotSupported", "sem perfis"))
+        with pytest.raises(CallError) as info:
+            await future
+        return info.value
+
+    assert asyncio.run(scenario()).error_code == "NotSupported"
+
+
+def test_ttl_expiry_times_out_and_frees_the_entry():
+    async def scenario():
+        calls = PendingCalls(ttl_s=10.0)
+        late = calls.register("CP1", "late", "TriggerMessage")
+        short = calls.register("CP1", "short", "TriggerMessage", ttl_s=1.0)
+        now = time.monotonic()
+        assert calls.expire(now) == 0
+        assert calls.expire(now + 2.0) == 1
+        assert ("CP1", "short") not in calls and ("CP1", "late") in calls
+        with pytest.raises(asyncio.TimeoutError):
+            await short
+        # Resposta depois do prazo não casa mais
+        assert calls.resolve("CP1", "short") is None
+        assert calls.expire(now + 11.0) == 1
+        assert late.done()
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert len(calls) == 0 and calls.expired == 2
+    assert calls.summary("TriggerMessage")["CP1"]["timeouts"] == 2
+
+
+def test_answered_call_is_not_expired_later():
+    async def scenario():
+        calls = PendingCalls(ttl_s=1.0)
+        calls.register("CP1", "m1", "TriggerMessage")
+        calls.resolve("CP1", "m1", {})
+        return calls.expire(time.monotonic() + 5.0), calls
+
+    expired, calls = asyncio.run(scenario())
+    assert expired == 0 and calls.expired == 0
+
+
+def test_discard_and_drop_charger_cancel_without_timeouts():
+    async def scenario():
+        calls = PendingCalls(ttl_s=1.0)
+        unsent = calls.register("CP1", "m1", "SetChargingProfile")
+        calls.discard("CP1", "m1")
+        other = calls.register("CP2", "m2", "TriggerMessage")
+        kept = calls.register("CP3", "m3", "TriggerMessage")
+        calls.drop_charger("CP2")
+        expired = calls.expire(time.monotonic() + 5.0)
+        return unsent, other, kept, expired, calls
+
+    unsent, other, kept, expired, calls = asyncio.run(scenario())
+    assert unsent.cancelled() and other.cancelled()
+    assert expired == 1 and isinstance(kept.exception(), asyncio.TimeoutError)
+    assert "CP2" not in calls.summary("TriggerMessage")
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    hist = RttHistogram()
+    for rtt_ms in (10, 20, 30, 40, 200, 240, 260, 900, 1200, 45000):
+        hist.add(rtt_ms)
+    assert hist.percentile(0.5) == 250
+    assert hist.percentile(0.95) == 45000
+    assert RttHistogram().percentile(0.5) is None
+    single = RttHistogram()
+    single.add(12.34)
+    assert single.percentile(0.5) == 12.3
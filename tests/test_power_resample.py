@@ -0,0 +1,96 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from log_ingest import ingest_log_file
+from power_resample import event_means_no_ramps, resample_no_ramps
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "external_data", "log_2025-11-03_11-01-27.log")
+
+
+def baseline_minute_means(log_file, tolerance_minutes=2):
+    # parse_log + laço de plot_chargers_and_total_per_day do script de análise original
+    statusnotif_re = re.compile(r'\[FROM CHARGER ([^]]+)\]:.*StatusNotification.*"status"\s*:\s*"([A-Za-z]+)"')
+    power_re = re.compile(r'\[STATE UPDATE ([^]]+)\]: Potência atual: ([\d.]+)W')
+    chargers, status_events, all_times = {}, {}, set()
+    with open(log_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                timestamp = datetime.strptime(line.split(" - ")[0], "%Y-%m-%d %H:%M:%S,%f")
+            except Exception:
+                continue
+            all_times.add(timestamp)
+            m = statusnotif_re.search(line)
+            if m:
+                status_events.setdefault(m.group(1).strip(), []).append({"timestamp": timestamp, "status": m.group(2)})
+            m = power_re.search(line)
+            if m:
+                chargers.setdefault(m.group(1).strip(), []).append({"timestamp": timestamp, "power": float(m.group(2))})
+    cp_ids = sorted(set(chargers) | set(status_events))
+    frames = {}
+    for day in sorted({t.date() for t in all_times}):
+        last_power = {cp_id: 0 for cp_id in cp_ids}
+        last_status = {cp_id: "Available" for cp_id in cp_ids}
+        status_idx = {cp_id: 0 for cp_id in cp_ids}
+        last_power_time = {cp_id: None for cp_id in cp_ids}
+        data = []
+        for t in sorted(t for t in all_times if t.date() == day):
+            row = {"timestamp": t}
+            total = 0
+            for cp_id in cp_ids:
+                statuses = status_events.get(cp_id, [])
+                while status_idx[cp_id] < len(statuses) and statuses[status_idx[cp_id]]["timestamp"] <= t:
+                    last_status[cp_id] = statuses[status_idx[cp_id]]["status"]
+                    status_idx[cp_id] += 1
+                event = next((e for e in chargers.get(cp_id, []) if e["timestamp"] == t), None)
+                if event is not None:
+                    last_power[cp_id] = event["power"]
+                    last_power_time[cp_id] = t
+                charging = last_status[cp_id] == "Charging" or (
+                    last_power_time[cp_id] is not None and t - last_power_time[cp_id] <= timedelta(minutes=tolerance_minutes))
+                if not charging:
+                    last_power[cp_id] = 0
+                row[cp_id] = last_power[cp_id]
+                total += last_power[cp_id]
+            row["total_power"] = total
+            data.append(row)
+        df = pd.DataFrame(data)
+        df["minute"] = df["timestamp"].dt.floor("min")
+        frames[day] = df.drop(columns="timestamp").groupby("minute").mean().reset_index().rename(columns={"minute": "timestamp"})
+    return cp_ids, frames
+
+
+def test_event_means_match_original_analysis_loop_on_sample_log():
+    cp_ids, expected = baseline_minute_means(SAMPLE_LOG)
+    log = ingest_log_file(SAMPLE_LOG)
+    df_power, df_status = log.power_frame(), log.status_frame()
+    times = log.line_times()
+    assert sorted(set(df_power["serial_number"]) | set(df_status["serial_number"])) == cp_ids
+    for day, df_expected in expected.items():
+        got = event_means_no_ramps(df_power[df_power["timestamp"].dt.date == day], df_status, cp_ids,
+                                   times[times.dt.date == day])
+        assert got["timestamp"].tolist() == df_expected["timestamp"].tolist()
+        for column in cp_ids + ["total_power"]:
+            assert np.allclose(got[column].to_numpy(), df_expected[column].to_numpy(), rtol=0, atol=0.01), column
+
+
+def test_resample_uses_last_power_while_charging_or_recent():
+    df_power = pd.DataFrame({
+        "timestamp": pd.to_datetime(["2025-11-03 10:00:10", "2025-11-03 10:05:10"]),
+        "serial_number": ["CP1", "CP1"],
+        "potencia_W": [7000.0, 3000.0],
+    })
+    df_status = pd.DataFrame({
+        "timestamp": pd.to_datetime(["2025-11-03 10:05:00"]),
+        "serial_number": ["CP1"],
+        "status": ["Charging"],
+    })
+    minutes = pd.date_range("2025-11-03 10:00", "2025-11-03 10:07", freq="min")
+    df = resample_no_ramps(df_power, df_status, ["CP1"], minutes)
+    # 10:00 sem amostra até o minuto; 10:01-10:02 dentro da tolerância; 10:03-10:04 parado
+    assert df["CP1"].tolist() == [0.0, 7000.0, 7000.0, 0.0, 0.0, 7000.0, 3000.0, 3000.0]
+    assert df["total_power"].tolist() == df["CP1"].tolist()
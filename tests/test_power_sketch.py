@@ -0,0 +1,63 @@
+import numpy as np
+
+from power_sketch import LearnedPowerEstimator, PowerSketch
+
+DAY_S = 86400.0
+
+
+def test_quantiles_within_relative_accuracy():
+    sketch = PowerSketch(relative_accuracy=0.02)
+    values = np.random.default_rng(0).uniform(1000.0, 22000.0, 5000)
+    for value in values:
+        sketch.add(value, timestamp=0.0)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= exact * 0.021, q
+    assert PowerSketch().quantile(0.5) is None
+
+
+def test_oldest_sub_window_expires_whole():
+    sketch = PowerSketch(window_s=7 * DAY_S, sub_windows=7)
+    for _ in range(10):
+        sketch.add(11000.0, timestamp=0.5 * DAY_S)
+    for _ in range(10):
+        sketch.add(7000.0, timestamp=3.5 * DAY_S)
+    assert abs(sketch.quantile(1.0, now=6.9 * DAY_S) - 11000.0) <= 11000.0 * 0.02
+    # Passou uma semana da primeira leitura: a janela do dia 0 sai inteira
+    assert abs(sketch.quantile(1.0, now=7.1 * DAY_S) - 7000.0) <= 7000.0 * 0.02
+    assert sketch.count == 10
+    assert sketch.quantile(0.5, now=10.6 * DAY_S) is None
+    assert not sketch._totals
+
+
+def test_state_round_trip_drops_expired_windows():
+    sketch = PowerSketch(window_s=7 * DAY_S, sub_windows=7)
+    sketch.add(7000.0, timestamp=0.0)
+    sketch.add(7400.0, timestamp=2 * DAY_S)
+    restored = PowerSketch(window_s=7 * DAY_S, sub_windows=7)
+    restored.load_state(sketch.to_state(), now=2 * DAY_S)
+    assert restored.count == 2 and restored.quantile(1.0) == sketch.quantile(1.0)
+    restored.load_state(sketch.to_state(), now=7.5 * DAY_S)
+    assert restored.count == 1
+
+
+def test_isolated_spike_does_not_raise_learned_power():
+    estimator = LearnedPowerEstimator(quantile=0.99, headroom=0.02, min_samples=60)
+    learned_W = 7400.0
+    for i in range(300):
+        power_W = 15000.0 if i == 150 else 7000.0
+        estimate = estimator.observe("CP1", power_W, learned_W, limit_W=learned_W, timestamp=float(i))
+        if estimate is not None:
+            learned_W = estimate
+    assert abs(learned_W - 7000.0 * 1.02) <= 7000.0 * 0.03
+
+
+def test_readings_clamped_by_gateway_limit_are_skipped():
+    estimator = LearnedPowerEstimator(min_samples=1)
+    assert estimator.observe("CP1", 3000.0, learned_W=7400.0, limit_W=3000.0, timestamp=0.0) is None
+    assert estimator.skipped_limited == 1 and "CP1" not in estimator.sketches
+    # Abaixo do mínimo de amostras vale a regra antiga: só sobe
+    estimator = LearnedPowerEstimator(min_samples=60)
+    assert estimator.observe("CP1", 7600.0, learned_W=7400.0, limit_W=7400.0, timestamp=0.0) == 7600.0
+    assert estimator.observe("CP1", 5000.0, learned_W=7600.0, limit_W=7600.0, timestamp=1.0) is None
+    assert set(estimator.take_dirty()) == {"CP1"} and estimator.take_dirty() == {}
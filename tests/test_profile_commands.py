@@ -0,0 +1,127 @@
+import asyncio
+
+from profile_commands import ProfileCommands
+
+
+class FakeCharger:
+    """Guarda cada SetChargingProfile enviado; a resposta sai quando o teste manda."""
+
+    def __init__(self):
+        self.sent = []
+        self.responses = []
+
+    async def send(self, cp_id, limit_W):
+        future = asyncio.get_running_loop().create_future()
+        self.sent.append((cp_id, limit_W))
+        self.responses.append(future)
+        return future
+
+    def answer(self, status="Accepted"):
+        self.responses.pop(0).set_result({"status": status})
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_limits_coalesce_while_one_is_in_flight_and_latest_wins():
+    async def scenario():
+        charger = FakeCharger()
+        commands = ProfileCommands(charger.send)
+        commands.set_limit("CP1", 7000.0)
+        await settle()
+        # Em voo: os próximos substituem o pendente, vale o último
+        commands.set_limit("CP1", 5000.0)
+        commands.set_limit("CP1", 4000.0)
+        commands.set_limit("CP1", 3000.0)
+        assert commands.in_flight() == 1
+        charger.answer()
+        await settle()
+        charger.answer()
+        await settle()
+        return charger, commands
+
+    charger, commands = asyncio.run(scenario())
+    assert charger.sent == [("CP1", 7000.0), ("CP1", 3000.0)]
+    assert commands.coalesced == 2
+    assert commands.stats()["issued"] == 2 and commands.in_flight() == 0
+
+
+def test_acknowledged_limit_is_not_resent():
+    async def scenario():
+        charger = FakeCharger()
+        commands = ProfileCommands(charger.send)
+        commands.set_limit("CP1", 7000.0)
+        await settle()
+        charger.answer()
+        await settle()
+        # Dentro da tolerância de 1% do confirmado
+        assert not commands.set_limit("CP1", 7050.0)
+        assert commands.set_limit("CP1", 6000.0)
+        await settle()
+        return charger, commands
+
+    charger, commands = asyncio.run(scenario())
+    assert charger.sent == [("CP1", 7000.0), ("CP1", 6000.0)]
+    assert commands.skipped == 1
+
+
+def test_pending_limit_back_to_acknowledged_is_skipped():
+    async def scenario():
+        charger = FakeCharger()
+        commands = ProfileCommands(charger.send)
+        commands.set_limit("CP1", 7000.0)
+        await settle()
+        charger.answer()
+        await settle()
+        commands.set_limit("CP1", 5000.0)
+        await settle()
+        commands.set_limit("CP1", 6000.0)
+        commands.set_limit("CP1", 5000.0)   # igual ao em voo: nada a fazer
+        commands.set_limit("CP1", 7000.0)
+        charger.answer()
+        await settle()
+        return charger, commands
+
+    charger, commands = asyncio.run(scenario())
+    # 7000 volta a ser diferente do confirmado (5000): é enviado
+    assert charger.sent == [("CP1", 7000.0), ("CP1", 5000.0), ("CP1", 7000.0)]
+
+
+def test_rejection_and_timeout_mark_the_charger_unconfirmed():
+    async def scenario():
+        charger = FakeCharger()
+        commands = ProfileCommands(charger.send, deadline_s=0.05)
+        commands.set_limit("CP1", 7000.0)
+        commands.set_limit("CP2", 7000.0)
+        await settle()
+        charger.answer("Rejected")   # CP1
+        await asyncio.sleep(0.1)     # CP2 sem resposta
+        unconfirmed = set(commands.unconfirmed)
+        # O mesmo limite volta a ser enviado: o confirmado é desconhecido
+        assert commands.set_limit("CP2", 7000.0)
+        await settle()
+        charger.responses.pop(0)   # resposta que nunca chegou
+        charger.answer()
+        await settle()
+        return unconfirmed, charger, commands
+
+    unconfirmed, charger, commands = asyncio.run(scenario())
+    assert unconfirmed == {"CP1", "CP2"}
+    assert commands.failed == 1 and commands.timed_out == 1
+    assert charger.sent[-1] == ("CP2", 7000.0)
+    assert commands.unconfirmed == {"CP1"}
+
+
+def test_failed_send_is_counted():
+    async def scenario():
+        async def no_connection(cp_id, limit_W):
+            return None
+        commands = ProfileCommands(no_connection)
+        commands.set_limit("CP1", 7000.0)
+        await settle()
+        return commands
+
+    commands = asyncio.run(scenario())
+    assert commands.failed == 1 and commands.unconfirmed == {"CP1"}
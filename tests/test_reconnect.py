@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from reconnect import ReconnectManager
+
+
+async def refused():
+    raise ConnectionRefusedError("CSMS fora do ar")
+
+
+async def accepted():
+    return "websocket"
+
+
+def fail(manager, key, times):
+    async def scenario():
+        for _ in range(times):
+            with pytest.raises(ConnectionRefusedError):
+                await manager.connect(key, refused)
+    asyncio.run(scenario())
+
+
+def test_backoff_grows_with_failures_and_is_capped(monkeypatch):
+    manager = ReconnectManager(base_delay_s=1.0, max_delay_s=60.0, fast_retry_s=0.5)
+    monkeypatch.setattr("reconnect.random.uniform", lambda low, high: high)
+    # Primeira queda de uma conexão saudável: caminho rápido
+    assert manager.next_delay("CP1") == 0.5
+    bounds = []
+    for _ in range(7):
+        fail(manager, "CP1", 1)
+        bounds.append(manager.next_delay("CP1"))
+    assert bounds == [2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0]
+    assert manager.stats()["backing_off"] == 1
+
+
+def test_healthy_connection_resets_backoff_and_flapping_does_not(monkeypatch):
+    manager = ReconnectManager(base_delay_s=1.0, healthy_after_s=30.0, fast_retry_s=0.5)
+    monkeypatch.setattr("reconnect.random.uniform", lambda low, high: high)
+    fail(manager, "CP1", 3)
+    asyncio.run(manager.connect("CP1", accepted))
+    # Caiu logo depois de abrir: o backoff continua crescendo
+    assert manager.next_delay("CP1") == 16.0
+    asyncio.run(manager.connect("CP1", accepted))
+    manager._connected_at["CP1"] -= 31.0
+    assert manager.next_delay("CP1") == 0.5
+
+
+def test_recovery_wakes_chargers_in_backoff():
+    async def scenario():
+        manager = ReconnectManager(base_delay_s=10.0, max_delay_s=10.0)
+        for key in ("CP1", "CP2"):
+            with pytest.raises(ConnectionRefusedError):
+                await manager.connect(key, refused)
+        manager.next_delay = lambda key: 10.0   # backoff longo, sem sorteio
+        waiter = asyncio.ensure_future(manager.wait_before_retry("CP2"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        # O CSMS voltou: o handshake do CP1 passa e o CP2 tenta já
+        await manager.connect("CP1", accepted)
+        waited = await asyncio.wait_for(waiter, timeout=1.0)
+        return waited, manager
+
+    waited, manager = asyncio.run(scenario())
+    assert waited < 1.0
+    assert manager.recoveries == 1
+
+
+def test_flapping_connection_does_not_wake_anyone():
+    async def scenario():
+        manager = ReconnectManager()
+        with pytest.raises(ConnectionRefusedError):
+            await manager.connect("CP2", refused)
+        manager.next_delay = lambda key: 0.1
+        waiter = asyncio.ensure_future(manager.wait_before_retry("CP2"))
+        await asyncio.sleep(0.01)
+        await manager.connect("CP1", accepted)   # nunca falhou no handshake
+        start = time.monotonic()
+        await waiter
+        return time.monotonic() - start, manager
+
+    waited, manager = asyncio.run(scenario())
+    assert waited >= 0.05 and manager.recoveries == 0
+
+
+def test_handshakes_respect_the_concurrency_cap():
+    async def scenario():
+        manager = ReconnectManager(max_concurrent_handshakes=2)
+        active, peak = [0], [0]
+
+        async def slow_handshake():
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+            return "websocket"
+        await asyncio.gather(*(manager.connect(f"CP{i}", slow_handshake) for i in range(6)))
+        return peak[0], manager
+
+    peak, manager = asyncio.run(scenario())
+    assert peak == 2
+    stats = manager.stats()
+    assert stats["successes"] == 6 and stats["handshaking"] == 0 and stats["waiting"] == 0
+    assert stats["connect_ms"]["count"] == 6
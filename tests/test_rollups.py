@@ -0,0 +1,54 @@
+import csv
+import os
+from datetime import date, datetime
+
+from rollups import MinuteRollup, RollupWriter, load_rollups
+
+
+def read_rows(directory, day):
+    with open(os.path.join(directory, f"rollup_{day}.csv"), encoding="utf-8") as f:
+        return [(r["minute"], r["key"], r["sum"], r["count"], r["min"], r["max"]) for r in csv.DictReader(f)]
+
+
+def test_flush_writes_closed_minutes_only(tmp_path):
+    rollups = MinuteRollup(str(tmp_path))
+    rollups.observe("charger_power_W", "CP1", 7000, now=datetime(2025, 11, 3, 10, 0, 5))
+    rollups.observe("charger_power_W", "CP1", 9000, now=datetime(2025, 11, 3, 10, 0, 45))
+    rollups.observe("charger_power_W", "CP1", 8000, now=datetime(2025, 11, 3, 10, 1, 5))
+    assert rollups.flush(now=datetime(2025, 11, 3, 10, 1, 30)) == 1
+    assert read_rows(tmp_path, "2025-11-03") == [("2025-11-03 10:00", "CP1", "16000.00", "2", "7000.00", "9000.00")]
+    assert rollups.flush(now=datetime(2025, 11, 3, 10, 1, 40)) == 0
+    assert rollups.flush(now=datetime(2025, 11, 3, 10, 1, 40), include_current=True) == 1
+
+
+def test_flush_goes_through_writer_thread_and_splits_days(tmp_path):
+    writer = RollupWriter(str(tmp_path))
+    writer.start()
+    rollups = MinuteRollup(str(tmp_path), writer=writer)
+    rollups.observe("site_power_W", "site", 1000.0, now=datetime(2025, 11, 3, 23, 58, 10))
+    rollups.observe("site_power_W", "site", 2000.0, now=datetime(2025, 11, 3, 23, 59, 10))
+    rollups.observe("site_power_W", "site", 3000.0, now=datetime(2025, 11, 4, 0, 0, 10))
+    rollups.observe("site_power_W", "site", 5000.0, now=datetime(2025, 11, 4, 0, 0, 30))
+    assert rollups.flush(now=datetime(2025, 11, 4, 0, 1)) == 3
+    writer.stop()
+    assert writer.written == 3
+    assert len(read_rows(tmp_path, "2025-11-03")) == 2
+    df = load_rollups(str(tmp_path), date(2025, 11, 3), date(2025, 11, 4), "site_power_W")
+    assert df["mean"].tolist() == [1000.0, 2000.0, 4000.0]
+
+
+def test_late_sample_for_flushed_minute_is_merged_on_load(tmp_path):
+    rollups = MinuteRollup(str(tmp_path))
+    rollups.observe("charger_power_W", "CP1", 7000, now=datetime(2025, 11, 3, 10, 0, 5))
+    rollups.observe("charger_power_W", "CP2", 3000, now=datetime(2025, 11, 3, 10, 0, 5))
+    rollups.flush(now=datetime(2025, 11, 3, 10, 1, 0))
+    # MeterValues atrasado com o timestamp do carregador: minuto já gravado
+    rollups.observe("charger_power_W", "CP1", 9000, now=datetime(2025, 11, 3, 10, 0, 50))
+    rollups.flush(now=datetime(2025, 11, 3, 10, 2, 0))
+    assert len(read_rows(tmp_path, "2025-11-03")) == 3
+
+    df = load_rollups(str(tmp_path), date(2025, 11, 3), date(2025, 11, 3), "charger_power_W")
+    assert df[["key", "count", "min", "max", "mean"]].values.tolist() == [
+        ["CP1", 2, 7000.0, 9000.0, 8000.0],
+        ["CP2", 1, 3000.0, 3000.0, 3000.0],
+    ]
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+from message_buffer import MessageBuffer
+from send_queue import LinkWriter
+
+
+class FakeSocket:
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.fail_after = fail_after
+
+    async def send(self, message):
+        await asyncio.sleep(0)
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise ConnectionError("link caiu")
+        self.sent.append(message)
+
+
+def test_spill_mode_ends_with_live_rate_above_drain_rate(tmp_path):
+    async def scenario():
+        socket = FakeSocket()
+        buffer = MessageBuffer("CP1", "to_csms", str(tmp_path))
+        writer = LinkWriter("CP1", socket, buffer, maxsize=5, drain_max_per_s=10)
+        for i in range(20):   # rajada: a fila enche e o resto transborda
+            writer.offer(i)
+        assert writer._spilling
+        writer.start()
+        # Link a ~200 frames/s, bem acima dos 10/s do esvaziamento
+        for i in range(20, 120):
+            writer.offer(i)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.05)
+        writer.close()
+        return socket.sent, writer
+
+    sent, writer = asyncio.run(scenario())
+    assert sent == list(range(120))
+    assert not writer._spilling
+    assert writer.spilled >= 15
+
+
+def test_disconnect_backlog_still_drains_at_limit(tmp_path):
+    async def scenario():
+        socket = FakeSocket()
+        buffer = MessageBuffer("CP1", "to_csms", str(tmp_path))
+        for i in range(10):
+            buffer.append(i)
+        writer = LinkWriter("CP1", socket, buffer, drain_max_per_s=100).start()
+        start = time.monotonic()
+        while len(buffer):
+            await asyncio.sleep(0.005)
+        elapsed = time.monotonic() - start
+        writer.close()
+        return socket.sent, elapsed
+
+    sent, elapsed = asyncio.run(scenario())
+    assert sent == list(range(10))
+    assert elapsed >= 0.08
+
+
+def test_failed_send_returns_frames_to_buffer_in_order(tmp_path):
+    async def scenario():
+        socket = FakeSocket(fail_after=2)
+        buffer = MessageBuffer("CP1", "to_csms", str(tmp_path))
+        writer = LinkWriter("CP1", socket, buffer)
+        for i in range(5):
+            writer.offer(i)
+        writer.start()
+        await asyncio.sleep(0.05)
+        return socket.sent, buffer, writer
+
+    sent, buffer, writer = asyncio.run(scenario())
+    assert sent == [0, 1]
+    assert writer.closed
+    assert [buffer.popleft() for _ in range(3)] == [2, 3, 4]
+
+
+def test_failed_send_puts_queued_frames_before_the_spilled_tail(tmp_path):
+    async def scenario():
+        socket = FakeSocket(fail_after=1)
+        buffer = MessageBuffer("CP1", "to_csms", str(tmp_path))
+        buffer.append("backlog")
+        writer = LinkWriter("CP1", socket, buffer, maxsize=3)
+        for i in range(6):   # 0..2 na fila, 3..5 transbordam
+            writer.offer(i)
+        writer.start()
+        await asyncio.sleep(0.05)
+        return socket.sent, buffer
+
+    sent, buffer = asyncio.run(scenario())
+    assert sent == [0]
+    assert [buffer.popleft() for _ in range(len(buffer))] == [1, 2, "backlog", 3, 4, 5]
+
+
+def test_failed_drain_keeps_the_buffer_frame_first(tmp_path):
+    async def scenario():
+        buffer = MessageBuffer("CP1", "to_csms", str(tmp_path))
+        buffer.append("a")
+        buffer.append("b")
+
+        class SlowFailingSocket(FakeSocket):
+            async def send(self, message):
+                writer.offer("live")   # chega durante o envio do frame do buffer
+                await asyncio.sleep(0)
+                raise ConnectionError("link caiu")
+        writer = LinkWriter("CP1", SlowFailingSocket(), buffer, drain_max_per_s=0)
+        writer.start()
+        await asyncio.sleep(0.05)
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert [buffer.popleft() for _ in range(len(buffer))] == ["a", "live", "b"]
+
+
+def test_cancel_while_waiting_keeps_the_taken_frame_first(tmp_path):
+    async def scenario():
+        socket = FakeSocket()
+        buffer = MessageBuffer("CP1", "to_csms", str(tmp_path))
+        writer = LinkWriter("CP1", socket, buffer)
+        writer._queue.put_nowait(1)
+        writer._queue.put_nowait(2)
+        writer._taken_live = 0   # saiu da fila no instante do cancelamento
+        writer._return_to_buffer(None, False)
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert [buffer.popleft() for _ in range(len(buffer))] == [0, 1, 2]
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+import threading
+
+from spool import TelemetrySpool
+from uplink import UplinkSender
+
+
+def read_ack(directory):
+    with open(os.path.join(directory, "ack.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_replay_resumes_from_ack_after_restart(tmp_path):
+    spool = TelemetrySpool(str(tmp_path), segment_max_bytes=64)
+    spool.append([{"n": i} for i in range(5)])
+    spool.append([{"n": i} for i in range(5, 10)])
+    records, position = spool.read(4)
+    assert [r["n"] for r in records] == [0, 1, 2, 3]
+    spool.ack(position, force=True)
+    spool.close()
+
+    reopened = TelemetrySpool(str(tmp_path), segment_max_bytes=64)
+    assert reopened.has_pending()
+    records, position = reopened.read(100)
+    assert [r["n"] for r in records] == list(range(4, 10))
+    reopened.ack(position)
+    assert not reopened.has_pending()
+    # Segmentos já reenviados foram apagados
+    assert [name for name in os.listdir(tmp_path) if name.startswith("seg_")] == []
+
+
+def test_ack_checkpoints_are_throttled(tmp_path):
+    spool = TelemetrySpool(str(tmp_path), ack_interval_s=3600.0)
+    spool.append([{"n": i} for i in range(10)])
+    for _ in range(5):
+        _, position = spool.read(1)
+        spool.ack(position)
+    assert not os.path.exists(tmp_path / "ack.json")
+    spool.close()   # o ack pendente é gravado no desligamento
+    assert read_ack(tmp_path)["offset"] == position[1]
+
+
+class FakeSocket:
+
+    def __init__(self):
+        self.closed = False
+        self.frames = []
+
+    async def send(self, data):
+        self.frames.append(json.loads(data))
+
+
+def test_uplink_spills_and_replays_in_order_off_the_loop(tmp_path):
+    spool = TelemetrySpool(str(tmp_path))
+    io_threads = set()
+    for name in ("append", "read", "ack"):
+        method = getattr(spool, name)
+        setattr(spool, name, lambda *args, _m=method: (io_threads.add(threading.current_thread().name), _m(*args))[1])
+    sender = UplinkSender(maxsize=10, batch_max_messages=5, batch_interval_s=0.01, spool=spool, replay_max_per_s=1000)
+    socket = FakeSocket()
+    state = {"socket": None}
+
+    async def scenario():
+        task = asyncio.get_running_loop().create_task(sender.run(lambda: state["socket"]))
+        for i in range(25):          # uplink fora: a fila vai para o spool
+            sender.enqueue({"n": i})
+        await asyncio.sleep(0.05)
+        state["socket"] = socket
+        for i in range(25, 30):      # ao vivo, depois da reconexão
+            sender.enqueue({"n": i})
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if not sender.stats()["spool_pending"] and not sender.stats()["queue_depth"]:
+                break
+        task.cancel()
+
+    asyncio.run(scenario())
+    sent = [packet["n"] for frame in socket.frames for packet in frame]
+    assert sorted(sent) == list(range(30))
+    replayed = [n for n in sent if n < 25]
+    assert replayed == sorted(replayed)
+    assert io_threads and all(name.startswith("uplink-spool") for name in io_threads)
+    sender.close()
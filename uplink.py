@@ -0,0 +1,204 @@
+#----------------------------------------------------------
+# Envio em lote para o WebSocket de dados externo (TCHARGE/UFPB).
+#
+# Todos os pacotes brutos (carregadores e medidor) entram numa fila
+# limitada; uma única tarefa os agrupa e envia um frame JSON (lista de
+# pacotes) a cada `batch_interval_s` ou quando `batch_max_messages`
+# pacotes se acumulam. Enquanto o WebSocket está desconectado os pacotes
+# ficam na fila; se ela encher, os mais antigos são descartados e contados.
+#
+# Com um TelemetrySpool (spool.py), nada é descartado: durante a queda do
+# uplink (ou com a fila cheia) a fila é despejada em disco, e após a
+# reconexão o spool é reenviado em ordem a no máximo `replay_max_per_s`
+# pacotes/s, sempre depois dos pacotes ao vivo de cada ciclo. Toda a E/S do
+# spool (gravar, ler, confirmar) roda numa única thread própria, na ordem
+# em que foi pedida; o loop asyncio não toca no disco.
+#----------------------------------------------------------
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ocpp_frame import encode_packet
+#----------------------------------------------------------
+
+
+def encode_batch(batch):
+    # Frame = lista JSON de pacotes; frames OCPP já validados (RawJson) vão como o texto original
+    return "[" + ",".join(encode_packet(p) for p in batch) + "]"
+
+
+class UplinkSender:
+
+    def __init__(self, maxsize=10000, batch_max_messages=200, batch_interval_s=0.2, stats_interval_s=60.0,
+                 spool=None, replay_max_per_s=500):
+        self.maxsize = maxsize
+        self.batch_max_messages = batch_max_messages
+        self.batch_interval_s = batch_interval_s
+        self.stats_interval_s = stats_interval_s
+        self._queue = deque()
+        self._ready = None   # asyncio.Event criado em run(), já dentro do loop
+        self.spool = spool
+        # Uma thread só: as operações do spool são executadas em ordem
+        self._spool_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="uplink-spool") if spool is not None else None
+        self.replay_max_per_s = replay_max_per_s
+        self._spool_pending = spool is not None and spool.has_pending()
+        self._replay_budget = 0.0
+        self._spills = 0
+        # Contadores
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent_messages = 0
+        self.sent_frames = 0
+        self.send_errors = 0
+        self.replayed = 0
+
+    def enqueue(self, data):
+        """Coloca um pacote na fila sem bloquear (chamado do loop asyncio)."""
+        if len(self._queue) >= self.maxsize:
+            if self.spool is not None:
+                self._spill()
+            else:
+                self._queue.popleft()
+                self.dropped += 1
+        self._queue.append(data)
+        self.enqueued += 1
+        if self._ready is not None and len(self._queue) >= self.batch_max_messages:
+            self._ready.set()
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sent_messages": self.sent_messages,
+            "sent_frames": self.sent_frames,
+            "send_errors": self.send_errors,
+            "spooled": self.spool.spooled if self.spool is not None else 0,
+            "replayed": self.replayed,
+            "spool_pending": self._spool_pending,
+        }
+
+    def _take_batch(self):
+        count = min(len(self._queue), self.batch_max_messages)
+        return [self._queue.popleft() for _ in range(count)]
+
+    def _requeue(self, batch):
+        # Devolve o lote à frente da fila, preservando a ordem
+        self._queue.extendleft(reversed(batch))
+        if len(self._queue) > self.maxsize and self.spool is not None:
+            self._spill()
+        while len(self._queue) > self.maxsize:
+            self._queue.popleft()
+            self.dropped += 1
+
+    def _spill(self):
+        # Despeja a fila inteira no spool, na ordem de chegada; a gravação fica
+        # com a thread do spool (leituras pedidas depois já a enxergam)
+        if not self._queue:
+            return
+        batch = list(self._queue)
+        self._queue.clear()
+        self._spool_pending = True
+        self._spills += 1
+        future = asyncio.get_running_loop().run_in_executor(self._spool_io, self.spool.append, batch)
+        future.add_done_callback(lambda f: self._spill_done(f, len(batch)))
+
+    def _spill_done(self, future, count):
+        if future.cancelled() or future.exception() is None:
+            return
+        self.dropped += count
+        logging.error(f"[EXTERNAL_DATA_WS] Falha ao gravar {count} mensagens no spool: {future.exception()}")
+
+    async def _spool_call(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._spool_io, method, *args)
+
+    async def _replay(self, socket, elapsed):
+        # Reenvia um lote do spool dentro do orçamento de pacotes/s
+        self._replay_budget = min(self._replay_budget + elapsed * self.replay_max_per_s, self.batch_max_messages)
+        count = int(self._replay_budget)
+        if count <= 0:
+            return
+        spills = self._spills
+        try:
+            batch, position = await self._spool_call(self.spool.read, count)
+        except (IOError, OSError) as e:
+            logging.error(f"[EXTERNAL_DATA_WS] Falha ao ler o spool: {e}")
+            return
+        if not batch:
+            await self._spool_call(self.spool.ack, position, True)
+            if self._spills != spills:
+                return   # houve um despejo durante a leitura: ainda há o que reenviar
+            self._spool_pending = False
+            logging.info(f"[EXTERNAL_DATA_WS] Spool reenviado por completo ({self.replayed} mensagens).")
+            return
+        try:
+            await socket.send(encode_batch(batch))
+        except Exception as e:
+            self.send_errors += 1
+            logging.error(f"[EXTERNAL_DATA_WS] Falha ao reenviar lote do spool: {e}")
+            return
+        await self._spool_call(self.spool.ack, position)
+        self._replay_budget -= len(batch)
+        self.replayed += len(batch)
+        self.sent_messages += len(batch)
+        self.sent_frames += 1
+
+    def close(self):
+        """Grava no spool o que ainda estiver na fila (chamado no desligamento, com o loop parado)."""
+        if self.spool is None:
+            return
+        # Termina as gravações pendentes antes, para manter a ordem
+        self._spool_io.shutdown(wait=True)
+        if self._queue:
+            try:
+                self.spool.append(list(self._queue))
+                self._queue.clear()
+            except (IOError, OSError) as e:
+                logging.error(f"[EXTERNAL_DATA_WS] Falha ao gravar {len(self._queue)} mensagens no spool: {e}")
+        self.spool.close()
+
+    async def _wait_for_batch(self):
+        self._ready.clear()
+        if len(self._queue) >= self.batch_max_messages:
+            return
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=self.batch_interval_s)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, get_socket):
+        """
+        Loop do enviador. `get_socket()` devolve o WebSocket atual (ou None);
+        a reconexão continua a cargo de connect_external_data_ws.
+        """
+        self._ready = asyncio.Event()
+        last_stats = last_cycle = time.monotonic()
+        while True:
+            await self._wait_for_batch()
+            now = time.monotonic()
+            elapsed, last_cycle = now - last_cycle, now
+            if now - last_stats >= self.stats_interval_s:
+                last_stats = now
+                logging.info(f"[EXTERNAL_DATA_WS] Fila de envio: {self.stats()}")
+            if not self._queue and not self._spool_pending:
+                continue
+            socket = get_socket()
+            if socket is None or socket.closed:
+                if self.spool is not None:
+                    self._spill()
+                continue
+            while self._queue:
+                batch = self._take_batch()
+                try:
+                    await socket.send(encode_batch(batch))
+                except Exception as e:
+                    self.send_errors += 1
+                    self._requeue(batch)
+                    logging.error(f"[EXTERNAL_DATA_WS] Falha ao enviar lote de {len(batch)} mensagens: {e}")
+                    break
+                self.sent_messages += len(batch)
+                self.sent_frames += 1
+                logging.debug(f"[EXTERNAL_DATA_WS] Lote enviado: {len(batch)} mensagens.")
+            if self._spool_pending and not self._queue:
+                await self._replay(socket, elapsed)